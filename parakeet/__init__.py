@@ -1,4 +1,6 @@
 import config
+from caches import cache_stats, clear_caches
+from profiling import profile_compile, compile_profiler
 
 import package_info 
 __author__ = package_info.__author__
@@ -24,5 +26,8 @@ from prims import *
 
 from frontend import jit, macro, run_python_fn, run_untyped_fn, run_typed_fn
 from frontend import typed_repr, specialize, find_broken_transform
+from frontend import precompile
 
+import aot
 
+from openmp_backend.runtime import set_num_threads, set_schedule, get_num_threads
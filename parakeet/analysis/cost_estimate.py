@@ -0,0 +1,100 @@
+from ..syntax import Const, Tuple, Closure, TypedFn
+from ..syntax.helpers import get_fn
+
+from contains import memoize
+from syntax_visitor import SyntaxVisitor
+
+# how many times we guess a loop runs when its bounds aren't constants
+default_trip_count = 8
+
+def const_trip_count(start, stop, step):
+  if start.__class__ is Const and stop.__class__ is Const and step.__class__ is Const \
+     and step.value != 0:
+    return max(0, (stop.value - start.value + step.value - 1) // step.value) \
+           if step.value > 0 else \
+           max(0, (start.value - stop.value - step.value - 1) // -step.value)
+  return default_trip_count
+
+def const_bounds_count(bounds):
+  elts = bounds.elts if bounds.__class__ is Tuple else [bounds]
+  count = 1
+  for elt in elts:
+    count *= elt.value if elt.__class__ is Const else default_trip_count
+  return count
+
+class CostEstimate(SyntaxVisitor):
+  """
+  Very rough count of the work done by one call to a function, in units of
+  roughly one arithmetic operation or memory access. Nested loops whose
+  trip counts we can't see get charged default_trip_count iterations.
+  """
+
+  def __init__(self):
+    self.cost = 0
+
+  def block_cost(self, stmts):
+    outer_cost = self.cost
+    self.cost = 0
+    self.visit_block(stmts)
+    inner_cost = self.cost
+    self.cost = outer_cost
+    return inner_cost
+
+  def fn_cost(self, fn):
+    if isinstance(fn, (Closure, TypedFn)):
+      return estimate_cost(get_fn(fn))
+    return default_trip_count
+
+  def visit_stmt(self, stmt):
+    self.cost += 1
+    SyntaxVisitor.visit_stmt(self, stmt)
+
+  def visit_PrimCall(self, expr):
+    self.cost += 1
+    SyntaxVisitor.visit_PrimCall(self, expr)
+
+  def visit_Index(self, expr):
+    self.cost += 1
+    SyntaxVisitor.visit_Index(self, expr)
+
+  def visit_Call(self, expr):
+    self.cost += self.fn_cost(expr.fn)
+    self.visit_expr_list(expr.args)
+
+  def visit_Alloc(self, expr):
+    # calls into malloc
+    self.cost += 50
+    SyntaxVisitor.visit_Alloc(self, expr)
+
+  def visit_AllocArray(self, expr):
+    self.cost += 50
+    SyntaxVisitor.visit_AllocArray(self, expr)
+
+  def visit_ForLoop(self, stmt):
+    trips = const_trip_count(stmt.start, stmt.stop, stmt.step)
+    self.cost += trips * self.block_cost(stmt.body)
+
+  def visit_While(self, stmt):
+    self.visit_expr(stmt.cond)
+    self.cost += default_trip_count * self.block_cost(stmt.body)
+
+  def visit_ParFor(self, stmt):
+    self.cost += const_bounds_count(stmt.bounds) * self.fn_cost(stmt.fn)
+
+  def visit_adverb(self, expr):
+    # shouldn't be left by the time we generate code, but just in case
+    self.cost += default_trip_count * self.fn_cost(expr.fn)
+
+  visit_Map = visit_adverb
+  visit_OuterMap = visit_adverb
+  visit_Reduce = visit_adverb
+  visit_Scan = visit_adverb
+  visit_IndexMap = visit_adverb
+  visit_IndexReduce = visit_adverb
+  visit_IndexScan = visit_adverb
+
+@memoize
+def estimate_cost(fn):
+  estimator = CostEstimate()
+  estimator.visit_fn(fn)
+  return max(1, estimator.cost)
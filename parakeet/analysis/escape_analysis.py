@@ -1,7 +1,7 @@
 
 from .. import config
 from .. ndtypes import ScalarT, ArrayT, PtrT, TupleT, ClosureT, FnT, SliceT, NoneT
-from .. syntax import Var, Attribute, Tuple 
+from .. syntax import Var, Attribute, Tuple, Call, TypedFn
 from syntax_visitor import SyntaxVisitor
 
 empty = set([])
@@ -213,6 +213,7 @@ class EscapeAnalysis(SyntaxVisitor):
       combined = []
       for elt in expr.elts:
         combined.extend(self.collect_lhs_names(elt))
+      return combined
     else:
       return []
   
@@ -262,6 +263,41 @@ def may_alias(fundef):
 def may_escape(fundef):
   return escape_analysis(fundef).may_escape
 
+def borrows(fundef, arg_name):
+  """
+  Does the function never let an argument escape, so long as
+  it was freshly allocated by the caller?
+  """
+  return arg_name not in escape_analysis(fundef, set([arg_name])).may_escape
+
+class CallAwareEscapeAnalysis(EscapeAnalysis):
+  """
+  Looks into the typed functions being called, so passing an array to a
+  function which never keeps it isn't an escape and doesn't make it alias
+  the call's result
+  """
+  
+  def kept_args(self, expr):
+    return [actual for (formal, actual) in zip(expr.fn.arg_names, expr.args)
+            if not borrows(expr.fn, formal)]
+  
+  def visit_Call(self, expr):
+    if expr.fn.__class__ is not TypedFn:
+      return EscapeAnalysis.visit_Call(self, expr)
+    self.mark_escape_list(collect_nonscalar_names_from_list(self.kept_args(expr)))
+  
+  def visit_Assign(self, stmt):
+    rhs = stmt.rhs 
+    if rhs.__class__ is not Call or rhs.fn.__class__ is not TypedFn:
+      return EscapeAnalysis.visit_Assign(self, stmt)
+    lhs_names = set(self.collect_lhs_names(stmt.lhs))
+    if isinstance(rhs.type, ScalarT):
+      rhs_names = set([])
+    else:
+      rhs_names = set(collect_nonscalar_names_from_list(self.kept_args(rhs)))
+    for lhs_name in lhs_names:
+      self.update_aliases(lhs_name, rhs_names)
+
 
 # TODO: 
 # actually generate all this info! 
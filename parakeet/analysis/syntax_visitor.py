@@ -56,6 +56,9 @@ class SyntaxVisitor(object):
   def visit_Alloc(self, expr):
     self.visit_expr(expr.count)
 
+  def visit_Free(self, expr):
+    self.visit_expr(expr.value)
+
   def visit_Struct(self, expr):
     for arg in expr.args:
       self.visit_expr(arg)
@@ -81,6 +84,10 @@ class SyntaxVisitor(object):
     self.visit_expr(expr.array)
     self.visit_expr(expr.shape)
 
+  def visit_Compress(self, expr):
+    self.visit_expr(expr.condition)
+    self.visit_expr(expr.data)
+
   def visit_Shape(self, expr):
     self.visit_expr(expr.array)
   
@@ -0,0 +1,269 @@
+"""
+Ahead-of-time compilation of jit functions into a single importable
+extension module along with a small pure Python dispatcher, so that
+deployed code can call precompiled kernels without Parakeet,
+a C compiler or any of the transformation pipeline.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+import config
+import package_info
+from c_backend import config as c_config
+from c_backend.compile_util import (create_module_source, create_source_file,
+                                    compile_object, link_module, python_headers)
+from c_backend.pymodule_compiler import PyModuleCompiler
+from c_backend.system_info import get_compiler, shared_extension
+from frontend import ast_conversion
+from ndtypes import ArrayT, NoneT, ScalarT, Type, type_conv, typeof, from_dtype
+from openmp_backend import config as openmp_config
+from openmp_backend.multicore_compiler import MulticoreCompiler
+from transforms.pipeline import free_arrays, lower_to_adverbs, lower_to_loops
+import type_inference
+
+def signature_type(t):
+  """
+  Accept a Parakeet type, a Python or NumPy scalar type, a dtype
+  or an example value and return the corresponding Parakeet type
+  """
+  if isinstance(t, Type):
+    return t
+  elif isinstance(t, np.dtype):
+    return from_dtype(t)
+  elif isinstance(t, type):
+    if t in (bool, int, long, float):
+      return type_conv.equiv_type(t)
+    return from_dtype(np.dtype(t))
+  else:
+    return typeof(t)
+
+def _describe_type(t):
+  if isinstance(t, ArrayT):
+    return ('array', t.elt_type.dtype.str, t.rank)
+  elif isinstance(t, ScalarT):
+    return ('scalar', t.dtype.str)
+  else:
+    assert isinstance(t, NoneT)
+    return ('none',)
+
+def _fn_name(fn):
+  while not hasattr(fn, '__name__') and hasattr(fn, 'f'):
+    fn = fn.f
+  return fn.__name__
+
+def _compiler_class(backend):
+  if backend == 'c':
+    return PyModuleCompiler, lambda fn: free_arrays(lower_to_loops(fn))
+  elif backend == 'openmp':
+    return MulticoreCompiler, lower_to_adverbs.apply
+  else:
+    assert False, "Ahead-of-time compilation not supported for backend %s" % backend
+
+def _normalize_entries(entries):
+  if hasattr(entries, 'items'):
+    entries = entries.items()
+  result = []
+  for fn, signatures in entries:
+    result.append((fn, [tuple(signature_type(t) for t in sig) for sig in signatures]))
+  return result
+
+dispatcher_template = '''"""
+Generated by parakeet.aot from Parakeet %(parakeet_version)s, do not edit
+"""
+import imp
+import os
+import sys
+
+import numpy as np
+
+__version__ = %(version)r
+parakeet_version = %(parakeet_version)r
+python_version = %(python_version)r
+numpy_version = %(numpy_version)r
+
+if tuple(sys.version_info[:2]) != python_version:
+  raise ImportError("%(module_name)s was compiled for Python %%d.%%d" %% python_version)
+
+_module = imp.load_dynamic(%(extension_name)r,
+  os.path.join(os.path.dirname(os.path.abspath(__file__)), %(extension_filename)r))
+
+# maps each function name to a list of (input types, entry point)
+signatures = %(signatures)r
+
+_entries = {}
+for _name, _sigs in signatures.items():
+  _entries[_name] = [(tuple(_sig), getattr(_module, _entry_name))
+                     for (_sig, _entry_name) in _sigs]
+
+def _convert(x, t, exact):
+  kind = t[0]
+  if kind == 'array':
+    if type(x) is np.ndarray and x.ndim == t[2] and x.dtype.str == t[1]:
+      return x
+  elif kind == 'scalar':
+    if isinstance(x, (bool, int, long, float, np.generic)):
+      dtype = np.asarray(x).dtype
+      if dtype.str == t[1] or (not exact and np.can_cast(dtype, t[1])):
+        return np.dtype(t[1]).type(x)
+  elif x is None:
+    return x
+  raise TypeError
+
+def _dispatch(name, args):
+  candidates = _entries[name]
+  for exact in (True, False):
+    for sig, entry in candidates:
+      if len(sig) != len(args):
+        continue
+      try:
+        converted = [_convert(x, t, exact) for (x, t) in zip(args, sig)]
+      except TypeError:
+        continue
+      return entry(*converted)
+  raise TypeError("No precompiled version of %%s for arguments %%s, available signatures: %%s" %%
+                  (name, ", ".join(repr(type(x) if type(x) is not np.ndarray else (x.dtype, x.ndim))
+                                   for x in args),
+                   [sig for (sig, _) in candidates]))
+%(wrappers)s
+'''
+
+wrapper_template = '''
+def %(name)s(*args):
+  return _dispatch(%(name)r, args)
+'''
+
+def compile_module(entries, module_name, output_dir = '.', version = '0', backend = None):
+  """
+  Compile every (jit function, list of signatures) pair in entries into one
+  extension module and write a Python module called module_name which
+  dispatches each call to the matching precompiled entry point.
+  Signatures are sequences of Parakeet types, dtypes or example values.
+  Returns the path of the generated Python module.
+  """
+  if backend is None:
+    backend = config.backend
+  compiler_class, lower = _compiler_class(backend)
+  entries = _normalize_entries(entries)
+  assert len(entries) > 0, "No functions to compile"
+
+  version = str(version)
+  extension_name = "_%s_v%s" % (module_name, version.replace(".", "_"))
+  extension_filename = extension_name + shared_extension
+
+  declarations = []
+  extra_function_signatures = []
+  extra_functions = {}
+  extra_objects = set([])
+  extra_compile_flags = []
+  extra_link_flags = []
+  entry_sources = []
+  entry_names = []
+  signatures = {}
+
+  # the module has to work without anything from our cache directory, 
+  # the default schedule applied by openmp_backend.runtime, 
+  # the scratch arena from c_backend.scratch
+  # or vector instructions which only this machine might have 
+  old_helper_mode = c_config.helper_objects
+  old_runtime_schedule = openmp_config.runtime_schedule
+  old_simd_isa = c_config.simd_isa
+  old_scratch_arena = c_config.scratch_arena
+  if old_helper_mode == 'shared':
+    c_config.helper_objects = 'object'
+  openmp_config.runtime_schedule = False
+  c_config.scratch_arena = False
+  if old_simd_isa == 'auto':
+    c_config.simd_isa = None
+  try:
+    for fn, fn_signatures in entries:
+      name = _fn_name(fn)
+      untyped = ast_conversion.translate_function_value(fn)
+      assert not untyped.python_refs, \
+        "Can't compile %s ahead of time since it depends on nonlocal values" % name
+      for input_types in fn_signatures:
+        for t in input_types:
+          assert isinstance(t, (ScalarT, ArrayT, NoneT)), \
+            "Ahead-of-time compiled functions only accept scalars and arrays, got %s" % t
+        typed = type_inference.specialize(untyped, input_types)
+        assert len(typed.input_types) == len(input_types), \
+          "Expected %d input types for %s but got %d" % (len(typed.input_types), name, len(input_types))
+        lowered = lower(typed)
+        compiler = compiler_class()
+        c_name, _, src = compiler.visit_fn(lowered, entry_name = "%s_%d" % (name, len(entry_names)))
+        entry_names.append(c_name)
+        entry_sources.append(src)
+        signatures.setdefault(name, []).append(
+          (tuple(_describe_type(t) for t in input_types), c_name))
+
+        for decl in compiler.declarations:
+          if decl not in declarations:
+            declarations.append(decl)
+        for sig in compiler.extra_function_signatures:
+          if sig not in extra_functions:
+            extra_function_signatures.append(sig)
+            extra_functions[sig] = compiler.extra_functions[sig]
+        extra_objects.update(compiler.extra_objects)
+        for flag in compiler.extra_compile_flags:
+          if flag not in extra_compile_flags: extra_compile_flags.append(flag)
+        for flag in compiler.extra_link_flags:
+          if flag not in extra_link_flags: extra_link_flags.append(flag)
+  finally:
+    c_config.helper_objects = old_helper_mode
+    openmp_config.runtime_schedule = old_runtime_schedule
+    c_config.simd_isa = old_simd_isa
+    c_config.scratch_arena = old_scratch_arena
+
+  src_extension = compiler.src_extension
+  full_src = create_module_source("\n\n".join(entry_sources), extension_name,
+                                  extra_headers = python_headers,
+                                  declarations = declarations,
+                                  extra_function_sources = [extra_functions[sig]
+                                                            for sig in extra_function_signatures],
+                                  entry_names = entry_names)
+  output_dir = os.path.abspath(output_dir)
+  if not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+  src_file = create_source_file(full_src,
+                                fn_name = extension_name,
+                                src_extension = src_extension)
+  compiler_cmd = compiler.compiler_cmd if compiler.compiler_cmd else get_compiler()
+  if old_simd_isa == 'auto':
+    c_config.simd_isa = None
+  try:
+    compiled_object = compile_object(src_file.name,
+                                     fn_name = extension_name,
+                                     src_extension = src_extension,
+                                     extra_compile_flags = extra_compile_flags,
+                                     compiler = compiler_cmd,
+                                     compiler_flag_prefix = compiler.compiler_flag_prefix)
+    link_module(compiler_cmd,
+                compiled_object.object_filename,
+                os.path.join(output_dir, extension_filename),
+                extra_objects = extra_objects,
+                extra_link_flags = extra_link_flags,
+                linker_flag_prefix = compiler.linker_flag_prefix)
+  finally:
+    c_config.simd_isa = old_simd_isa
+  if c_config.delete_temp_files:
+    os.remove(compiled_object.object_filename)
+    os.remove(src_file.name)
+
+  wrappers = "".join(wrapper_template % {'name' : name} for name in sorted(signatures))
+  py_src = dispatcher_template % {
+    'module_name' : module_name,
+    'version' : version,
+    'parakeet_version' : package_info.__version__,
+    'python_version' : tuple(sys.version_info[:2]),
+    'numpy_version' : np.__version__,
+    'extension_name' : extension_name,
+    'extension_filename' : extension_filename,
+    'signatures' : signatures,
+    'wrappers' : wrappers,
+  }
+  py_filename = os.path.join(output_dir, module_name + ".py")
+  with open(py_filename, 'w') as f:
+    f.write(py_src)
+  return py_filename
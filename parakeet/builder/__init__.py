@@ -1,6 +1,6 @@
 
 
 from builder import Builder 
-from build_fn import build_fn, mk_identity_fn, mk_cast_fn, mk_prim_fn
+from build_fn import build_fn, mk_identity_fn, mk_cast_fn, mk_prim_fn, mk_output_fn, output_fn_source
  
 __all__ = ['Builder', 'build_fn']
\ No newline at end of file
@@ -1,8 +1,10 @@
 from dsltools import NestedBlocks
 
 from .. import names, syntax
-from ..ndtypes import NoneType 
-from ..syntax import TypedFn
+from ..caches import LRUCache
+from ..ndtypes import ArrayT, FloatT, NoneType, elt_type, make_array_type
+from ..syntax import Map, TypedFn
+from ..syntax.helpers import none
 from ..builder import Builder 
 
 
@@ -68,3 +70,57 @@ def mk_prim_fn(prim, arg_types):
   _prim_fn_cache[key] = f 
   return f 
   
+
+_output_fn_cache = LRUCache('output_fns')
+# name of each output wrapper -> the function whose result it writes 
+_output_fn_sources = LRUCache('output_fn_sources')
+def mk_output_fn(fn, output_type):
+  """
+  Wrap a typed function so that it takes an extra array argument, 
+  writes its result into that array and then returns it 
+  """
+  key = fn.cache_key, output_type
+  if key in _output_fn_cache:
+    f = _output_fn_cache[key]
+    # the two caches can evict their entries separately 
+    _output_fn_sources[f.name] = fn 
+    return f
+  if not isinstance(output_type, ArrayT):
+    raise TypeError("Expected out= to be an array, got %s" % output_type)
+  result_rank = fn.return_type.rank if isinstance(fn.return_type, ArrayT) else 0
+  if result_rank != output_type.rank:
+    raise ValueError("out= array has %d dimensions but the result of %s has %d" % 
+                     (output_type.rank, names.original(fn.name), result_rank))
+  result_elt_t = elt_type(fn.return_type)
+  output_elt_t = output_type.elt_type
+  # like NumPy's default 'same_kind' casting, don't silently truncate floats
+  if isinstance(result_elt_t, FloatT) and not isinstance(output_elt_t, FloatT):
+    raise TypeError("Can't write %s result of %s into out= array of %s" % 
+                    (result_elt_t, names.original(fn.name), output_elt_t))
+  input_types = tuple(fn.input_types) + (output_type,)
+  input_names = [names.refresh(name) for name in fn.arg_names] + [names.fresh("out")]
+  f, b, input_vars = build_fn(input_types, output_type, 
+                              name = names.original(fn.name) + "_into", 
+                              input_names = input_names)
+  output = input_vars[-1]
+  result = b.call(fn, input_vars[:-1])
+  if result_elt_t != output_elt_t:
+    if isinstance(result.type, ArrayT):
+      result_t = make_array_type(output_elt_t, result.type.rank)
+      result = b.assign_name(Map(fn = mk_cast_fn(result_elt_t, output_elt_t), 
+                                 args = (result,), axis = none, type = result_t), 
+                             "cast_result")
+    else:
+      result = b.cast(result, output_elt_t)
+  b.setidx(output, b.slice_value(none, none, none), result)
+  b.return_(output)
+  _output_fn_cache[key] = f 
+  _output_fn_sources[f.name] = fn 
+  return f
+
+def output_fn_source(f):
+  """
+  If f was built by mk_output_fn, return the function whose result it 
+  writes into its last argument, otherwise None
+  """
+  return _output_fn_sources.get(f.name)
@@ -39,7 +39,8 @@ class LoopBuilder(ArrayBuilder):
            return_stmt = False,
            while_loop = False,
            step = None, 
-           merge = None):
+           merge = None, 
+           independent = False):
     
     if isinstance(start, (int,long)):
       start = self.int(start)
@@ -75,7 +76,8 @@ class LoopBuilder(ArrayBuilder):
       self.blocks.push()
       loop_body(var)
       body = self.blocks.pop()
-      loop_stmt = ForLoop(var, start, niters, step, body, merge)
+      loop_stmt = ForLoop(var, start, niters, step, body, merge, 
+                          independent = independent)
 
     if return_stmt:
       return loop_stmt
@@ -160,7 +162,12 @@ class LoopBuilder(ArrayBuilder):
                      loop_body, 
                      lower_bounds = None, 
                      step_sizes = None, 
-                     index_vars_as_list = False):
+                     index_vars_as_list = False, 
+                     independent = False):
+    """
+    Loop over every index in the given bounds, 'independent' marks loops
+    whose iterations can run in any order (e.g. the body of a ParFor)
+    """
     upper_bounds = self._to_list(upper_bounds)
     
     n_loops = len(upper_bounds)
@@ -211,5 +218,5 @@ class LoopBuilder(ArrayBuilder):
           elif step.value > 0:
             assert upper.value > lower.value, \
               "Attempting to build invalid loop from %s to %s by %s" % (lower, upper, step) 
-        self.loop(lower, upper, inner_loop_body, step=step)
+        self.loop(lower, upper, inner_loop_body, step=step, independent = independent)
     build_loops()
\ No newline at end of file
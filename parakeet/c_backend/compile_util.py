@@ -2,10 +2,14 @@ import collections
 import hashlib
 import imp
 import os
+import sys
+
+import numpy as np
 
 from tempfile import NamedTemporaryFile
 
 from .. import config as root_config 
+from .. import profiling
 import config 
   
 from system_info import (python_lib_dir,  
@@ -45,25 +49,39 @@ numpy_headers = ['numpy/arrayobject.h', 'numpy/arrayscalars.h']
 
 python_headers = core_python_headers + numpy_headers 
 
+# headers every generated module needs, which go into the precompiled header 
+prelude_headers = python_headers + c_headers 
+
 # went to some annoying effort to clean up all the array->flags, &c that have been 
 # replaced with PyArray_FLAGS in NumPy 1.7 
 global_preprocessor_defs = ["#define NPY_NO_DEPRECATED_API NPY_1_7_API_VERSION"]
 
 
-def create_module_source(raw_src, fn_name, 
-                            extra_headers = [], 
-                            declarations = [], 
-                            extra_function_sources = [], 
-                            print_source = None):
-    # when compiling with NVCC, other headers get implicitly included 
-  # and cause warnings since Python redefines this constant
+def header_lines(headers):
   src_lines = list(global_preprocessor_defs) 
+  # when compiling with NVCC, other headers get implicitly included 
+  # and cause warnings since Python redefines this constant
   if config.undef_posix_c_source:
     src_lines.append("#undef _XOPEN_SOURCE")
     src_lines.append("#undef _POSIX_C_SOURCE")
-  
-  for header in extra_headers + c_headers:
+  for header in headers:
     src_lines.append("#include <%s>" % header)
+  return src_lines 
+
+def source_prelude(extra_headers = [], declarations = [], extra_function_sources = [], 
+                   precompiled_header = None):
+  """
+  Lines of C which come before a generated function: 
+  headers, type declarations and the helper functions it calls. 
+  If we have a precompiled header it has to come first and 
+  already covers the Python, NumPy and C headers. 
+  """
+  if precompiled_header is None:
+    src_lines = header_lines(extra_headers + c_headers)
+  else:
+    src_lines = ['#include "%s"' % precompiled_header]
+    src_lines.extend("#include <%s>" % header for header in extra_headers 
+                     if header not in prelude_headers)
   
   for decl in declarations:
     decl = decl.strip()
@@ -72,13 +90,31 @@ def create_module_source(raw_src, fn_name,
     src_lines.append(decl)
     
   src_lines.extend(extra_function_sources)
-  
+  return src_lines
+
+def create_module_source(raw_src, fn_name, 
+                            extra_headers = [], 
+                            declarations = [], 
+                            extra_function_sources = [], 
+                            print_source = None, 
+                            entry_names = None, 
+                            precompiled_header = None):
+  """
+  Wrap generated C code in a Python extension module called fn_name, 
+  by default the module exports a single function of the same name 
+  but a bundle of entry points can be listed in entry_names
+  """
+  src_lines = source_prelude(extra_headers, declarations, extra_function_sources, 
+                             precompiled_header = precompiled_header)
   src_lines.append(raw_src)
+  if entry_names is None: entry_names = [fn_name]
+  method_entries = "\n".join("""
+      {"%(entry_name)s",  %(entry_name)s, METH_VARARGS,
+       "%(entry_name)s"},""" % locals() for entry_name in entry_names)
   module_init = """
     \n\n
     static PyMethodDef %(fn_name)sMethods[] = {
-      {"%(fn_name)s",  %(fn_name)s, METH_VARARGS,
-       "%(fn_name)s"},
+      %(method_entries)s
 
       {NULL, NULL, 0, NULL}        /* Sentinel */
     };
@@ -153,7 +189,9 @@ def compile_object(
     
   compiler_cmd += compiler_flags 
   compiler_cmd += ['-c', src_filename, '-o', object_name]
+  token = profiling.start('compile', fn_name) if profiling.active is not None else None
   run_cmd(compiler_cmd, label = "Compile source")
+  if token is not None: profiling.stop(token)
   
   return CompiledObject(src_filename = src_filename, 
                         object_filename = object_name, 
@@ -178,7 +216,137 @@ def link_module(
   env = os.environ.copy()
   if not windows:
     env["LD_LIBRARY_PATH"] = python_lib_dir
+  token = profiling.start('link', os.path.basename(shared_name)) \
+          if profiling.active is not None else None
   run_cmd(linker_cmd, env = env, label = "Linking")
+  if token is not None: profiling.stop(token)
+
+# (cache directory, compiler command, flags) -> filename of precompiled header or None if we couldn't make one
+_precompiled_headers = {}
+
+def precompiled_header(src_extension = None, 
+                       extra_compile_flags = [], 
+                       print_commands = None, 
+                       compiler = None, 
+                       compiler_flag_prefix = None):
+  """
+  Header with the preprocessor definitions and includes shared by every 
+  generated module, along with a version of it GCC has already parsed. 
+  The PCH only gets used when a source file is compiled with exactly the 
+  same flags, so there's one for each combination of compiler and flags. 
+  Returns the header's filename or None if precompiled headers are 
+  disabled or unsupported.  
+  """
+  if not config.precompiled_headers or not config.cache_dir:
+    return None 
+  if print_commands is None: print_commands = config.print_commands
+  if src_extension is None: src_extension = get_source_extension()
+  if compiler is None: compiler = get_compiler()
+  # NVCC and other non-GNU compilers handle PCH differently, if at all 
+  if compiler_flag_prefix is not None or not compiler_is_gnu(compiler): 
+    return None 
+  
+  flags = get_compiler_flags(extra_compile_flags, compiler_flag_prefix)
+  key = (config.cache_dir, tuple(compiler) if isinstance(compiler, list) else compiler, 
+         tuple(flags), src_extension)
+  if key in _precompiled_headers:
+    return _precompiled_headers[key]
+  
+  header_src = "\n".join(header_lines(prelude_headers)) + "\n"
+  digest = hashlib.sha224(header_src + repr((key, sys.version, np.__version__))).hexdigest()
+  header_name = os.path.join(config.cache_dir, "parakeet_prelude_%s.h" % digest)
+  if not os.path.exists(header_name):
+    if not os.path.exists(config.cache_dir):
+      try:
+        os.makedirs(config.cache_dir)
+      except OSError:
+        if not os.path.isdir(config.cache_dir): raise 
+    language = "c-header" if src_extension == ".c" else "c++-header"
+    tmp_header = NamedTemporaryFile(suffix = ".h", prefix = "parakeet_prelude_", 
+                                    dir = config.cache_dir, delete = False, mode = 'w')
+    tmp_header.write(header_src)
+    tmp_header.close()
+    tmp_pch = tmp_header.name + ".gch"
+    compiler_cmd = list(compiler) if isinstance(compiler, (list, tuple)) else [compiler]
+    try:
+      run_cmd(compiler_cmd + flags + ['-x', language, tmp_header.name, '-o', tmp_pch], 
+              label = "Precompile header")
+    except CommandFailed:
+      os.remove(tmp_header.name)
+      _precompiled_headers[key] = None 
+      return None 
+    # the header only becomes visible once its PCH is in place 
+    os.rename(tmp_pch, header_name + ".gch")
+    os.rename(tmp_header.name, header_name)
+  _precompiled_headers[key] = header_name 
+  return header_name 
+
+def compile_helper_object(
+      src, 
+      fn_name, 
+      src_extension = None, 
+      declarations = [], 
+      extra_function_sources = [], 
+      extra_objects = [], 
+      extra_compile_flags = [], 
+      extra_link_flags = [], 
+      shared = False, 
+      print_commands = None, 
+      compiler = None, 
+      compiler_flag_prefix = None, 
+      linker_flag_prefix = None):
+  """
+  Compile a helper function called from generated modules into an object file 
+  in the cache directory (or, if shared is True, a shared library which 
+  several modules can load), reusing it if the same source was built before. 
+  Returns the filename of the compiled helper. 
+  """
+  assert config.cache_dir, "Helper objects need a cache directory"
+  if print_commands is None: print_commands = config.print_commands
+  if src_extension is None: src_extension = get_source_extension()
+  if compiler is None: compiler = get_compiler()
+  
+  pch = precompiled_header(src_extension, extra_compile_flags, print_commands, 
+                           compiler, compiler_flag_prefix)
+  full_src = "\n".join(source_prelude(python_headers, declarations, extra_function_sources, 
+                                      precompiled_header = pch) + [src])
+  flags = get_compiler_flags(extra_compile_flags, compiler_flag_prefix)
+  digest = hashlib.sha224(full_src + repr((flags, compiler, shared))).hexdigest()
+  extension = shared_extension if shared else object_extension
+  cached_name = os.path.join(config.cache_dir, "helper_%s_%s%s" % (fn_name, digest, extension))
+  if os.path.exists(cached_name):
+    return cached_name 
+  
+  src_file = create_source_file(full_src, fn_name = fn_name, src_extension = src_extension)
+  compiled_object = compile_object(src_file.name, 
+                                   fn_name = fn_name, 
+                                   src_extension = src_extension, 
+                                   extra_compile_flags = extra_compile_flags, 
+                                   print_commands = print_commands, 
+                                   compiler = compiler, 
+                                   compiler_flag_prefix = compiler_flag_prefix)
+  output_name = compiled_object.object_filename
+  if shared:
+    output_name = src_file.name.replace(src_extension, shared_extension)
+    link_module(compiler, compiled_object.object_filename, output_name, 
+                extra_objects = extra_objects, 
+                extra_link_flags = extra_link_flags, 
+                linker_flag_prefix = linker_flag_prefix)
+    if config.delete_temp_files:
+      os.remove(compiled_object.object_filename)
+  if config.delete_temp_files:
+    os.remove(src_file.name)
+  
+  if not os.path.exists(config.cache_dir):
+    try:
+      os.makedirs(config.cache_dir)
+    except OSError:
+      if not os.path.isdir(config.cache_dir): raise 
+  if print_commands:
+    print 'Caching... %s -> %s' % (output_name, cached_name)
+  # renaming is atomic, so other processes never see a partial file 
+  os.rename(output_name, cached_name)
+  return cached_name 
 
 def compile_with_distutils(extension_name, 
                               src_filename,
@@ -229,10 +397,9 @@ def compiler_is_gnu(compiler):
           compiler.endswith("g++") or 
           compiler.endswith("g++.exe"))
 
-def compile_module_from_source(
+def build_module_from_source(
       partial_src, 
       fn_name,
-      fn_signature = None,  
       src_filename = None,
       src_extension = None, 
       declarations = [],
@@ -245,20 +412,34 @@ def compile_module_from_source(
       print_commands = None, 
       compiler = None, 
       compiler_flag_prefix = None, 
-      linker_flag_prefix = None):
-  
+      linker_flag_prefix = None, 
+      entry_names = None):
+  """
+  Generate the full source of an extension module and compile it, or find 
+  it in the cache directory. Returns the module's source, the filename of 
+  the shared library and the source filename. 
+  Doesn't touch any of the compiler's Python state so it's safe to run 
+  from several threads at once. 
+  """
   if print_source is None: print_source = root_config.print_generated_code 
   if print_commands is None: print_commands = config.print_commands
   if src_extension is None: src_extension = get_source_extension()
+  if compiler is None: compiler = get_compiler()
   
+  pch = precompiled_header(src_extension, extra_compile_flags, print_commands, 
+                           compiler, compiler_flag_prefix)
   full_src = create_module_source(partial_src, fn_name, 
                                  extra_headers = python_headers + extra_headers, 
                                  declarations = declarations,  
                                  extra_function_sources = extra_function_sources, 
-                                 print_source = print_source)
+                                 print_source = print_source, 
+                                 entry_names = entry_names, 
+                                 precompiled_header = pch)
 
 
-  digest = hashlib.sha224(full_src).hexdigest()
+  # the same source compiled for a different instruction set is a different module
+  digest = hashlib.sha224(full_src + 
+                          repr(get_compiler_flags(extra_compile_flags, compiler_flag_prefix))).hexdigest()
   
   if config.cache_dir:
     cached_name = os.path.join(config.cache_dir, fn_name + "_" + digest + shared_extension)
@@ -276,8 +457,6 @@ def compile_module_from_source(
                                   src_extension = src_extension)
     src_filename = src_file.name
 
-    if compiler is None: compiler = get_compiler()
-
     try:
       compiled_object = compile_object(src_filename,
                                        fn_name = fn_name,
@@ -317,13 +496,66 @@ def compile_module_from_source(
     if print_commands:
       print 'Caching... %s -> %s' % (shared_name, cached_name)
     if not os.path.exists(config.cache_dir):
-      os.makedirs(config.cache_dir)
+      try:
+        os.makedirs(config.cache_dir)
+      except OSError:
+        # another thread or process might have just created it 
+        if not os.path.isdir(config.cache_dir): raise 
     os.rename(shared_name, cached_name)
     shared_name = cached_name
+  return full_src, shared_name, src_filename 
+
+def compile_module_from_source(
+      partial_src, 
+      fn_name,
+      fn_signature = None,  
+      src_filename = None,
+      src_extension = None, 
+      declarations = [],
+      extra_function_sources = [], 
+      extra_headers = [],  
+      extra_objects = [],
+      extra_compile_flags = [], 
+      extra_link_flags = [], 
+      print_source = None, 
+      print_commands = None, 
+      compiler = None, 
+      compiler_flag_prefix = None, 
+      linker_flag_prefix = None, 
+      entry_names = None):
+  
+  if print_commands is None: print_commands = config.print_commands
+  full_src, shared_name, src_filename = \
+    build_module_from_source(partial_src, fn_name, 
+                             src_filename = src_filename, 
+                             src_extension = src_extension, 
+                             declarations = declarations, 
+                             extra_function_sources = extra_function_sources, 
+                             extra_headers = extra_headers, 
+                             extra_objects = extra_objects, 
+                             extra_compile_flags = extra_compile_flags, 
+                             extra_link_flags = extra_link_flags, 
+                             print_source = print_source, 
+                             print_commands = print_commands, 
+                             compiler = compiler, 
+                             compiler_flag_prefix = compiler_flag_prefix, 
+                             linker_flag_prefix = linker_flag_prefix, 
+                             entry_names = entry_names)
+  return load_module(fn_name, shared_name, full_src, src_filename, 
+                     fn_signature = fn_signature, print_commands = print_commands)
 
+def load_module(fn_name, shared_name, full_src, src_filename = None, 
+                fn_signature = None, print_commands = None):
+  """
+  Load an extension module which build_module_from_source already built 
+  and wrap its entry point in a CompiledPyFn 
+  """
+  if print_commands is None: print_commands = config.print_commands
   if print_commands:
     print "Loading newly compiled extension module %s..." % shared_name
+  token = profiling.start('load', fn_name) if profiling.active is not None else None
   module =  imp.load_dynamic(fn_name, shared_name)
+  if token is not None: profiling.stop(token)
   #on a UNIX-style filesystem it should be OK to delete a file while it's open
   #since the inode will just float untethered from any name
   #If we ever support windows we should find some other way to delete the .dll 
@@ -4,6 +4,30 @@
 fast_math = True 
 sse2 = True 
 opt_level = '-O2'
+
+# Let the C compiler run the loops Parakeet marks as vectorizable 
+# (see transforms/vectorize.py) in SIMD lanes  
+simd = True 
+
+# Which vector instructions to generate:
+#   'auto' : the widest of AVX2, AVX and SSE4.2 that this machine supports
+#   None   : whatever the compiler targets by default (plus SSE2 if sse2 is set)
+#   or the name of an instruction set, one of 'sse4.2', 'avx', 'avx2', 'avx512f'
+# 'auto' never picks AVX-512 since wider vectors can lower the clock speed
+simd_isa = 'auto' 
+
+# Let other Python threads run while compiled code is busy by releasing the 
+# GIL once an entry point has unboxed its arguments (and taking it back before 
+# boxing the result)
+release_gil = True 
+
+# Take the temporary arrays entry points free before returning from a 
+# per-thread arena (see c_backend/scratch.py) which gets reused between calls 
+# instead of calling malloc and free for each one. No thread's arena grows 
+# past scratch_arena_limit bytes, temporaries which don't fit go on the heap. 
+scratch_arena = True 
+scratch_arena_limit = 64 << 20
+
 # overload the default compiler path  
 compiler_path = None
 
@@ -37,6 +61,22 @@ delete_temp_files = True
 from appdirs import user_cache_dir
 cache_dir = user_cache_dir('parakeet')
 
+# Compile helper functions called from generated code separately instead of 
+# repeating their source in every module that uses them, so that each one only 
+# goes through the C compiler once. Since calls to these helpers can't be 
+# inlined this trades some runtime speed for compile time and cache size.
+#   None     : include the source of every helper in each module 
+#   'object' : link each module against cached object files 
+#   'shared' : link each module against cached shared libraries, 
+#              which get loaded once and shared by all modules 
+# (requires cache_dir)
+helper_objects = None 
+
+# Parse the Python, NumPy and C headers every generated module includes only 
+# once for each set of compiler flags and keep the result in cache_dir 
+# (only works with GCC)
+precompiled_headers = True 
+
 # if compiling C or OpenMP we can skip some of the craziness and 
 # have distutils figure out the system config and compiler for us 
 use_distutils = True
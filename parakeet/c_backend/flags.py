@@ -1,15 +1,47 @@
 import distutils
 import os 
 
-from . system_info import include_dirs, windows, mac_os 
+from .. system_info import cpu_flags
+from . system_info import include_dirs, windows, mac_os, get_compiler 
 from . import config 
 
+# compiler flags for each instruction set we know how to target 
+# and the CPU features (as named in /proc/cpuinfo) they need 
+isa_flags = {
+  'sse4.2' : (['-msse4.2'], ['sse4_2']), 
+  'avx' : (['-mavx'], ['avx']), 
+  'avx2' : (['-mavx2', '-mfma'], ['avx2', 'fma']), 
+  'avx512f' : (['-mavx512f', '-mavx2', '-mfma'], ['avx512f', 'avx2', 'fma']), 
+}
+
+# instruction sets to try when picking one automatically, widest first 
+auto_isas = ['avx2', 'avx', 'sse4.2']
+
+def simd_isa():
+  """
+  Instruction set to generate vector code for, None for the compiler's default
+  """
+  if config.simd_isa != 'auto':
+    return config.simd_isa 
+  for isa in auto_isas:
+    if all(flag in cpu_flags for flag in isa_flags[isa][1]):
+      return isa 
+  return None 
+
 def get_opt_flags():
   opt_flags = [config.opt_level] 
   if config.sse2:
     opt_flags.append('-msse2')
   if config.fast_math:
     opt_flags.append('-ffast-math')
+  isa = simd_isa()
+  if isa is not None:
+    assert isa in isa_flags, \
+      "Unknown instruction set '%s', expected one of %s" % (isa, sorted(isa_flags.keys()))
+    opt_flags.extend(isa_flags[isa][0])
+  if config.simd and not os.path.basename(get_compiler()).startswith('icc'):
+    # honor '#pragma omp simd' without pulling in the rest of OpenMP  
+    opt_flags.append('-fopenmp-simd')
   return opt_flags 
 
 def get_compiler_flags(extra_flags = [], compiler_flag_prefix = None):
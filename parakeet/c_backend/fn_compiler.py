@@ -1,14 +1,20 @@
 from collections import namedtuple
 import numpy as np 
+import os 
 
 from .. import names, prims  
+from .. import config as root_config 
+from ..caches import LRUCache
+from .. import profiling
 from ..ndtypes import (IntT, FloatT, TupleT, FnT, Type, BoolT, NoneT, Float32, Float64, Bool, 
                        ClosureT, ScalarT, PtrT, NoneType, ArrayT, SliceT, TypeValueT)    
 from ..syntax import (Const, Var,  PrimCall, Attribute, TupleProj, Tuple, ArrayView,
                       Expr, Closure, TypedFn)
 # from ..syntax.helpers import get_types   
+import config 
 import type_mappings
 from base_compiler import BaseCompiler
+from compile_util import compile_helper_object 
 
 
 CompiledFlatFn = namedtuple("CompiledFlatFn", 
@@ -20,10 +26,10 @@ CompiledFlatFn = namedtuple("CompiledFlatFn",
 
 
 # mapping from (field_types, struct_name, field_names) to type names 
-_struct_type_names = {}
+_struct_type_names = LRUCache('struct_type_names', evictable = False)
 
 # mapping from struct name to decl 
-_struct_type_decls = {}
+_struct_type_decls = LRUCache('struct_type_decls', evictable = False)
 
 class FnCompiler(BaseCompiler):
   
@@ -157,15 +163,44 @@ class FnCompiler(BaseCompiler):
     step = self.visit_expr(expr.step)
     return self.fresh_var(typename, "slice", "{%s, %s, %s}" % (start,stop,step))
     
+  # can the C compiler be told which pointers are aligned? 
+  supports_alignment_hints = True 
+  
+  def assume_aligned(self, ptr, c_ptr_t):
+    """
+    Tell the C compiler that a pointer starts on a 
+    root_config.array_alignment boundary 
+    """
+    if not self.supports_alignment_hints:
+      return ptr 
+    return "(%s) __builtin_assume_aligned(%s, %d)" % (c_ptr_t, ptr, root_config.array_alignment)
+  
+  def aligned_alloc(self, nbytes, c_ptr_t):
+    """
+    Allocate memory which starts on a root_config.array_alignment boundary 
+    and can still be handed back with free (or given to NumPy)
+    """
+    ptr = self.fresh_var("void*", "raw_ptr", "NULL")
+    self.append("if (posix_memalign(&%s, %d, %s) != 0) { %s = NULL; }" % 
+                (ptr, root_config.array_alignment, nbytes, ptr))
+    return self.assume_aligned(ptr, c_ptr_t)
+      
   def visit_Alloc(self, expr):
     elt_t =  expr.elt_type
     nelts = self.fresh_var("npy_intp", "nelts", self.visit_expr(expr.count))
     bytes_per_elt = elt_t.nbytes
     nbytes = self.mul(nelts, bytes_per_elt)#"%s * %d" % (nelts, bytes_per_elt)
-    raw_ptr = "(%s) malloc(%s)" % (type_mappings.to_ctype(expr.type), nbytes)
+    raw_ptr = self.aligned_alloc(nbytes, type_mappings.to_ctype(expr.type))
     struct_type = self.to_ctype(expr.type)
     return self.fresh_var(struct_type, "new_ptr", "{%s, NULL}" % raw_ptr)
     
+  def visit_Free(self, expr):
+    v = self.visit_expr(expr.value)
+    if isinstance(expr.value.type, ArrayT):
+      return "free(%s.data.raw_ptr)" % v
+    else:
+      return "free(%s.raw_ptr)" % v
+    
   def visit_Const(self, expr):
     t = expr.type 
     c = t.__class__ 
@@ -452,6 +487,18 @@ class FnCompiler(BaseCompiler):
   def visit_ExprStmt(self, stmt):
     return self.visit_expr(stmt.value) + ";"
   
+  def simd_pragma(self, reductions = {}):
+    """
+    Tell the C compiler a loop's iterations can run in SIMD lanes, given 
+    a dictionary from the C names of accumulators to their operators 
+    """
+    by_op = {}
+    for (name, op) in reductions.iteritems():
+      by_op.setdefault(op, []).append(name)
+    clauses = "".join(" reduction(%s:%s)" % (op, ", ".join(sorted(names)))
+                      for (op, names) in sorted(by_op.items()))
+    return "#pragma omp simd" + clauses
+
   def visit_ForLoop(self, stmt):
     s = self.visit_merge_left(stmt.merge, fresh_vars = True)
     start = self.visit_expr(stmt.start)
@@ -463,6 +510,9 @@ class FnCompiler(BaseCompiler):
     body += self.visit_merge_right(stmt.merge)
     body = self.indent("\n" + body) 
     s += "\n %(t)s %(var)s;"
+    if stmt.simd is not None and config.simd:
+      reductions = dict((self.name(name), op) for (name, op) in stmt.simd.iteritems())
+      s += "\n" + self.simd_pragma(reductions)
     up_loop = \
         "\nfor (%(var)s = %(start)s; %(var)s < %(stop)s; %(var)s += %(step)s) {%(body)s}"
     down_loop = \
@@ -520,10 +570,14 @@ class FnCompiler(BaseCompiler):
         "Expected function or closure, got %s : %s" % (expr, expr.type)
       fn = expr.type.fn
 
+    helper_mode = self.helper_object_mode(attributes)
     compiler = self.__class__(module_entry = False, **compiler_kwargs)
-    compiled = compiler.compile_flat_source(fn, attributes = attributes, inline = inline)
+    compiled = compiler.compile_flat_source(fn, attributes = attributes, 
+                                            inline = inline and helper_mode is None)
     
-    if compiled.sig not in self.extra_function_signatures:
+    if helper_mode is not None:
+      self.add_helper_object(compiler, compiled, shared = (helper_mode == 'shared'))
+    elif compiled.sig not in self.extra_function_signatures:
       # add any declarations it depends on 
       for decl in compiled.declarations:
         self.add_decl(decl)
@@ -551,6 +605,47 @@ class FnCompiler(BaseCompiler):
   
     return compiled.name
 
+  # backends whose toolchain can't link separately compiled helpers
+  # (or which need them in the same file) can turn this off 
+  supports_helper_objects = True 
+  
+  def helper_object_mode(self, attributes):
+    mode = config.helper_objects
+    if not mode or not config.cache_dir or not self.supports_helper_objects: 
+      return None
+    # helpers with special linkage stay in the module that uses them 
+    if attributes: 
+      return None 
+    assert mode in ('object', 'shared'), "Unknown helper_objects setting %s" % (mode,)
+    return mode 
+  
+  def add_helper_object(self, compiler, compiled, shared = False):
+    """
+    Compile a helper function on its own (or find it in the cache) 
+    and link against it instead of including its source
+    """
+    filename = compile_helper_object(
+      compiled.src, compiled.name, 
+      src_extension = getattr(compiler, 'src_extension', None), 
+      declarations = compiled.declarations, 
+      extra_function_sources = [compiled.extra_functions[sig] 
+                                for sig in compiled.extra_function_signatures], 
+      extra_objects = compiled.extra_objects, 
+      extra_compile_flags = compiler.extra_compile_flags, 
+      extra_link_flags = compiler.extra_link_flags, 
+      shared = shared, 
+      compiler = getattr(compiler, 'compiler_cmd', None), 
+      compiler_flag_prefix = getattr(compiler, 'compiler_flag_prefix', None), 
+      linker_flag_prefix = getattr(compiler, 'linker_flag_prefix', None))
+    for decl in compiled.declarations:
+      self.add_decl(decl)
+    # naming the helper's file makes the source of this module (and thus its 
+    # place in the cache) depend on exactly which version of the helper it uses
+    self.add_decl("/* %s */ %s" % (os.path.basename(filename), compiled.sig))
+    # static objects have to bring along everything the helper calls
+    self.extra_objects.update(compiled.extra_objects)
+    self.extra_objects.add(filename)
+  
   def get_closure_args(self, fn):
     if isinstance(fn.type, FnT):
       return []
@@ -558,16 +653,21 @@ class FnCompiler(BaseCompiler):
       assert isinstance(fn, Closure), "Expected closure, got %s : %s" % (fn, fn.type)
       return self.visit_expr_list(fn.args)
       
-  def build_loops(self, loop_vars, bounds, body):
+  def build_loops(self, loop_vars, bounds, body, inner_pragma = None):
+    """
+    Nested loops over the given bounds, optionally with 
+    a pragma in front of the innermost one 
+    """
     if len(loop_vars) == 0:
       return body
     var = loop_vars[0]
     bound = bounds[0]
-    nested = self.build_loops(loop_vars[1:], bounds[1:], body)
-    return """
+    nested = self.build_loops(loop_vars[1:], bounds[1:], body, inner_pragma)
+    pragma = "\n    " + inner_pragma if inner_pragma and len(loop_vars) == 1 else ""
+    return """%s
     for (%s = 0; %s < %s; ++%s) {
       %s
-    }""" % (var, var, bound, var, nested )
+    }""" % (pragma, var, var, bound, var, nested )
   
   def visit_TypedFn(self, expr):
     return self.get_fn_name(expr)
@@ -636,7 +736,7 @@ class FnCompiler(BaseCompiler):
     """ 
     return self.__class__ 
   
-  _flat_compile_cache = {}
+  _flat_compile_cache = LRUCache('flat_compile')
   def compile_flat_source(self, parakeet_fn, attributes = [], inline = True):
       
     # make sure compiled source uses consistent names for tuple and array types, 
@@ -646,12 +746,16 @@ class FnCompiler(BaseCompiler):
     
     # include your own class in the cache key so that we get distinct code 
     # for derived compilers like OpenMP and CUDA 
-    key = parakeet_fn.cache_key, frozenset(struct_types), self.cache_key, tuple(attributes)
+    key = (parakeet_fn.cache_key, frozenset(struct_types), self.cache_key, tuple(attributes), 
+           inline, config.helper_objects, config.simd, root_config.array_alignment)
     
     if key in self._flat_compile_cache:
       return self._flat_compile_cache[key]
     
+    token = profiling.start('codegen', parakeet_fn.name, parakeet_fn) \
+            if profiling.active is not None else None
     name, sig, src = self.visit_flat_fn(parakeet_fn, attributes = attributes, inline = inline)
+    if token is not None: profiling.stop(token)
     
     result = CompiledFlatFn(
       name = name, 
@@ -0,0 +1,284 @@
+"""
+Small extension module which picks between the compiled specializations of a
+function without going back through Python. Each jit function gets a table
+of entry points along with the argument fingerprints they were specialized
+for, matching checks the same array types, dtypes, ranks and 0/1 strides,
+shapes and scalar values as frontend.dispatch.value_fingerprint.
+"""
+
+from compile_util import compile_module_from_source
+from shell_command import CommandFailed
+
+module_name = "native_dispatch"
+
+dispatch_source = """
+#define MAX_DISPATCH_RANK 32
+#define TABLE_CAPSULE_NAME "parakeet_dispatch_table"
+
+enum { KIND_ARRAY, KIND_INT, KIND_FLOAT, KIND_BOOL, KIND_NONE };
+
+typedef struct {
+  int kind;
+  /* scalars */
+  int value_class;
+  /* arrays */
+  PyArray_Descr* descr;
+  int ndim;
+  signed char stride_class[MAX_DISPATCH_RANK];
+  signed char shape_class[MAX_DISPATCH_RANK];
+} arg_sig_t;
+
+typedef struct {
+  PyObject* fn;
+  PyCFunction cfunc;
+  PyObject* fn_self;
+  Py_ssize_t nargs;
+  int convert_bools;
+  arg_sig_t* args;
+} entry_t;
+
+typedef struct {
+  Py_ssize_t n_entries;
+  Py_ssize_t capacity;
+  entry_t* entries;
+} table_t;
+
+static int small_const_long(long x) {
+  return x == 0 ? 0 : (x == 1 ? 1 : -1);
+}
+
+static int small_const_double(double x) {
+  return x == 0.0 ? 0 : (x == 1.0 ? 1 : -1);
+}
+
+/* same rounding as Python's integer division */
+static npy_intp floor_div(npy_intp a, npy_intp b) {
+  npy_intp q = a / b;
+  if ((a % b != 0) && ((a < 0) != (b < 0))) { q -= 1; }
+  return q;
+}
+
+static void free_table(PyObject* capsule) {
+  table_t* table = (table_t*) PyCapsule_GetPointer(capsule, TABLE_CAPSULE_NAME);
+  Py_ssize_t i, j;
+  if (!table) { return; }
+  for (i = 0; i < table->n_entries; ++i) {
+    entry_t* e = &table->entries[i];
+    for (j = 0; j < e->nargs; ++j) { Py_XDECREF(e->args[j].descr); }
+    free(e->args);
+    Py_DECREF(e->fn);
+  }
+  free(table->entries);
+  free(table);
+}
+
+static table_t* get_table(PyObject* capsule) {
+  return (table_t*) PyCapsule_GetPointer(capsule, TABLE_CAPSULE_NAME);
+}
+
+static PyObject* new_table(PyObject* dummy, PyObject* args) {
+  table_t* table = (table_t*) calloc(1, sizeof(table_t));
+  if (!table) { return PyErr_NoMemory(); }
+  return PyCapsule_New(table, TABLE_CAPSULE_NAME, free_table);
+}
+
+static int parse_classes(PyObject* classes, signed char* result, int n) {
+  int i;
+  if (!PyTuple_Check(classes) || PyTuple_GET_SIZE(classes) != n) { return 0; }
+  for (i = 0; i < n; ++i) {
+    long c = PyInt_AsLong(PyTuple_GET_ITEM(classes, i));
+    if (c == -1 && PyErr_Occurred()) { PyErr_Clear(); return 0; }
+    result[i] = (signed char) c;
+  }
+  return 1;
+}
+
+/* returns 1 if the fingerprint is supported, 0 otherwise */
+static int parse_fingerprint(PyObject* fp, arg_sig_t* sig) {
+  PyObject* t;
+  memset(sig, 0, sizeof(arg_sig_t));
+  if (!PyTuple_Check(fp) || PyTuple_GET_SIZE(fp) < 1) { return 0; }
+  t = PyTuple_GET_ITEM(fp, 0);
+  if (t == (PyObject*) &PyArray_Type) {
+    long ndim;
+    if (PyTuple_GET_SIZE(fp) != 5) { return 0; }
+    if (!PyArray_DescrCheck(PyTuple_GET_ITEM(fp, 1))) { return 0; }
+    ndim = PyInt_AsLong(PyTuple_GET_ITEM(fp, 2));
+    if (ndim < 0 || ndim > MAX_DISPATCH_RANK) { PyErr_Clear(); return 0; }
+    sig->kind = KIND_ARRAY;
+    sig->ndim = (int) ndim;
+    if (!parse_classes(PyTuple_GET_ITEM(fp, 3), sig->stride_class, sig->ndim)) { return 0; }
+    if (!parse_classes(PyTuple_GET_ITEM(fp, 4), sig->shape_class, sig->ndim)) { return 0; }
+    sig->descr = (PyArray_Descr*) PyTuple_GET_ITEM(fp, 1);
+    Py_INCREF(sig->descr);
+    return 1;
+  } else if (t == (PyObject*) Py_TYPE(Py_None)) {
+    sig->kind = KIND_NONE;
+    return PyTuple_GET_SIZE(fp) == 1;
+  } else if (PyTuple_GET_SIZE(fp) == 2) {
+    long c;
+    if (t == (PyObject*) &PyInt_Type) { sig->kind = KIND_INT; }
+    else if (t == (PyObject*) &PyFloat_Type) { sig->kind = KIND_FLOAT; }
+    else if (t == (PyObject*) &PyBool_Type) { sig->kind = KIND_BOOL; }
+    else { return 0; }
+    c = PyInt_AsLong(PyTuple_GET_ITEM(fp, 1));
+    if (c == -1 && PyErr_Occurred()) { PyErr_Clear(); return 0; }
+    sig->value_class = (int) c;
+    return 1;
+  }
+  return 0;
+}
+
+static PyObject* add_entry(PyObject* dummy, PyObject* args) {
+  PyObject *capsule, *fn, *fingerprints;
+  table_t* table;
+  entry_t entry;
+  Py_ssize_t i, j;
+  if (!PyArg_UnpackTuple(args, "add_entry", 3, 3, &capsule, &fn, &fingerprints)) { return NULL; }
+  table = get_table(capsule);
+  if (!table) { return NULL; }
+  if (!PyCFunction_Check(fn) || !(PyCFunction_GET_FLAGS(fn) & METH_VARARGS) ||
+      !PyTuple_Check(fingerprints)) {
+    Py_RETURN_FALSE;
+  }
+  entry.nargs = PyTuple_GET_SIZE(fingerprints);
+  entry.convert_bools = 0;
+  entry.args = (arg_sig_t*) calloc(entry.nargs > 0 ? entry.nargs : 1, sizeof(arg_sig_t));
+  if (!entry.args) { return PyErr_NoMemory(); }
+  for (i = 0; i < entry.nargs; ++i) {
+    if (!parse_fingerprint(PyTuple_GET_ITEM(fingerprints, i), &entry.args[i])) {
+      for (j = 0; j <= i; ++j) { Py_XDECREF(entry.args[j].descr); }
+      free(entry.args);
+      Py_RETURN_FALSE;
+    }
+    if (entry.args[i].kind == KIND_BOOL) { entry.convert_bools = 1; }
+  }
+  if (table->n_entries == table->capacity) {
+    Py_ssize_t capacity = table->capacity ? 2 * table->capacity : 4;
+    entry_t* entries = (entry_t*) realloc(table->entries, capacity * sizeof(entry_t));
+    if (!entries) {
+      for (j = 0; j < entry.nargs; ++j) { Py_XDECREF(entry.args[j].descr); }
+      free(entry.args);
+      return PyErr_NoMemory();
+    }
+    table->entries = entries;
+    table->capacity = capacity;
+  }
+  Py_INCREF(fn);
+  entry.fn = fn;
+  entry.cfunc = PyCFunction_GET_FUNCTION(fn);
+  entry.fn_self = PyCFunction_GET_SELF(fn);
+  table->entries[table->n_entries++] = entry;
+  Py_RETURN_TRUE;
+}
+
+static int match_arg(arg_sig_t* sig, PyObject* x) {
+  switch (sig->kind) {
+    case KIND_ARRAY: {
+      PyArrayObject* a;
+      PyArray_Descr* descr;
+      npy_intp itemsize;
+      npy_intp *strides, *shape;
+      int i;
+      if (Py_TYPE(x) != &PyArray_Type) { return 0; }
+      a = (PyArrayObject*) x;
+      if (PyArray_NDIM(a) != sig->ndim) { return 0; }
+      descr = PyArray_DESCR(a);
+      if (descr != sig->descr && !PyArray_EquivTypes(descr, sig->descr)) { return 0; }
+      itemsize = PyArray_ITEMSIZE(a);
+      if (itemsize == 0) { return 0; }
+      strides = PyArray_STRIDES(a);
+      shape = PyArray_DIMS(a);
+      for (i = 0; i < sig->ndim; ++i) {
+        npy_intp s = floor_div(strides[i], itemsize);
+        if ((s == 0 ? 0 : (s == 1 ? 1 : -1)) != sig->stride_class[i]) { return 0; }
+        if ((shape[i] == 0 ? 0 : (shape[i] == 1 ? 1 : -1)) != sig->shape_class[i]) { return 0; }
+      }
+      return 1;
+    }
+    case KIND_INT:
+      return PyInt_CheckExact(x) && small_const_long(PyInt_AS_LONG(x)) == sig->value_class;
+    case KIND_FLOAT:
+      return PyFloat_CheckExact(x) && small_const_double(PyFloat_AS_DOUBLE(x)) == sig->value_class;
+    case KIND_BOOL:
+      return PyBool_Check(x) && (x == Py_True ? 1 : 0) == sig->value_class;
+    case KIND_NONE:
+      return x == Py_None;
+  }
+  return 0;
+}
+
+/*
+  Call the first entry point whose fingerprints match the arguments,
+  returns NotImplemented if none of them do
+*/
+static PyObject* native_dispatch(PyObject* dummy, PyObject* outer_args) {
+  PyObject *capsule, *args;
+  table_t* table;
+  Py_ssize_t n, i, j;
+  if (!PyArg_UnpackTuple(outer_args, "native_dispatch", 2, 2, &capsule, &args)) { return NULL; }
+  table = get_table(capsule);
+  if (!table) { return NULL; }
+  if (!PyTuple_Check(args)) {
+    PyErr_SetString(PyExc_TypeError, "Expected tuple of arguments");
+    return NULL;
+  }
+  n = PyTuple_GET_SIZE(args);
+  for (i = 0; i < table->n_entries; ++i) {
+    entry_t* e = &table->entries[i];
+    if (e->nargs != n) { continue; }
+    for (j = 0; j < n; ++j) {
+      if (!match_arg(&e->args[j], PyTuple_GET_ITEM(args, j))) { break; }
+    }
+    if (j < n) { continue; }
+    if (e->convert_bools) {
+      /* compiled code expects NumPy booleans */
+      PyObject* converted = PyTuple_New(n);
+      PyObject* result;
+      if (!converted) { return NULL; }
+      for (j = 0; j < n; ++j) {
+        PyObject* x = PyTuple_GET_ITEM(args, j);
+        if (e->args[j].kind == KIND_BOOL) {
+          x = (x == Py_True) ? PyArrayScalar_True : PyArrayScalar_False;
+        }
+        Py_INCREF(x);
+        PyTuple_SET_ITEM(converted, j, x);
+      }
+      result = e->cfunc(e->fn_self, converted);
+      Py_DECREF(converted);
+      return result;
+    }
+    return e->cfunc(e->fn_self, args);
+  }
+  Py_INCREF(Py_NotImplemented);
+  return Py_NotImplemented;
+}
+"""
+
+_module = []
+def load():
+  """
+  Compile the dispatch extension, or load it from the cache,
+  returns None if it can't be built
+  """
+  if not _module:
+    try:
+      compiled = compile_module_from_source(dispatch_source, module_name,
+                                            entry_names = [module_name, "new_table", "add_entry"])
+      _module.append(compiled.module)
+    except CommandFailed:
+      _module.append(None)
+  return _module[0]
+
+def new_table():
+  module = load()
+  if module is None:
+    return None
+  return module.new_table()
+
+def add_entry(table, c_fn, fingerprints):
+  """
+  Register a compiled entry point for arguments with the given fingerprints,
+  returns False if some of them can't be checked natively
+  """
+  return load().add_entry(table, c_fn, fingerprints)
@@ -1,5 +1,6 @@
-from ..analysis import use_count
-from ..syntax import Tuple,  Expr
+from ..analysis import use_count, contains_loops
+from ..analysis.contains import contains_parfor
+from ..syntax import Tuple,  Expr, Var
  
 from ..ndtypes import (
   TupleT,  ArrayT,  NoneT, elt_type, ScalarT, FloatT, BoolT,  
@@ -10,7 +11,10 @@ import type_mappings
 from fn_compiler import FnCompiler
 from compile_util import compile_module_from_source
 from .. import config as root_config 
+from ..caches import LRUCache
+from .. import profiling
 import config 
+import scratch
 
 def attr_from_kwargs(obj, kwargs, attr, value = None):
   """
@@ -37,6 +41,11 @@ class PyModuleCompiler(FnCompiler):
     attr_from_kwargs(self, kwargs, 'linker_flag_prefix')  
     attr_from_kwargs(self, kwargs, 'src_extension')
     FnCompiler.__init__(self, module_entry = module_entry, *args, **kwargs)
+    # thread state saved while the entry point runs without the GIL
+    self.gil_state = None
+    # temporaries the entry point takes from the scratch arena
+    self.scratch_names = set([])
+    self.scratch_allocs = {}
     
   def unbox_scalar(self, x, t, target = None):
     assert isinstance(t, ScalarT), "Expected scalar type, got %s" % t
@@ -362,6 +371,42 @@ class PyModuleCompiler(FnCompiler):
         return NULL;
       }""" % (arr, arr, self.c_str(arr), self.c_type_str(arr)))
   
+  def uses_alignment_hints(self, fn, array_args):
+    return root_config.opt_alignment_hints and \
+      self.supports_alignment_hints and \
+      len(array_args) > 0 and \
+      (contains_loops(fn) or contains_parfor(fn))
+  
+  def visit_entry_body(self, fn, array_args):
+    """
+    If the body has loops over input arrays, compile it twice: once telling 
+    the C compiler that every input array starts on an array_alignment 
+    boundary and once without, then pick between them at runtime   
+    """
+    if not self.uses_alignment_hints(fn, array_args):
+      return self.visit_block(fn.body, push=False)
+    
+    self.push()
+    for (arr, elt_t) in array_args:
+      raw_ptr_t = self.to_ctype(elt_t) + "*"
+      self.setfield(arr, "data.raw_ptr", 
+                    self.assume_aligned("%s.data.raw_ptr" % arr, raw_ptr_t))
+    aligned_body = self.visit_block(fn.body, push=False)
+    unaligned_body = self.visit_block(fn.body, push=True)
+    
+    self.comment("Do all the input arrays start on a %d-byte boundary?" % \
+                 root_config.array_alignment)
+    ptr_bits = " | ".join("(npy_uintp) %s.data.raw_ptr" % arr 
+                          for (arr, _) in array_args)
+    self.append("""
+      if (((%s) %% %d) == 0) { 
+        %s
+      } else {
+        %s
+      }""" % (ptr_bits, root_config.array_alignment, 
+              self.indent(aligned_body), self.indent(unaligned_body)))
+    return self.visit_block([], push=False)
+  
   
   def check_bool(self, x):
     if not config.check_pyobj_types: return 
@@ -496,7 +541,8 @@ class PyModuleCompiler(FnCompiler):
     typename = self.to_ctype(array_t)
     result = self.fresh_var(typename, "new_array")
     raw_ptr_t = self.to_ctype(array_t.elt_type) + "*"
-    self.setfield(result, "data.raw_ptr", "(%s) malloc(%s * %s)" % (raw_ptr_t, nelts, bytes_per_elt) )
+    self.setfield(result, "data.raw_ptr", 
+                  self.aligned_alloc("%s * %s" % (nelts, bytes_per_elt), raw_ptr_t))
     self.setfield(result, "data.base", "(PyObject*) NULL")
     self.setfield(result, "offset", "0")
     self.setfield(result, "size", nelts)
@@ -655,9 +701,33 @@ class PyModuleCompiler(FnCompiler):
     v = self.visit_expr(expr.value) 
     return self.attribute(v, attr, expr.type)
   
+  def visit_Assign(self, stmt):
+    if stmt.lhs.__class__ is Var and stmt.lhs.name in self.scratch_names:
+      alloc = stmt.rhs 
+      nbytes = self.mul(self.visit_expr(alloc.count), alloc.elt_type.nbytes)
+      raw_ptr = self.assume_aligned("scratch_api->alloc(%s)" % nbytes, 
+                                    type_mappings.to_ctype(alloc.type))
+      lhs = self.visit_expr(stmt.lhs)
+      return "%s %s = {%s, NULL};" % (self.to_ctype(stmt.lhs.type), lhs, raw_ptr)
+    return FnCompiler.visit_Assign(self, stmt)
+  
+  def visit_Free(self, expr):
+    if expr.value.__class__ is Var and expr.value.name in self.scratch_names:
+      return "scratch_api->free(%s.raw_ptr)" % self.visit_expr(expr.value)
+    return FnCompiler.visit_Free(self, expr)
+  
   def visit_Return(self, stmt):
     if self.module_entry:
-      v = self.as_pyobj(stmt.value)
+      if self.gil_state is not None or self.scratch_names:
+        # evaluate the result without the GIL, then take it back for boxing
+        x = self.visit_expr(stmt.value)
+        if self.scratch_names:
+          self.append("scratch_api->reset();")
+        if self.gil_state is not None:
+          self.append("PyEval_RestoreThread(%s);" % self.gil_state)
+        v = self.box(x, stmt.value.type)
+      else:
+        v = self.as_pyobj(stmt.value)
       if config.debug: 
         self.print_pyobj_type(v, "Return type: ")
         self.print_pyobj(v, "Return value: ")
@@ -674,6 +744,49 @@ class PyModuleCompiler(FnCompiler):
     return self.pop()
   
   
+  # Entry points let go of the GIL between unboxing their arguments and boxing 
+  # their result, since nothing in between touches Python objects. Backends 
+  # whose generated code does (e.g. to raise exceptions) have to turn this off.
+  supports_gil_release = True 
+  
+  def releases_gil(self):
+    return config.release_gil and self.supports_gil_release
+  
+  def uses_scratch_arena(self):
+    return config.scratch_arena and scratch.load() is not None 
+  
+  def import_scratch_arena(self, fn):
+    """
+    Find the temporaries which can live in the scratch arena and, 
+    if there are any, fetch the arena's functions while we still hold the GIL
+    """
+    if not self.uses_scratch_arena():
+      return 
+    allocs = scratch.scratch_allocs(fn)
+    if len(allocs) == 0:
+      return 
+    self.scratch_names = set(allocs.keys())
+    self.scratch_allocs = allocs 
+    self.add_decl(scratch.api_declaration)
+    self.add_decl("static parakeet_scratch_api_t* scratch_api = NULL")
+    self.add_decl(scratch.fallback_declaration)
+    self.append(scratch.import_source)
+    
+  def reserve_scratch_arena(self, fn):
+    """
+    Make the arena big enough for all the temporaries whose sizes 
+    we can tell from the arguments, the arena grows to fit the others 
+    after the first call which needs them
+    """
+    if not self.scratch_names:
+      return 
+    arg_exprs = dict((name, self.name_mappings[name]) for name in fn.arg_names 
+                     if name in self.name_mappings and 
+                        isinstance(fn.type_env[name], (ArrayT, ScalarT)))
+    nbytes = scratch.reserve_expr(fn, self.scratch_allocs, arg_exprs)
+    if nbytes is not None:
+      self.append("scratch_api->reserve(%s);" % nbytes)
+  
   def enter_module_body(self):
     """
     Some derived compiler classes might want to use this hook
@@ -684,11 +797,12 @@ class PyModuleCompiler(FnCompiler):
   def exit_module_body(self):
     pass 
   
-  def visit_fn(self, fn):
+  def visit_fn(self, fn, entry_name = None):
     if config.print_input_ir:
       print "=== Compiling to C with %s (entry function) ===" % self.__class__.__name__ 
       print fn
-    c_fn_name = self.fresh_name(fn.name)
+    # modules which bundle several entry points need to pick their names 
+    c_fn_name = self.fresh_name(fn.name if entry_name is None else entry_name)
     uses = use_count(fn)
     self.push()
     
@@ -700,6 +814,7 @@ class PyModuleCompiler(FnCompiler):
       self.newline()
       self.printf("\\nStarting %s : %s..." % (c_fn_name, fn.type))
       
+    array_args = []
     for i, argname in enumerate(fn.arg_names):
       assert argname in uses, "Couldn't find arg %s in use-counts" % argname
       if uses[argname] <= 1:
@@ -721,12 +836,17 @@ class PyModuleCompiler(FnCompiler):
         #new_name = self.name(argname, overwrite = True)
         self.comment("Unboxing %s : %s" % (argname, t))
         var = self.unbox(c_name, t, target = argname)
-
+        if isinstance(t, ArrayT):
+          array_args.append((var, t.elt_type))
         self.name_mappings[argname] = var
       
 
     self.enter_module_body()
-    c_body = self.visit_block(fn.body, push=False)
+    self.import_scratch_arena(fn)
+    if self.releases_gil():
+      self.gil_state = self.fresh_var("PyThreadState*", "gil_state", "PyEval_SaveThread()")
+    self.reserve_scratch_arena(fn)
+    c_body = self.visit_entry_body(fn, array_args)
     self.exit_module_body()
     c_body = self.indent(c_body )
     c_args = "PyObject* %s, PyObject* %s" % (dummy, args) #", ".join("PyObject* %s" % self.name(n) for n in fn.arg_names)
@@ -734,23 +854,23 @@ class PyModuleCompiler(FnCompiler):
     fndef = "%s {\n\n %s}" % (c_sig, c_body)
     return c_fn_name, c_sig, fndef 
   
-  _entry_compile_cache = {} 
-  def compile_entry(self, parakeet_fn):  
-    # we include the compiler's class as part of the key
-    # since this function might get reused by descendant backends like OpenMP and CUDA
-    key = parakeet_fn.cache_key, self.__class__ 
-    compiled_fn = self._entry_compile_cache.get(key)
-    if compiled_fn: return compiled_fn 
-    
+  def entry_module_args(self, parakeet_fn):
+    """
+    Generate the C source for the given function's entry point and return
+    it along with everything else compile_module_from_source needs to 
+    turn it into an extension module 
+    """
+    token = profiling.start('codegen', parakeet_fn.name, parakeet_fn) \
+            if profiling.active is not None else None
     name, sig, src = self.visit_fn(parakeet_fn)
+    if token is not None: profiling.stop(token)
     
     if config.print_function_source: 
       print "Generated C source for %s: %s" %(name, src)
     ordered_function_sources = [self.extra_functions[extra_sig] for 
                                 extra_sig in self.extra_function_signatures]
-
-    compiled_fn = compile_module_from_source(
-      src, 
+    return dict(
+      partial_src = src, 
       fn_name = name,
       fn_signature = sig, 
       src_extension = self.src_extension,
@@ -763,6 +883,16 @@ class PyModuleCompiler(FnCompiler):
       compiler = self.compiler_cmd, 
       compiler_flag_prefix = self.compiler_flag_prefix, 
       linker_flag_prefix = self.linker_flag_prefix)
+  
+  _entry_compile_cache = LRUCache('entry_compile') 
+  def compile_entry(self, parakeet_fn):  
+    # we include the compiler's class as part of the key
+    # since this function might get reused by descendant backends like OpenMP and CUDA
+    key = parakeet_fn.cache_key, self.__class__, self.uses_scratch_arena(), \
+      root_config.opt_alignment_hints
+    compiled_fn = self._entry_compile_cache.get(key)
+    if compiled_fn: return compiled_fn 
+    
+    compiled_fn = compile_module_from_source(**self.entry_module_args(parakeet_fn))
     self._entry_compile_cache[key]  = compiled_fn
     return compiled_fn
-
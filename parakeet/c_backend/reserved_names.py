@@ -33,7 +33,7 @@ keywords = set([
   "while"])
 
 macro_names = set(["assert"])
-util_names = set(["printf", "malloc", "free", ])
+util_names = set(["printf", "malloc", "free", "posix_memalign"])
 
 import math 
 
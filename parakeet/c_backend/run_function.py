@@ -1,25 +1,53 @@
 from prepare_args import prepare_args
-from ..transforms.pipeline  import lower_to_loops
+from ..transforms.pipeline  import free_arrays, lower_to_loops
 from ..value_specialization import specialize
 from ..config import value_specialization
 from pymodule_compiler import PyModuleCompiler 
+from ..caches import LRUCache
 
 
 
-_cache = {}
-def run(fn, args):
-  args = prepare_args(args, fn.input_types)
-
-  fn = lower_to_loops(fn)
+_cache = LRUCache('c_backend')
+def lower_entry(fn, args):
+  fn = free_arrays(lower_to_loops(fn))
   
   if value_specialization: 
     fn = specialize(fn, args)
+  return fn 
 
+def compile_entry(fn, args):
+  """
+  Lower and compile a typed function into a Python extension, 
+  expects its arguments to have already gone through prepare_args 
+  and returns the CompiledPyFn whose c_fn is its entry point
+  """
+  fn = lower_entry(fn, args)
   key = fn.cache_key
   if key in _cache:
-    return _cache[key](*args)
+    return _cache[key]
   compiled_fn = PyModuleCompiler().compile_entry(fn)
-  c_fn = compiled_fn.c_fn 
-  _cache[key] = c_fn 
-  return c_fn(*args)
-  
\ No newline at end of file
+  _cache[key] = compiled_fn 
+  return compiled_fn
+
+def entry_module_args(fn, args):
+  """
+  Like compile_entry but stop before building the extension module, 
+  returns the arguments for compile_module_from_source or None
+  if this entry point has already been compiled
+  """
+  fn = lower_entry(fn, args)
+  if fn.cache_key in _cache:
+    return None 
+  return PyModuleCompiler().entry_module_args(fn)
+
+def add_entry(fn, args, compiled_fn):
+  """
+  Remember an extension module built from entry_module_args(fn, args), 
+  so compile_entry returns it instead of generating the same code again 
+  """
+  _cache[lower_entry(fn, args).cache_key] = compiled_fn
+
+def run(fn, args):
+  args = prepare_args(args, fn.input_types)
+  return compile_entry(fn, args).c_fn(*args)
+  
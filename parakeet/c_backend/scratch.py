@@ -0,0 +1,388 @@
+"""
+Per-thread scratch memory for the temporary arrays of compiled entry points.
+Instead of calling malloc and free for each temporary, an entry point bumps a
+pointer into its thread's arena and resets the arena when it returns. The
+arenas live in a tiny extension module which every generated module finds
+through a capsule, so they stay around (at the size the biggest call so far
+needed) between calls. Blocks which don't fit under the size limit fall back
+on aligned heap allocations.
+"""
+
+from .. import config as root_config
+from ..analysis.syntax_visitor import SyntaxVisitor
+from ..shape_inference import shape, shape_env
+from ..shape_inference.shape_inference import ShapeInferenceFailure
+from ..syntax import Alloc, Const, Var
+from compile_util import compile_module_from_source
+from shell_command import CommandFailed
+import config
+
+module_name = "parakeet_scratch"
+
+# functions the generated code calls through the capsule
+api_declaration = """typedef struct {
+  void* (*alloc)(int64_t nbytes);
+  void (*free)(void* ptr);
+  void (*reserve)(int64_t nbytes);
+  void (*reset)(void);
+} parakeet_scratch_api_t"""
+
+# every block gets padded out to this alignment and starts after a header
+# of the same size, which remembers where the block before it starts and
+# whether it's been freed, so the arena can pop freed blocks off its top
+# whatever order they get freed in
+block_alignment = max(root_config.array_alignment, 16)
+
+# generated modules which can't find the arena module (say a cached module 
+# loaded by a process which never built it) use plain heap allocations 
+fallback_declaration = """
+static void* scratch_fallback_alloc(int64_t nbytes) {
+  void* ptr = NULL;
+  if (posix_memalign(&ptr, %(block_alignment)dLL, nbytes) != 0) { return NULL; }
+  return ptr;
+}
+static void scratch_fallback_free(void* ptr) { free(ptr); }
+static void scratch_fallback_reserve(int64_t nbytes) { }
+static void scratch_fallback_reset(void) { }
+static parakeet_scratch_api_t scratch_fallback_api = {
+  scratch_fallback_alloc, scratch_fallback_free, 
+  scratch_fallback_reserve, scratch_fallback_reset
+};""" % dict(block_alignment = block_alignment)
+
+# how a generated entry point finds the arena module's functions: 
+# build or load it through this module if no one has yet, 
+# and fall back on the heap if even that fails 
+import_source = """
+  if (!scratch_api) {
+    scratch_api = (parakeet_scratch_api_t*) PyCapsule_Import("%(module_name)s.api", 0);
+    if (!scratch_api) {
+      PyObject* scratch_module;
+      PyObject* loaded = NULL;
+      PyErr_Clear();
+      scratch_module = PyImport_ImportModule("parakeet.c_backend.scratch");
+      if (scratch_module) {
+        loaded = PyObject_CallMethod(scratch_module, "load", NULL);
+        Py_DECREF(scratch_module);
+      }
+      if (loaded && loaded != Py_None) {
+        scratch_api = (parakeet_scratch_api_t*) PyCapsule_Import("%(module_name)s.api", 0);
+      }
+      Py_XDECREF(loaded);
+      if (!scratch_api) {
+        PyErr_Clear();
+        scratch_api = &scratch_fallback_api;
+      }
+    }
+  }
+""" % dict(module_name = module_name)
+
+runtime_source = """
+%(api_declaration)s;
+
+#define SCRATCH_ALIGN %(block_alignment)dLL
+
+typedef struct {
+  /* offset of the block before this one, -1 for the first */
+  int64_t prev;
+  int64_t freed;
+} scratch_header_t;
+
+typedef struct {
+  char* data;
+  int64_t capacity;
+  int64_t top;
+  int64_t last;
+  /* bytes which didn't fit during the current call */
+  int64_t overflow;
+  /* most bytes any call on this thread wanted at once */
+  int64_t wanted;
+} scratch_arena_t;
+
+static __thread scratch_arena_t* thread_arena = NULL;
+static pthread_key_t arena_key;
+static pthread_once_t arena_key_once = PTHREAD_ONCE_INIT;
+
+static int64_t scratch_limit = 0;
+static int64_t n_arena_allocs = 0;
+static int64_t n_fallback_allocs = 0;
+static int64_t reserved_bytes = 0;
+static int64_t high_water = 0;
+
+static void free_arena(void* ptr) {
+  scratch_arena_t* arena = (scratch_arena_t*) ptr;
+  __sync_fetch_and_sub(&reserved_bytes, arena->capacity);
+  free(arena->data);
+  free(arena);
+}
+
+static void make_arena_key(void) {
+  pthread_key_create(&arena_key, free_arena);
+}
+
+static scratch_arena_t* get_arena(void) {
+  if (!thread_arena) {
+    pthread_once(&arena_key_once, make_arena_key);
+    thread_arena = (scratch_arena_t*) calloc(1, sizeof(scratch_arena_t));
+    if (!thread_arena) { return NULL; }
+    thread_arena->last = -1;
+    /* the arena gets freed when its thread exits */
+    pthread_setspecific(arena_key, thread_arena);
+  }
+  return thread_arena;
+}
+
+/* blocks can't move, so the arena only grows while it's empty */
+static void grow_arena(scratch_arena_t* arena, int64_t nbytes) {
+  int64_t capacity = arena->capacity * 2;
+  void* data = NULL;
+  if (capacity < nbytes) { capacity = nbytes; }
+  if (capacity > scratch_limit) { capacity = scratch_limit; }
+  if (arena->top != 0 || capacity < nbytes || capacity <= arena->capacity) { return; }
+  if (posix_memalign(&data, SCRATCH_ALIGN, capacity) != 0) { return; }
+  free(arena->data);
+  __sync_fetch_and_add(&reserved_bytes, capacity - arena->capacity);
+  arena->data = (char*) data;
+  arena->capacity = capacity;
+}
+
+/* blocks outside the arena still start on the same boundary */
+static void* fallback_alloc(int64_t nbytes) {
+  void* ptr = NULL;
+  if (posix_memalign(&ptr, SCRATCH_ALIGN, nbytes) != 0) { return NULL; }
+  return ptr;
+}
+
+static void* scratch_alloc(int64_t nbytes) {
+  scratch_arena_t* arena = get_arena();
+  int64_t needed = SCRATCH_ALIGN + (nbytes + SCRATCH_ALIGN - 1) / SCRATCH_ALIGN * SCRATCH_ALIGN;
+  char* block;
+  int64_t old;
+  if (!arena) { return fallback_alloc(nbytes); }
+  if (arena->top + arena->overflow + needed > arena->wanted) {
+    arena->wanted = arena->top + arena->overflow + needed;
+  }
+  if (arena->top + needed > arena->capacity) { grow_arena(arena, needed); }
+  if (arena->top + needed > arena->capacity) {
+    arena->overflow += needed;
+    __sync_fetch_and_add(&n_fallback_allocs, 1);
+    return fallback_alloc(nbytes);
+  }
+  block = arena->data + arena->top;
+  ((scratch_header_t*) block)->prev = arena->last;
+  ((scratch_header_t*) block)->freed = 0;
+  arena->last = arena->top;
+  arena->top += needed;
+  do {
+    old = high_water;
+  } while (arena->top > old && !__sync_bool_compare_and_swap(&high_water, old, arena->top));
+  __sync_fetch_and_add(&n_arena_allocs, 1);
+  return block + SCRATCH_ALIGN;
+}
+
+static void scratch_free(void* ptr) {
+  scratch_arena_t* arena = thread_arena;
+  char* p = (char*) ptr;
+  scratch_header_t* header;
+  if (arena && arena->data && p >= arena->data && p < arena->data + arena->capacity) {
+    /* mark the block and pop every freed block off the top, so a block
+       freed before the ones above it gets reclaimed along with them */
+    ((scratch_header_t*) (p - SCRATCH_ALIGN))->freed = 1;
+    while (arena->last >= 0) {
+      header = (scratch_header_t*) (arena->data + arena->last);
+      if (!header->freed) { break; }
+      arena->top = arena->last;
+      arena->last = header->prev;
+    }
+  } else {
+    free(ptr);
+  }
+}
+
+static void scratch_reserve(int64_t nbytes) {
+  scratch_arena_t* arena = get_arena();
+  if (arena && nbytes > arena->capacity) { grow_arena(arena, nbytes); }
+}
+
+static void scratch_reset(void) {
+  scratch_arena_t* arena = thread_arena;
+  if (!arena) { return; }
+  arena->top = 0;
+  arena->last = -1;
+  arena->overflow = 0;
+  /* make room for everything the last call wanted before the next one */
+  if (arena->wanted > arena->capacity) { grow_arena(arena, arena->wanted); }
+}
+
+static parakeet_scratch_api_t scratch_api = {
+  scratch_alloc, scratch_free, scratch_reserve, scratch_reset
+};
+
+static PyObject* parakeet_scratch(PyObject* dummy, PyObject* args) {
+  long long limit;
+  if (!PyArg_ParseTuple(args, "L", &limit)) { return NULL; }
+  scratch_limit = (int64_t) limit;
+  Py_RETURN_NONE;
+}
+
+static PyObject* parakeet_scratch_api(PyObject* dummy, PyObject* args) {
+  return PyCapsule_New(&scratch_api, "%(module_name)s.api", NULL);
+}
+
+static PyObject* parakeet_scratch_stats(PyObject* dummy, PyObject* args) {
+  return Py_BuildValue("LLLLL", (long long) n_arena_allocs, (long long) n_fallback_allocs,
+                       (long long) reserved_bytes, (long long) high_water,
+                       (long long) scratch_limit);
+}
+
+static PyObject* parakeet_scratch_release(PyObject* dummy, PyObject* args) {
+  scratch_arena_t* arena = thread_arena;
+  if (arena) {
+    __sync_fetch_and_sub(&reserved_bytes, arena->capacity);
+    free(arena->data);
+    arena->data = NULL;
+    arena->capacity = 0;
+    arena->wanted = 0;
+  }
+  Py_RETURN_NONE;
+}
+""" % dict(api_declaration = api_declaration, block_alignment = block_alignment,
+           module_name = module_name)
+
+_module = []
+def load():
+  """
+  Compile the arena extension, or load it from the cache,
+  returns None if it can't be built
+  """
+  if not _module:
+    try:
+      compiled = compile_module_from_source(runtime_source, module_name,
+                                            extra_headers = ["pthread.h", "stdlib.h"],
+                                            extra_compile_flags = ["-pthread"],
+                                            extra_link_flags = ["-pthread"],
+                                            entry_names = [module_name,
+                                                           "parakeet_scratch_api",
+                                                           "parakeet_scratch_stats",
+                                                           "parakeet_scratch_release"])
+      module = compiled.module
+      # generated modules look the arena functions up with PyCapsule_Import
+      module.api = module.parakeet_scratch_api()
+      module.parakeet_scratch(config.scratch_arena_limit)
+      _module.append(module)
+    except CommandFailed:
+      _module.append(None)
+  return _module[0]
+
+def set_limit(nbytes):
+  """
+  Largest arena any thread can have, bigger temporaries go on the heap
+  """
+  module = load()
+  if module is not None:
+    module.parakeet_scratch(nbytes)
+
+def stats():
+  """
+  Counts of temporaries which came from the arenas or fell back on the heap,
+  along with the total size of all the arenas, the most any single arena
+  has held at once, and the size limit
+  """
+  module = load()
+  if module is None:
+    return None
+  arena_allocs, fallback_allocs, reserved, high_water, limit = \
+    module.parakeet_scratch_stats()
+  return dict(arena_allocs = arena_allocs,
+              fallback_allocs = fallback_allocs,
+              reserved_bytes = reserved,
+              high_water_bytes = high_water,
+              limit = limit)
+
+def release():
+  """
+  Give the calling thread's arena back to the system
+  """
+  module = load()
+  if module is not None:
+    module.parakeet_scratch_release()
+
+def symbolic_c_expr(value, var_exprs):
+  """
+  C expression for a symbolic value from shape inference, given
+  C expressions for its variables, or None if it has no such expression
+  """
+  c = value.__class__
+  if c is shape.Const:
+    return "%dLL" % value.value if isinstance(value.value, (int, long)) else None
+  elif c is shape.Var:
+    return var_exprs.get(value.num)
+  elif c in (shape.Add, shape.Sub, shape.Mult):
+    x = symbolic_c_expr(value.x, var_exprs)
+    y = symbolic_c_expr(value.y, var_exprs)
+    if x is None or y is None:
+      return None
+    op = {shape.Add : '+', shape.Sub : '-', shape.Mult : '*'}[c]
+    return "(%s %s %s)" % (x, op, y)
+  else:
+    return None
+
+class FindScratchAllocs(SyntaxVisitor):
+  """
+  Pointers which a function allocates and then frees itself,
+  so they can come from the scratch arena
+  """
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.allocs = {}
+    self.freed = set([])
+
+  def visit_Assign(self, stmt):
+    if stmt.lhs.__class__ is Var and stmt.rhs.__class__ is Alloc:
+      self.allocs[stmt.lhs.name] = stmt.rhs
+    SyntaxVisitor.visit_Assign(self, stmt)
+
+  def visit_Free(self, expr):
+    if expr.value.__class__ is Var:
+      self.freed.add(expr.value.name)
+
+def scratch_allocs(fn):
+  finder = FindScratchAllocs()
+  finder.visit_fn(fn)
+  return dict((name, alloc) for (name, alloc) in finder.allocs.iteritems()
+              if name in finder.freed)
+
+def reserve_expr(fn, allocs, arg_exprs):
+  """
+  C expression for how many bytes of arena the given allocations need,
+  in terms of the C values of the function's arguments, leaving out any
+  allocation whose size shape inference can't work out from them
+  """
+  try:
+    env = shape_env(fn)
+  except (ShapeInferenceFailure, RuntimeError):
+    return None
+  var_exprs = {}
+  for (name, c_expr) in arg_exprs.iteritems():
+    value = env.get(name)
+    if value.__class__ is shape.Var:
+      var_exprs[value.num] = c_expr
+    elif value.__class__ is shape.Shape:
+      for (i, dim) in enumerate(value.dims):
+        if dim.__class__ is shape.Var:
+          var_exprs[dim.num] = "%s.shape[%d]" % (c_expr, i)
+  sizes = []
+  for name in sorted(allocs):
+    alloc = allocs[name]
+    if alloc.count.__class__ is Var:
+      count = env.get(alloc.count.name)
+    elif alloc.count.__class__ is Const:
+      count = shape.Const(alloc.count.value)
+    else:
+      count = None
+    count = None if count is None else symbolic_c_expr(count, var_exprs)
+    if count is not None:
+      # leave room for the block's header and padding
+      sizes.append("%s * %d + %d" % (count, alloc.elt_type.nbytes, 2 * block_alignment))
+  if len(sizes) == 0:
+    return None
+  return " + ".join(sizes)
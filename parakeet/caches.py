@@ -0,0 +1,141 @@
+"""
+Registry of the memoization tables kept throughout the compiler, so that
+long-running processes can bound their size and see how well they work
+"""
+
+import weakref
+from collections import OrderedDict
+
+import config
+
+_registry = weakref.WeakSet()
+
+def _limit(name):
+  return config.cache_limits.get(name, config.default_cache_limit)
+
+class LRUCache(object):
+  """
+  Dictionary-like cache which evicts its least recently used entries once it
+  grows beyond the limit configured for its name in config.cache_limits
+  (or config.default_cache_limit) and keeps count of hits, misses and evictions.
+  Caches whose entries have to stay consistent with other state, such as
+  generated C struct names, can opt out of eviction.
+  """
+
+  def __init__(self, name, evictable = True):
+    self.name = name
+    self.evictable = evictable
+    self.entries = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    _registry.add(self)
+
+  def __contains__(self, key):
+    if key in self.entries:
+      return True
+    self.misses += 1
+    return False
+
+  def __getitem__(self, key):
+    try:
+      value = self.entries[key]
+    except KeyError:
+      self.misses += 1
+      raise
+    self.hits += 1
+    if self.evictable and _limit(self.name) is not None:
+      # move to the back of the eviction order
+      del self.entries[key]
+      self.entries[key] = value
+    return value
+
+  def get(self, key, default = None):
+    if key in self.entries:
+      return self[key]
+    self.misses += 1
+    return default
+
+  def __setitem__(self, key, value):
+    entries = self.entries
+    if key in entries:
+      del entries[key]
+    entries[key] = value
+    if self.evictable:
+      limit = _limit(self.name)
+      if limit is not None:
+        while len(entries) > limit:
+          try:
+            entries.popitem(last = False)
+          except KeyError:
+            self._drop_unreachable()
+            entries = self.entries
+          self.evictions += 1
+
+  def _drop_unreachable(self):
+    """
+    Some cache keys (like a function's cache_key) contain mutable parts, 
+    so their hash can change after they've been inserted. Such entries
+    can never be found again, so rebuild the table without them.   
+    """
+    entries = OrderedDict()
+    for key in list(self.entries):
+      try:
+        entries[key] = dict.__getitem__(self.entries, key)
+      except KeyError:
+        pass
+    self.entries = entries
+
+  def __delitem__(self, key):
+    del self.entries[key]
+
+  def __len__(self):
+    return len(self.entries)
+
+  def __iter__(self):
+    return iter(self.entries)
+
+  def keys(self):
+    return self.entries.keys()
+
+  def itervalues(self):
+    return self.entries.itervalues()
+
+  def clear(self):
+    self.entries.clear()
+
+  def stats(self):
+    return {
+      'entries' : len(self.entries),
+      'hits' : self.hits,
+      'misses' : self.misses,
+      'evictions' : self.evictions,
+      'limit' : _limit(self.name) if self.evictable else None,
+    }
+
+def cache_stats():
+  """
+  Return a dictionary mapping each cache name to its number of entries,
+  hits, misses, evictions and size limit. Caches which share a name
+  (such as the memo tables of individual transformation phases) get summed.
+  """
+  result = {}
+  for cache in list(_registry):
+    stats = cache.stats()
+    if cache.name in result:
+      combined = result[cache.name]
+      for k in ('entries', 'hits', 'misses', 'evictions'):
+        combined[k] += stats[k]
+    else:
+      result[cache.name] = stats
+  return result
+
+def clear_caches(reset_stats = False):
+  """
+  Empty every registered cache, all at once since some of them
+  refer to each other's contents
+  """
+  for cache in list(_registry):
+    cache.clear()
+    if reset_stats:
+      cache.hits = cache.misses = cache.evictions = 0
@@ -40,8 +40,8 @@ opt_shape_elim = True
 #
 #   with 
 #     a = b[i:j]  
-# TODO: fix it, currently breaks rule30
-opt_copy_elimination = False
+# (which is also what lets results get written straight into out= arguments)
+opt_copy_elimination = True
 
 # may dramatically increase compile time
 opt_loop_unrolling = False
@@ -52,13 +52,50 @@ opt_scalar_replacement = False
 
 # experimental!
 opt_simplify_array_operators = False
-    
+
+# mark innermost loops over independent iterations so 
+# the C compiler runs them in SIMD lanes 
+opt_vectorize = True
+
+# arrays allocated by compiled code start on a boundary of this many bytes
+array_alignment = 64
+
+# compiled functions with loops also get a copy of their body which tells 
+# the C compiler every input array starts on an array_alignment boundary 
+# (so it can use aligned vector loads and stores), picked at runtime 
+opt_alignment_hints = True
+
+# allocate arrays of loop-invariant size once before a loop instead of on 
+# every iteration, including the temporaries of functions called in the loop 
+opt_prealloc_arrays = True
+
+# free arrays allocated in compiled code once they're no longer needed
+# (only those which escape analysis shows never leave the function) 
+opt_free_arrays = True
+
 # run verifier after each transformation 
 opt_verify = False
 
 # recompile functions for distinct patterns of unit strides and 0 or 1 input values 
 value_specialization = True 
 
+# remember which cached module each combination of function source and 
+# argument signature compiled to, lets a new process skip translation, 
+# type inference and optimization for specializations it has seen before
+# (only used if c_backend.config.cache_dir is set)
+persistent_specialization_cache = True 
+
+# maximum number of entries in each of the compiler's internal caches 
+# (see parakeet.cache_stats() for their names), least recently used 
+# entries get evicted first, None means unbounded 
+default_cache_limit = None 
+cache_limits = {}
+
+# pick between a jit function's compiled specializations with a small C 
+# extension instead of fingerprinting each argument in Python 
+# (only used by the 'c' and 'openmp' backends)
+native_dispatch = True 
+
 
 
 #####################################
@@ -39,6 +39,15 @@ class CudaCompiler(MulticoreCompiler):
                                linker_flag_prefix = '-Xlinker', 
                                *args, **kwargs)
   
+  # device functions have to live in the same file as the kernels that call them 
+  supports_helper_objects = False 
+  
+  # CUDA errors get raised as Python exceptions from inside the entry body
+  supports_gil_release = False 
+  
+  # leave the host code free of GCC builtins nvcc might not know 
+  supports_alignment_hints = False 
+  
   @property 
   def cache_key(self):
     return self.__class__, self.depth > 0, max(self.gpu_depth, 2) 
@@ -1,7 +1,8 @@
 from ast_conversion import translate_function_value, translate_function_ast
 from closure_specializations import print_specializations
-from decorators import jit, macro, staged_macro, typed_macro, axis_macro
+from decorators import jit, macro, staged_macro, typed_macro, staged_typed_macro, axis_macro
 from diagnose import find_broken_transform
+from precompile import precompile, CompileTiming
 from run_function import run_untyped_fn, run_typed_fn, run_python_fn, specialize
 import type_conv_decls as _decls 
 from typed_repr import typed_repr
@@ -8,6 +8,8 @@ import numpy as np
 from dsltools import NestedBlocks, ScopedDict
  
 from .. import config, names, prims, syntax
+from ..caches import LRUCache
+from .. import profiling
 
 from ..names import NameNotFound
 from ..ndtypes import Type
@@ -266,7 +268,7 @@ class AST_Translator(ast.NodeVisitor):
       if is_static_value(value):
         return value_to_syntax(value)
       elif isinstance(value, np.ndarray): 
-        ref = GlobalValueRef(value)
+        ref = GlobalValueRef(value, name)
         return self.local_ref_name(ref, name)
       else:
         # assume that this is a module or object which will have some 
@@ -470,7 +472,25 @@ class AST_Translator(ast.NodeVisitor):
     res.source_info = source_info 
     return res 
     
+  def write_output(self, output, result):
+    """
+    Assign a call's result to every element of its out= array 
+    and use the array as the value of the call
+    """
+    if output.__class__ is not Var:
+      output_var = self.fresh_var("out")
+      self.current_block().append(Assign(output_var, output))
+      output = output_var 
+    self.current_block().append(Assign(Index(output, Slice(none, none, none)), result))
+    return output 
+  
   def translate_value_call(self, value, positional, keywords_dict= {}, starargs_expr = None):
+    if 'out' in keywords_dict and not accepts_output(value):
+      keywords_dict = dict(keywords_dict)
+      output = keywords_dict.pop('out')
+      result = self.translate_value_call(value, positional, keywords_dict, starargs_expr)
+      return self.write_output(output, result)
+    
     if value is sum:
       return mk_reduce_call(build_untyped_prim_fn(prims.add), positional, zero_i24)
     
@@ -1006,7 +1026,7 @@ def translate_function_source(source,
 
 # python value of a user-defined function mapped to its
 # untyped representation
-_known_python_functions = {}
+_known_python_functions = LRUCache('known_python_functions')
 
 # keep track of which functions are being translated at this moment 
 # to check for recursive calls 
@@ -1075,6 +1095,24 @@ def _translate_function_value(fn):
 import threading 
 _lock = threading.RLock()
 
+def accepts_output(value):
+  """
+  Does calling this Python value with out= pass the keyword to a parameter
+  of the same name? If not, the result of the call gets written into the 
+  out= array instead.
+  """
+  from ..mappings import function_mappings
+  if value in function_mappings:
+    value = function_mappings[value]
+  while isinstance(value, jit):
+    value = value.f
+  if isinstance(value, macro):
+    return 'out' in value.varnames[:value.argcount]
+  elif isinstance(value, UntypedFn):
+    return 'out' in value.args.local_names
+  code = getattr(value, 'func_code', None)
+  return code is not None and 'out' in code.co_varnames[:code.co_argcount]
+
 def translate_function_value(fn):
   if fn in _known_python_functions:
     return _known_python_functions[fn]
@@ -1111,7 +1149,10 @@ def translate_function_value(fn):
       return _known_python_functions[fn]
   
     with _lock:
+      token = profiling.start('translate', getattr(fn, '__name__', str(fn))) \
+              if profiling.active is not None else None
       fundef = _translate_function_value(fn)
+      if token is not None: profiling.stop(token, fundef)
            
   _known_python_functions[fn] = fundef 
   return fundef 
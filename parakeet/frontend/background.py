@@ -0,0 +1,59 @@
+"""
+Worker thread which compiles specializations requested by
+jit(background = True) functions while their callers keep running
+"""
+
+import atexit
+import Queue
+import threading
+
+# the compiler keeps plenty of global state (fresh names, specialization
+# and compilation caches) so only one thread at a time gets to use it
+compile_lock = threading.RLock()
+
+_queue = Queue.Queue()
+_workers = []
+_start_lock = threading.Lock()
+
+_stopping = []
+
+def _work():
+  while True:
+    job = _queue.get()
+    try:
+      if job is None:
+        return
+      if not _stopping:
+        job()
+    finally:
+      _queue.task_done()
+
+def submit(job):
+  """
+  Run the given function on the background compilation thread,
+  jobs are responsible for dealing with their own errors
+  """
+  with _start_lock:
+    if not _workers:
+      worker = threading.Thread(target = _work, name = "parakeet-compiler")
+      worker.daemon = True
+      worker.start()
+      _workers.append(worker)
+  _queue.put(job)
+
+@atexit.register
+def _stop():
+  """
+  Let the worker exit cleanly rather than dying during interpreter
+  shutdown, skipping any compilations nobody is waiting for anymore
+  """
+  _stopping.append(True)
+  for worker in _workers:
+    _queue.put(None)
+    worker.join()
+
+def wait():
+  """
+  Block until every submitted compilation has finished
+  """
+  _queue.join()
@@ -1,30 +1,225 @@
 
-from .. import names 
+from .. import config, names 
+from ..caches import LRUCache 
   
 from .. syntax import (Expr, Var, Const, Return, UntypedFn, FormalArgs, DelayUntilTyped,  
                        const, is_python_constant)
+from ..c_backend.prepare_args import prepare_args as prepare_c_args
+from ..openmp_backend import runtime as omp_runtime
+from ..openmp_backend import tiling as omp_tiling
+from dispatch import call_fingerprint, make_specialization, native_signature, output_check
+from run_function import run_untyped_fn, run_typed_fn, specialize, compile_typed_fn
+import background
+from background import compile_lock
+import persistent_cache
 
-from run_function import run_untyped_fn, run_typed_fn, specialize 
+class DispatchTable(LRUCache):
+  """
+  Specializations of one jit function along with the tables of the C 
+  dispatcher built from them, registered with the other caches so that 
+  clear_caches() drops both together 
+  """
+  def __init__(self):
+    LRUCache.__init__(self, 'jit_dispatch', evictable = False)
+    # (backend, value specialization) -> table of the C dispatcher  
+    self.native_tables = {}
+    self.native_keys = set()
+
+  def clear(self):
+    LRUCache.clear(self)
+    self.native_tables.clear()
+    self.native_keys.clear()
 
 class jit(object):
-  def __init__(self, f):
+  def __new__(cls, f = None, **kwargs):
+    # support both @jit and @jit(background = True)
+    if f is None:
+      return lambda f: cls(f, **kwargs)
+    return object.__new__(cls)
+  
+  def __init__(self, f, background = False):
     self.f = f
     self.fn = f
     self.untyped = None 
-
+    
+    # maps a cheap fingerprint of the arguments directly to a 
+    # Specialization which knows how to call the compiled code, 
+    # lets warm calls skip type inference and the whole 
+    # transformation pipeline 
+    self._dispatch_table = DispatchTable()
+    
+    # hash of the function's source and everything it references, 
+    # used as part of the key into the persistent specialization cache 
+    self._source_digest = None 
+    
+    # compile new signatures on a worker thread and run the 
+    # original Python function until they're ready 
+    self.background = background 
+    
+    # call fingerprint -> 'pending' while a background compilation is queued, 
+    # 'synchronous' if the result couldn't be put in the dispatch table, 
+    # or the exception which made it fail 
+    self.background_status = {}
+    
+    # (backend, value specialization) -> table of the C dispatcher, 
+    # which checks argument fingerprints and calls the matching entry 
+    # point without going through Python 
+    self._native_tables = self._dispatch_table.native_tables
+    self._native_keys = self._dispatch_table.native_keys
+    self._native_dispatch = None
+  
+  @property 
+  def source_digest(self):
+    if self._source_digest is None:
+      digest = persistent_cache.function_digest(persistent_cache.unwrap(self.fn))
+      # use the empty string to remember that we couldn't compute a digest 
+      self._source_digest = digest if digest else ""
+    return self._source_digest if self._source_digest else None 
+  
+  def translate(self):
+    if self.untyped is None:
+      import ast_conversion 
+      self.untyped = ast_conversion.translate_function_value(self.fn)
+    return self.untyped 
+  
+  def compile_specialization(self, key, backend_name, args, kwargs):
+    """
+    Specialize this function for the given arguments and, if the backend
+    produces a Python extension, register its entry point under key. 
+    Returns the typed function, its linearized arguments and 
+    the CompiledPyFn (or None) 
+    """
+    with compile_lock: 
+      typed_fn, linear_args = specialize(self.translate(), args, kwargs)
+      if key is None:
+        return typed_fn, linear_args, None 
+      prepared_args = prepare_c_args(linear_args, typed_fn.input_types)
+      compiled = compile_typed_fn(typed_fn, prepared_args, backend_name)
+      if compiled is not None: 
+        specialization = make_specialization(self.untyped, len(args), kwargs.keys(), 
+                                             typed_fn, compiled.c_fn)
+        if specialization is not None:
+          self._register(key, specialization)
+          if persistent_cache.enabled():
+            persistent_cache.save(self.source_digest, key, typed_fn.input_types, 
+                                  specialization, compiled)
+        return typed_fn, prepared_args, compiled 
+      return typed_fn, linear_args, None 
+  
+  def _register(self, key, specialization):
+    self._dispatch_table[key] = specialization
+    if not config.native_dispatch or key in self._native_keys: 
+      return 
+    fingerprints = native_signature(key, specialization)
+    if fingerprints is None:
+      return 
+    from ..c_backend import native_dispatch
+    table_key = key[:2]
+    table = self._native_tables.get(table_key)
+    if table is None:
+      table = native_dispatch.new_table()
+      if table is None:
+        return 
+      self._native_tables[table_key] = table 
+      self._native_dispatch = native_dispatch.load().native_dispatch 
+    if native_dispatch.add_entry(table, specialization.c_fn, fingerprints):
+      self._native_keys.add(key)
+  
+  def _compile_in_background(self, key, backend_name, args, kwargs):
+    self.background_status[key] = 'pending'
+    tile_override = omp_tiling.current_override()
+    def job():
+      try:
+        if tile_override is None:
+          self.compile_specialization(key, backend_name, args, kwargs)
+        else:
+          with omp_tiling.overrides(tile_override):
+            self.compile_specialization(key, backend_name, args, kwargs)
+      except Exception as e:
+        # keep running the Python version of this signature 
+        self.background_status[key] = e
+      else:
+        if key in self._dispatch_table:
+          del self.background_status[key]
+        else:
+          self.background_status[key] = 'synchronous'
+    background.submit(job)
+  
   def __call__(self, *args, **kwargs):
+    # pick up set_num_threads/set_schedule from other Python threads 
+    omp_runtime.sync()
+    
+    if not kwargs and self._native_tables and config.native_dispatch and \
+       not omp_tiling.overrides_active: 
+      table = self._native_tables.get((config.backend, config.value_specialization))
+      if table is not None:
+        result = self._native_dispatch(table, args)
+        if result is not NotImplemented:
+          return result 
+    
+    if '_threads' in kwargs or '_schedule' in kwargs or '_chunk' in kwargs:
+      threads = kwargs.pop('_threads', None)
+      schedule = kwargs.pop('_schedule', None)
+      chunk = kwargs.pop('_chunk', None)
+      with omp_runtime.overrides(threads, schedule, chunk):
+        return self(*args, **kwargs)
+    
+    if '_tile' in kwargs:
+      with omp_tiling.overrides(kwargs.pop('_tile')):
+        return self(*args, **kwargs)
+    
     if '_backend' in kwargs:
       backend_name = kwargs['_backend']
       del kwargs['_backend']
     else:
       backend_name = None
     
-    if self.untyped is None:
-      import ast_conversion 
-      self.untyped = ast_conversion.translate_function_value(self.fn)
+    if backend_name is None:
+      backend_name = config.backend
+    
+    key = call_fingerprint(backend_name, args, kwargs)
+    if key is not None and omp_tiling.overrides_active:
+      # tile sizes get compiled in, so calls with their own need their own code
+      tile_override = omp_tiling.current_override()
+      if tile_override is not None:
+        key += (('_tile', tile_override),)
+    if key is not None:
+      specialization = self._dispatch_table.get(key)
+      if specialization is None and persistent_cache.enabled():
+        specialization = persistent_cache.load(self.fn, self.source_digest, key)
+        if specialization is not None:
+          self._register(key, specialization)
+      if specialization is not None:
+        nonlocals = specialization.nonlocal_values()
+        if nonlocals is not None:
+          return specialization(nonlocals, args, kwargs)
+      
+      if self.background:
+        status = self.background_status.get(key)
+        if status is None:
+          self._compile_in_background(key, backend_name, args, kwargs)
+          status = 'pending'
+        if status != 'synchronous':
+          return self.f(*args, **kwargs)
     
-    typed_fn, linear_args = specialize(self.untyped, args, kwargs)
-    return run_typed_fn(typed_fn, linear_args, backend_name)
+    typed_fn, linear_args, compiled = self.compile_specialization(key, backend_name, args, kwargs)
+    if compiled is not None:
+      check = output_check(typed_fn)
+      if check is not None:
+        return check(compiled.c_fn, linear_args)
+      return compiled.c_fn(*linear_args)
+    with compile_lock:
+      return run_typed_fn(typed_fn, linear_args, backend_name)
+  
+  def compile_ahead(self, signatures, module_name = None, **kwargs):
+    """
+    Compile this function for each of the given signatures into an 
+    importable extension module, see parakeet.aot.compile_module 
+    """
+    from .. import aot 
+    if module_name is None:
+      module_name = persistent_cache.unwrap(self.fn).__name__ 
+    return aot.compile_module([(self, signatures)], module_name, **kwargs)
 
 
 class macro(object):
@@ -128,13 +323,19 @@ class macro(object):
     keywords = kwargs.keys()
     static_pairs = tuple((k,kwargs.get(k)) for k in self.static_names)
    
+    # unless the macro has its own 'out' parameter, an out= array gets 
+    # passed along to specialize, which writes the result into it 
+    output = 'out' in kwargs and 'out' not in self.varnames[:self.argcount]
     dynamic_keywords = tuple(k for k in keywords
-                               if k not in self.static_names)
+                               if k not in self.static_names and 
+                                  not (output and k == 'out'))
 
      
     untyped = self._create_wrapper(n_pos, static_pairs, dynamic_keywords)
 
     dynamic_kwargs = dict( (k, kwargs[k]) for k in dynamic_keywords)
+    if output:
+      dynamic_kwargs['out'] = kwargs['out']
     return run_untyped_fn(untyped, args, dynamic_kwargs, backend = backend_name)
     
 
@@ -176,4 +377,10 @@ class staged_macro(object):
                  self.static_names,
                  call_from_python = self.call_from_python)
 
+class staged_typed_macro(staged_macro):
+  def __call__(self, fn):
+    return typed_macro(fn, 
+                       self.static_names, 
+                       call_from_python = self.call_from_python)
+
 axis_macro = staged_macro("axis")
\ No newline at end of file
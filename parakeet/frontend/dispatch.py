@@ -0,0 +1,248 @@
+from itertools import izip
+import numpy as np
+
+from .. import config, names
+from ..builder import output_fn_source
+from ..c_backend.prepare_args import prepare_arg
+from ..ndtypes import ArrayT, ScalarT, NoneT
+from ..shape_inference.shape_eval import concrete_result_shape
+from ..syntax import ActualArgs
+
+_scalar_types = set([bool, int, long, float])
+
+def _small_const(x):
+  """
+  Mirror the 0/1 distinctions made by value specialization,
+  anything else collapses into a single 'other' class
+  """
+  if x == 0:
+    return 0
+  elif x == 1:
+    return 1
+  else:
+    return -1
+
+def value_fingerprint(x):
+  """
+  Cheap summary of a Python value which determines both its Parakeet type
+  and which value-specialized variant of a function it would run.
+  Returns None for values whose specialization we can't cheaply predict.
+  """
+  t = type(x)
+  if t is np.ndarray:
+    itemsize = x.dtype.itemsize
+    strides = tuple(_small_const(s / itemsize) for s in x.strides)
+    shape = tuple(_small_const(d) for d in x.shape)
+    return (t, x.dtype, x.ndim, strides, shape)
+  elif t in _scalar_types or isinstance(x, np.generic):
+    return (t, _small_const(x))
+  elif x is None:
+    return (t,)
+  elif t is tuple:
+    return values_fingerprint(x)
+  else:
+    return None
+
+def values_fingerprint(xs):
+  keys = []
+  for x in xs:
+    k = value_fingerprint(x)
+    if k is None: return None
+    keys.append(k)
+  return tuple(keys)
+
+def call_fingerprint(backend, args, kwargs):
+  """
+  Combine the fingerprints of all arguments to a function call along
+  with the settings that influence how it gets compiled.
+  Nonlocal values are checked separately by each Specialization.
+  """
+  keys = [backend, config.value_specialization, len(args)]
+  for x in args:
+    k = value_fingerprint(x)
+    if k is None: return None
+    keys.append(k)
+  if kwargs:
+    for name in sorted(kwargs.iterkeys()):
+      k = value_fingerprint(kwargs[name])
+      if k is None: return None
+      keys.append((name, k))
+  return tuple(keys)
+
+# Python types the C dispatcher can recognize, 
+# along with the converters it can skip for them 
+_native_converters = {
+  np.ndarray : set([None]), 
+  type(None) : set([None]), 
+  int : set([None, np.int64]), 
+  float : set([None, np.float64]), 
+  # passed along as NumPy booleans 
+  bool : set([np.bool_]), 
+}
+
+def native_signature(key, specialization):
+  """
+  Fingerprints of the positional arguments in a call key if the
+  C dispatcher can check them and pass the arguments straight to the 
+  compiled entry point, otherwise None
+  """
+  n_args = key[2]
+  if len(key) != 3 + n_args:
+    # called with keyword arguments
+    return None
+  if specialization.order is not None or specialization.nonlocal_refs:
+    return None
+  fingerprints = key[3:]
+  for (fp, conv) in izip(fingerprints, specialization.converters):
+    if conv not in _native_converters.get(fp[0], ()):
+      return None
+  return fingerprints
+
+def arg_converter(t):
+  """
+  Specialize c_backend.prepare_arg to a single input type,
+  None marks arguments which can be passed through unchanged
+  """
+  if isinstance(t, ArrayT):
+    # the fingerprint of the argument already guarantees it's a NumPy array
+    return None
+  elif isinstance(t, ScalarT):
+    return t.dtype.type
+  elif isinstance(t, NoneT):
+    return None
+  else:
+    return lambda x: prepare_arg(x, t)
+
+def writes_output(untyped, keywords):
+  """
+  Does a call with these keywords pass an out= array to a function 
+  without an 'out' parameter of its own? Then the result gets written into 
+  that array (see builder.mk_output_fn), which also gets returned. 
+  """
+  return 'out' in keywords and 'out' not in untyped.args.local_names
+
+def shares_memory(out, value):
+  if isinstance(value, np.ndarray):
+    return np.may_share_memory(out, value)
+  elif isinstance(value, tuple):
+    return any(shares_memory(out, elt) for elt in value)
+  return False
+
+class OutputCheck(object):
+  """
+  Guards a call which writes its result into an out= array (the last 
+  argument), since the compiled code doesn't check where it writes. 
+  Like NumPy, if out overlaps one of the inputs the result goes into 
+  a temporary which then gets copied into out. 
+  """
+  
+  __slots__ = ['fn']
+  
+  def __init__(self, fn):
+    # the function whose result gets written 
+    self.fn = fn 
+  
+  def __call__(self, call, args):
+    out = args[-1]
+    expected = concrete_result_shape(self.fn, args[:-1])
+    if expected is None:
+      raise ValueError("Can't tell the shape of %s's result ahead of time, "
+                       "call it without out=" % names.original(self.fn.name))
+    if out.shape != expected:
+      raise ValueError("out= array has shape %s but the result has shape %s" % 
+                       (out.shape, expected))
+    inputs = list(args[:-1])
+    if any(shares_memory(out, x) for x in inputs):
+      # same layout as out, so the call still fits its specialization
+      tmp = np.empty_like(out)
+      call(*(inputs + [tmp]))
+      out[...] = tmp
+      return out 
+    return call(*args)
+
+def output_check(typed_fn):
+  """
+  An OutputCheck if typed_fn is a wrapper from builder.mk_output_fn, 
+  otherwise None 
+  """
+  source = output_fn_source(typed_fn)
+  if source is None:
+    return None 
+  return OutputCheck(source)
+
+def arg_order(formals, n_nonlocals, n_args, keywords, output = False):
+  """
+  Linearize placeholders for nonlocals, positional and keyword arguments,
+  returns None if the linear order is just nonlocals followed by positional args.
+  """
+  placeholders = [('nonlocal', i) for i in xrange(n_nonlocals)] + \
+                 [('arg', i) for i in xrange(n_args)]
+  keyword_placeholders = dict((k, ('kw', k)) for k in keywords)
+  order = formals.linearize_without_defaults(ActualArgs(placeholders, keyword_placeholders))
+  order = [tuple(slot) for slot in order]
+  if output:
+    # the destination array comes after all of the function's own arguments
+    order.append(('kw', 'out'))
+  if order == placeholders:
+    return None
+  return order
+
+class Specialization(object):
+  """
+  A compiled entry point along with everything needed to call it
+  directly on Python values, skipping the rest of the compiler
+  """
+
+  __slots__ = ['c_fn', 'converters', 'order', 'nonlocal_refs', 'nonlocal_key', 'output_check']
+
+  def __init__(self, c_fn, converters, order, nonlocal_refs = (), nonlocal_key = (), 
+               output_check = None):
+    self.c_fn = c_fn
+    self.converters = tuple(converters)
+    self.order = order
+    self.nonlocal_refs = tuple(nonlocal_refs)
+    self.nonlocal_key = nonlocal_key
+    self.output_check = output_check
+
+  def nonlocal_values(self):
+    """
+    Dereference the nonlocal inputs and return them if they still match the
+    values this entry point was specialized for, otherwise return None
+    """
+    if not self.nonlocal_refs:
+      return ()
+    values = tuple(ref.deref() for ref in self.nonlocal_refs)
+    if values_fingerprint(values) != self.nonlocal_key:
+      return None
+    return values
+
+  def __call__(self, nonlocals, args, kwargs):
+    if self.order is None:
+      linear_args = nonlocals + args
+    else:
+      linear_args = []
+      for (kind, idx) in self.order:
+        if kind == 'arg':
+          linear_args.append(args[idx])
+        elif kind == 'kw':
+          linear_args.append(kwargs[idx])
+        else:
+          linear_args.append(nonlocals[idx])
+    c_args = [x if conv is None else conv(x)
+              for (x, conv) in izip(linear_args, self.converters)]
+    if self.output_check is not None:
+      return self.output_check(self.c_fn, c_args)
+    return self.c_fn(*c_args)
+
+def make_specialization(untyped, n_args, keywords, typed_fn, c_fn):
+  refs = untyped.python_refs if untyped.python_refs else ()
+  nonlocal_key = values_fingerprint([ref.deref() for ref in refs])
+  if nonlocal_key is None:
+    return None
+  output = writes_output(untyped, keywords)
+  if output:
+    keywords = [k for k in keywords if k != 'out']
+  order = arg_order(untyped.args, len(refs), n_args, keywords, output)
+  converters = [arg_converter(t) for t in typed_fn.input_types]
+  return Specialization(c_fn, converters, order, refs, nonlocal_key, 
+                        output_check(typed_fn))
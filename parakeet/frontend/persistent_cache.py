@@ -0,0 +1,291 @@
+"""
+Persistent index from (function source, argument signature, compiler settings)
+to the cached extension module holding that specialization's entry point,
+lets a fresh process call into previously compiled code without translating,
+type-specializing or optimizing anything.
+"""
+
+import __builtin__
+import hashlib
+import imp
+import inspect
+import json
+import os
+import sys
+import types
+
+import numpy as np
+
+from .. import config, package_info
+from ..c_backend import config as c_config
+from ..c_backend.flags import get_compiler_flags, get_linker_flags
+from ..c_backend.system_info import get_compiler
+from ..ndtypes import ArrayT, NoneT, ScalarT
+from ..openmp_backend import config as openmp_config
+
+from dispatch import Specialization, values_fingerprint
+from python_ref import ClosureCellRef, GlobalNameRef, GlobalValueRef
+
+index_dirname = "specializations"
+
+_simple_types = (bool, int, long, float, str, type(None))
+
+# settings which can't change the generated code 
+_irrelevant_settings = set(['default_cache_limit', 'native_dispatch'])
+
+def _settings(module):
+  return sorted((k, v) for (k, v) in vars(module).iteritems()
+                if not k.startswith("_") and
+                   not k.startswith("print") and
+                   k not in _irrelevant_settings and 
+                   isinstance(v, _simple_types))
+
+_parakeet_source_digest = []
+def parakeet_source_digest():
+  """
+  Hash of Parakeet's own source files, so that upgrading or editing the
+  compiler invalidates everything it previously recorded
+  """
+  if not _parakeet_source_digest:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    h = hashlib.sha1()
+    for dirpath, dirnames, filenames in os.walk(root):
+      dirnames.sort()
+      for filename in sorted(filenames):
+        if filename.endswith(".py"):
+          with open(os.path.join(dirpath, filename)) as f:
+            h.update(f.read())
+    _parakeet_source_digest.append(h.hexdigest())
+  return _parakeet_source_digest[0]
+
+def environment_key():
+  """
+  Everything outside of the function itself which might change the generated code
+  """
+  return (package_info.__version__,
+          parakeet_source_digest(),
+          sys.version,
+          np.__version__,
+          _settings(config),
+          _settings(c_config),
+          _settings(openmp_config),
+          get_compiler(),
+          get_compiler_flags(),
+          get_linker_flags())
+
+def _code_names(code):
+  names = set(code.co_names)
+  for c in code.co_consts:
+    if isinstance(c, types.CodeType):
+      names.update(_code_names(c))
+  return names
+
+def unwrap(value):
+  """
+  Get the Python function underneath jit and macro wrappers
+  """
+  while not isinstance(value, types.FunctionType) and hasattr(value, 'f'):
+    value = value.f
+  return value
+
+def _value_digest(value, names, seen):
+  """
+  Summarize a value reachable from a function's globals or closure,
+  returns None if we can't be sure that it will look the same in another process
+  """
+  value = unwrap(value)
+
+  if isinstance(value, types.FunctionType):
+    return function_digest(value, seen)
+  elif isinstance(value, np.ndarray):
+    # arrays become nonlocal inputs whose fingerprints get checked on every call
+    return "array"
+  elif isinstance(value, _simple_types):
+    return repr(value)
+  elif isinstance(value, tuple):
+    elts = [_value_digest(elt, names, seen) for elt in value]
+    if any(elt is None for elt in elts):
+      return None
+    return "(%s)" % ", ".join(elts)
+  elif isinstance(value, types.ModuleType):
+    # only the attributes the function might actually use
+    parts = [value.__name__]
+    for name in sorted(names):
+      if name in value.__dict__:
+        attr = value.__dict__[name]
+        if isinstance(attr, types.ModuleType):
+          parts.append("%s = module %s" % (name, attr.__name__))
+        else:
+          attr_digest = _value_digest(attr, names, seen)
+          if attr_digest is None:
+            return None
+          parts.append("%s = %s" % (name, attr_digest))
+    return "module(%s)" % ", ".join(parts)
+  elif isinstance(value, (types.BuiltinFunctionType, np.ufunc, type, np.dtype)):
+    return repr(value)
+  else:
+    return None
+
+def function_digest(fn, seen = None):
+  """
+  Hash a Python function's source together with everything it can reach
+  through its globals and closure cells, returns None if some of those
+  values can't be reliably summarized
+  """
+  if not isinstance(fn, types.FunctionType):
+    return None
+  if seen is None:
+    seen = {}
+  if fn in seen:
+    return seen[fn]
+  # placeholder for recursive references
+  seen[fn] = "recursive(%s)" % fn.__name__
+
+  try:
+    source = inspect.getsource(fn)
+  except (IOError, TypeError):
+    return None
+
+  code = fn.func_code
+  names = _code_names(code)
+  parts = [source, repr(fn.func_defaults)]
+  for name in sorted(names):
+    if name in fn.func_globals:
+      value = fn.func_globals[name]
+    elif name in __builtin__.__dict__:
+      continue
+    else:
+      # attribute names show up in co_names too
+      continue
+    value_digest = _value_digest(value, names, seen)
+    if value_digest is None:
+      return None
+    parts.append("%s = %s" % (name, value_digest))
+
+  if fn.func_closure:
+    for name, cell in zip(code.co_freevars, fn.func_closure):
+      value_digest = _value_digest(cell.cell_contents, names, seen)
+      if value_digest is None:
+        return None
+      parts.append("closure %s = %s" % (name, value_digest))
+
+  digest = hashlib.sha1("\n".join(parts)).hexdigest()
+  seen[fn] = digest
+  return digest
+
+def enabled():
+  return config.persistent_specialization_cache and bool(c_config.cache_dir)
+
+def _index_filename(fn_digest, call_key):
+  h = hashlib.sha1()
+  h.update(repr(environment_key()))
+  h.update(fn_digest)
+  h.update(repr(call_key))
+  return os.path.join(c_config.cache_dir, index_dirname, h.hexdigest() + ".json")
+
+def _describe_converter(t):
+  if isinstance(t, (ArrayT, NoneT)):
+    return None
+  elif isinstance(t, ScalarT):
+    return t.dtype.str
+  else:
+    return False
+
+def _describe_ref(ref):
+  if isinstance(ref, (GlobalValueRef, GlobalNameRef)) and ref.name:
+    return ["global", ref.name]
+  elif isinstance(ref, ClosureCellRef):
+    return ["cell", ref.name]
+  else:
+    return None
+
+def save(fn_digest, call_key, input_types, specialization, compiled):
+  """
+  Record where the compiled entry point for this call signature lives on disk
+  """
+  if fn_digest is None:
+    return
+  # out= checks need the typed function, which a new process won't have 
+  if specialization.output_check is not None:
+    return
+  shared_filename = os.path.abspath(compiled.shared_filename)
+  cache_dir = os.path.abspath(c_config.cache_dir)
+  if not shared_filename.startswith(cache_dir) or not os.path.exists(shared_filename):
+    return
+  converters = [_describe_converter(t) for t in input_types]
+  if any(c is False for c in converters):
+    return
+  refs = [_describe_ref(ref) for ref in specialization.nonlocal_refs]
+  if any(r is None for r in refs):
+    return
+  order = specialization.order
+  if order is not None:
+    order = [list(slot) for slot in order]
+  entry = {
+    'module_name' : compiled.fn_name,
+    'shared_filename' : shared_filename,
+    'converters' : converters,
+    'order' : order,
+    'nonlocals' : refs,
+    'nonlocal_key' : repr(specialization.nonlocal_key),
+  }
+  filename = _index_filename(fn_digest, call_key)
+  dirname = os.path.dirname(filename)
+  try:
+    if not os.path.exists(dirname):
+      os.makedirs(dirname)
+    # write to a temporary file first so concurrent readers
+    # never see a partially written entry
+    tmp_filename = "%s.%d.tmp" % (filename, os.getpid())
+    with open(tmp_filename, 'w') as f:
+      json.dump(entry, f)
+    os.rename(tmp_filename, filename)
+  except (IOError, OSError):
+    pass
+
+def _resolve_ref(fn, kind, name):
+  if kind == "global":
+    if name not in fn.func_globals:
+      return None
+    return GlobalNameRef(fn.func_globals, name)
+  else:
+    assert kind == "cell", "Unknown nonlocal kind %s" % kind
+    freevars = fn.func_code.co_freevars
+    if name not in freevars or not fn.func_closure:
+      return None
+    return ClosureCellRef(fn.func_closure[freevars.index(name)], name)
+
+def load(fn, fn_digest, call_key):
+  """
+  Look for a previously compiled entry point for this call signature,
+  returns a Specialization or None
+  """
+  if fn_digest is None:
+    return None
+  fn = unwrap(fn)
+  filename = _index_filename(fn_digest, call_key)
+  if not os.path.exists(filename):
+    return None
+  try:
+    with open(filename) as f:
+      entry = json.load(f)
+    shared_filename = str(entry['shared_filename'])
+    if not os.path.exists(shared_filename):
+      return None
+    refs = [_resolve_ref(fn, str(kind), str(name)) for (kind, name) in entry['nonlocals']]
+    if any(ref is None for ref in refs):
+      return None
+    nonlocal_key = values_fingerprint([ref.deref() for ref in refs])
+    if repr(nonlocal_key) != entry['nonlocal_key']:
+      return None
+    converters = [None if c is None else np.dtype(str(c)).type
+                  for c in entry['converters']]
+    order = entry['order']
+    if order is not None:
+      order = [(str(kind), idx if kind != 'kw' else str(idx)) for (kind, idx) in order]
+    module_name = str(entry['module_name'])
+    module = imp.load_dynamic(module_name, shared_filename)
+    c_fn = getattr(module, module_name)
+  except (IOError, OSError, ValueError, KeyError, TypeError, ImportError, AttributeError):
+    return None
+  return Specialization(c_fn, converters, order, refs, nonlocal_key)
@@ -0,0 +1,157 @@
+"""
+Compile many specializations at once, running the Python side of the compiler
+one signature at a time but building the generated extension modules
+concurrently
+"""
+
+import collections
+import multiprocessing
+import time
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from .. import config
+from ..c_backend import config as c_config
+from ..c_backend.compile_util import build_module_from_source, load_module
+from ..c_backend.prepare_args import prepare_args as prepare_c_args
+from ..ndtypes import ArrayT, ScalarT, Type, NoneT
+
+from background import compile_lock
+from decorators import jit
+from dispatch import call_fingerprint
+from persistent_cache import unwrap
+from run_function import specialize, entry_module_args, add_entry
+
+CompileTiming = collections.namedtuple(
+  "CompileTiming",
+  (
+    "fn_name",
+    "input_types",
+    # seconds spent in type inference, optimization and C code generation
+    "lower",
+    # seconds spent waiting on the C compiler and linker
+    "build",
+    # seconds spent loading the extension and registering its entry point
+    # (which includes lowering and building it if that didn't happen ahead of time)
+    "load",
+  )
+)
+
+_python_dtypes = set([np.dtype(bool), np.dtype(int), np.dtype(float)])
+
+def example_value(t):
+  """
+  Make a value of the given type which stands in for typical inputs:
+  contiguous arrays with more than one element along every axis and
+  scalars other than 0 or 1 (except for booleans)
+  """
+  if isinstance(t, ArrayT):
+    return np.empty((2,) * t.rank, dtype = t.elt_type.dtype)
+  elif isinstance(t, ScalarT):
+    value = t.dtype.type(2)
+    # calls usually pass plain Python scalars, which get fingerprinted separately
+    if t.dtype in _python_dtypes:
+      value = value.item()
+    return value
+  elif isinstance(t, NoneT):
+    return None
+  else:
+    assert False, "Can't make an example value of type %s" % t
+
+def _example_args(signature):
+  args = []
+  for x in signature:
+    if isinstance(x, (Type, type, np.dtype)):
+      from ..aot import signature_type
+      x = example_value(signature_type(x))
+    args.append(x)
+  return tuple(args)
+
+def _build(module_args):
+  """
+  Returns the time the build took along with the module's source, 
+  shared library and source filenames
+  """
+  module_args = dict(module_args)
+  del module_args['fn_signature']
+  start = time.time()
+  built = build_module_from_source(**module_args)
+  return (time.time() - start,) + tuple(built)
+
+def precompile(entries, jobs = None, backend = None):
+  """
+  Compile each function in entries for every one of its signatures, where
+  entries is either a dictionary or a list of (function, signatures) pairs and
+  each signature is a sequence of Parakeet types, dtypes or example values.
+  The C compiler runs for up to 'jobs' specializations at once.
+  Returns a CompileTiming for every signature.
+  """
+  if backend is None:
+    backend = config.backend
+  if jobs is None:
+    jobs = multiprocessing.cpu_count()
+  if hasattr(entries, 'items'):
+    entries = entries.items()
+
+  calls = []
+  for fn, signatures in entries:
+    if not isinstance(fn, jit):
+      fn = jit(fn)
+    for signature in signatures:
+      calls.append((fn, _example_args(signature)))
+
+  lower_times = []
+  pending_builds = []
+  lowered = []
+  # without a cache directory the extensions built here couldn't be found again
+  # by the regular compilation path, so just compile everything in order
+  if c_config.cache_dir:
+    with compile_lock:
+      for fn, args in calls:
+        start = time.time()
+        typed_fn, linear_args = specialize(fn.translate(), args)
+        prepared_args = prepare_c_args(linear_args, typed_fn.input_types)
+        module_args = entry_module_args(typed_fn, prepared_args, backend)
+        lower_times.append(time.time() - start)
+        pending_builds.append(module_args)
+        lowered.append((typed_fn, prepared_args))
+  else:
+    lower_times = [0.0] * len(calls)
+    pending_builds = [None] * len(calls)
+
+  build_times = [0.0] * len(calls)
+  built = [None] * len(calls)
+  to_build = [i for (i, module_args) in enumerate(pending_builds) if module_args is not None]
+  if to_build:
+    pool = ThreadPool(max(1, min(jobs, len(to_build))))
+    try:
+      for i, result in zip(to_build, pool.map(_build, [pending_builds[i] for i in to_build])):
+        build_times[i] = result[0]
+        built[i] = result[1:]
+    finally:
+      pool.close()
+      pool.join()
+
+  # when nothing was built ahead of time this is where all the work happens
+  timings = []
+  with compile_lock:
+    for i, (fn, args) in enumerate(calls):
+      start = time.time()
+      if built[i] is not None:
+        # hand the backend the module we just built rather than letting it 
+        # generate the same source again to find it in the cache directory 
+        full_src, shared_name, src_filename = built[i]
+        module_args = pending_builds[i]
+        compiled = load_module(module_args['fn_name'], shared_name, full_src, src_filename, 
+                               fn_signature = module_args['fn_signature'])
+        typed_fn, prepared_args = lowered[i]
+        add_entry(typed_fn, prepared_args, compiled, backend)
+      key = call_fingerprint(backend, args, {})
+      typed_fn, _, _ = fn.compile_specialization(key, backend, args, {})
+      timings.append(CompileTiming(fn_name = unwrap(fn.fn).__name__,
+                                   input_types = typed_fn.input_types,
+                                   lower = lower_times[i],
+                                   build = build_times[i],
+                                   load = time.time() - start))
+  return timings
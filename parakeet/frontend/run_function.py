@@ -1,5 +1,6 @@
 
 from .. import config, type_inference 
+from ..builder import mk_output_fn
 from ..ndtypes import type_conv, Type, typeof  
 from ..syntax import UntypedFn, ActualArgs
 from ..transforms import pipeline
@@ -8,6 +9,7 @@ from .. import c_backend
 from .. import openmp_backend 
 
 import ast_conversion
+from dispatch import writes_output, output_check
 
 # get types of all inputs
 def _typeof(arg):
@@ -44,6 +46,11 @@ def specialize(untyped, args, kwargs = {}, optimize = False):
 
   if not isinstance(untyped, UntypedFn):
     untyped = ast_conversion.translate_function_value(untyped)
+  
+  output = None 
+  if writes_output(untyped, kwargs):
+    kwargs = dict(kwargs)
+    output = kwargs.pop('out')
        
   arg_values, arg_types = prepare_args(untyped, args, kwargs)
   
@@ -55,6 +62,9 @@ def specialize(untyped, args, kwargs = {}, optimize = False):
   # other functions it calls
    
   typed_fn = type_inference.specialize(untyped, arg_types)
+  if output is not None:
+    typed_fn = mk_output_fn(typed_fn, _typeof(output))
+    linear_args = linear_args + [output]
   if optimize: 
     from .. transforms.pipeline import normalize 
     # apply high level optimizations 
@@ -63,6 +73,12 @@ def specialize(untyped, args, kwargs = {}, optimize = False):
 
    
 def run_typed_fn(fn, args, backend = None):
+  check = output_check(fn)
+  if check is not None:
+    return check(lambda *checked_args: run_unchecked(fn, checked_args, backend), args)
+  return run_unchecked(fn, args, backend)
+
+def run_unchecked(fn, args, backend = None):
   actual_types = tuple(type_conv.typeof(arg) for arg in  args)
   expected_types = fn.input_types
   assert actual_types == expected_types, \
@@ -109,6 +125,52 @@ def run_typed_fn(fn, args, backend = None):
   else:
     assert False, "Unknown backend %s" % backend 
 
+def compile_typed_fn(fn, args, backend = None):
+  """
+  For backends which generate Python extension modules, return the compiled
+  module (a CompiledPyFn) for the given (already prepared) arguments. 
+  Other backends return None since they can't be called directly. 
+  """
+  if backend is None:
+    backend = config.backend
+  
+  if backend == 'c':
+    return c_backend.compile_entry(fn, args)
+  elif backend == 'openmp':
+    return openmp_backend.compile_entry(fn, args)
+  else:
+    return None 
+
+def entry_module_args(fn, args, backend = None):
+  """
+  Lower a typed function for one of the extension module backends but stop 
+  before building it, returning the arguments for compile_module_from_source.
+  Returns None if the backend has already compiled this entry point 
+  or doesn't generate extension modules at all. 
+  """
+  if backend is None:
+    backend = config.backend
+  
+  if backend == 'c':
+    return c_backend.entry_module_args(fn, args)
+  elif backend == 'openmp':
+    return openmp_backend.entry_module_args(fn, args)
+  else:
+    return None 
+
+def add_entry(fn, args, compiled_fn, backend = None):
+  """
+  Hand a backend the module it would have built for these arguments, 
+  after building it from what entry_module_args returned  
+  """
+  if backend is None:
+    backend = config.backend
+  
+  if backend == 'c':
+    c_backend.add_entry(fn, args, compiled_fn)
+  elif backend == 'openmp':
+    openmp_backend.add_entry(fn, args, compiled_fn)
+
 def run_untyped_fn(fn, args, kwargs = None, backend = None):
   assert isinstance(fn, UntypedFn)
   if kwargs is None:
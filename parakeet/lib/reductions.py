@@ -1,14 +1,15 @@
 
-from ..frontend import jit, axis_macro 
+from ..frontend import jit, axis_macro, typed_macro, staged_typed_macro 
 from .. import prims 
 from adverbs import scan 
 
 from .. frontend import translate_function_value
 
-from .. syntax import Reduce, Const 
-from ..syntax.helpers import none, false, true, one_i32, zero_i32, zero_i24
+from ..ndtypes import ArrayT, NoneType, make_array_type
+from .. syntax import Reduce, Scan, Const, Call, Map, Ravel 
+from ..syntax.helpers import none, false, true, one_i32, zero_i32, zero_i24, unwrap_constant
  
-from adverbs import reduce
+from adverbs import reduce, ireduce
 from builtins import builtin_and, builtin_or
 from parakeet.syntax.delay_until_typed import DelayUntilTyped
 
@@ -67,13 +68,23 @@ def prod(x, axis=None):
 def mean(x, axis = None):
   return sum(x, axis = axis) / x.shape[0]
 
-@jit 
+def mk_scan(combiner, x, init, axis):
+  return Scan(fn = translate_function_value(_identity), 
+              combine = translate_function_value(combiner), 
+              emit = translate_function_value(_identity), 
+              args = (x,), 
+              init = init, 
+              axis = axis)
+
+# start from the smallest possible zero and one so that they 
+# don't change the element type of the result 
+@axis_macro 
 def cumsum(x, axis = None):
-  return scan(prims.add, x, axis = axis)
+  return mk_scan(prims.add, x, init = zero_i24, axis = axis)
 
-@jit 
+@axis_macro 
 def cumprod(x, axis = None):
-  return scan(prims.multiply, x, axis = axis)
+  return mk_scan(prims.multiply, x, init = true, axis = axis)
 
 @jit 
 def vdot(x,y):
@@ -82,60 +93,64 @@ def vdot(x,y):
   """
   return sum(x*y)
 
-@jit
-def argmax(x):
-  """
-  Currently assumes axis=None
-  TODO: 
-    - Support axis arguments
-    - use IndexReduce instead of explicit loop
-  
-      def argmax_map(curr_idx):
-        return curr_idx, x[curr_idx]
-  
-      def argmax_combine((i1,v1), (i2,v2)):
-        if v1 > v2:
-          return (i1,v1)
-        else:
-          return (i2,v2)
-    
-      return ireduce(combine=argmin_combine, shape=x.shape, map_fn=argmin_map, init = (0,x[0]))
-  """
-  bestval = x[0]
-  bestidx = 0
-  for i in xrange(1, len(x)):
-    currval = x[i]
-    if currval > bestval:
-      bestval = currval
-      bestidx = i
-  return bestidx 
+def _argmax_combine(acc, elt):
+  # break ties in favor of the lower index so that the result doesn't 
+  # depend on how the indices got split up between threads 
+  if elt[0] > acc[0] or (elt[0] == acc[0] and elt[1] < acc[1]):
+    return elt 
+  else:
+    return acc 
 
-@jit
-def argmin(x):
+def _argmin_combine(acc, elt):
+  if elt[0] < acc[0] or (elt[0] == acc[0] and elt[1] < acc[1]):
+    return elt 
+  else:
+    return acc 
+
+@jit 
+def _argmax_vec(x):
+  return ireduce(lambda i: (x[i], i), _argmax_combine, len(x), init = (x[0], 0))[1]
+
+@jit 
+def _argmin_vec(x):
+  return ireduce(lambda i: (x[i], i), _argmin_combine, len(x), init = (x[0], 0))[1]
+
+def _arg_reduce(vec_fn, x, axis):
   """
-  Currently assumes axis=None
-  TODO: 
-    - Support axis arguments
-    - use IndexReduce instead of explicit loop
-  
-      def argmin_map(curr_idx):
-        return curr_idx, x[curr_idx]
-  
-      def argmin_combine((i1,v1), (i2,v2)):
-        if v1 < v2:
-          return (i1,v1)
-        else:
-          return (i2,v2)
-    
-      return ireduce(combine=argmin_combine, shape=x.shape, map_fn=argmin_map, init = (0,x[0]))
+  Call the 1D arg-reduction on the flattened array when there's no axis, 
+  otherwise map it over the axis which isn't getting reduced so that 
+  each output element gets computed independently 
   """
-  bestval = x[0]
-  bestidx = 0
-  for i in xrange(1, len(x)):
-    currval = x[i]
-    if currval < bestval:
-      bestval = currval
-      bestidx = i
-  return bestidx 
+  from ..type_inference import specialize
+  if not isinstance(x.type, ArrayT):
+    raise TypeError("Arg-reductions expect an array, got %s : %s" % (x, x.type))
+  if axis is not None and axis.__class__ is not Const and axis.type is not NoneType:
+    raise ValueError("Arg-reductions expect a constant axis, got %s" % (axis,))
+  rank = x.type.rank 
+  axis = unwrap_constant(axis)
+  if axis is not None:
+    if axis < -rank or axis >= rank:
+      raise ValueError("Axis %s out of bounds for %d-dimensional array" % (axis, rank))
+    if axis < 0:
+      axis += rank 
+    if rank > 2:
+      raise ValueError("Arg-reductions along an axis only supported for vectors and matrices, given %s" % 
+                       (x.type,))
+  vec_t = make_array_type(x.type.elt_type, 1)
+  typed_vec_fn = specialize(translate_function_value(vec_fn), [vec_t])
+  if axis is None or rank == 1:
+    if rank > 1:
+      x = Ravel(x, type = vec_t)
+    return Call(fn = typed_vec_fn, args = [x], type = typed_vec_fn.return_type)
+  result_t = make_array_type(typed_vec_fn.return_type, 1)
+  return Map(fn = typed_vec_fn, args = (x,), axis = 1 - axis, type = result_t)
+
+@staged_typed_macro("axis")
+def argmax(x, axis = None):
+  return _arg_reduce(_argmax_vec, x, axis)
+
+@staged_typed_macro("axis")
+def argmin(x, axis = None):
+  return _arg_reduce(_argmin_vec, x, axis)
 
 
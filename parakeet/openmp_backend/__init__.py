@@ -1,2 +1,2 @@
 from multicore_compiler import MulticoreCompiler
-from run_function import run 
\ No newline at end of file
+from run_function import run, compile_entry, entry_module_args, add_entry
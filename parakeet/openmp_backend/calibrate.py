@@ -0,0 +1,117 @@
+"""
+Decide how much work a parallel region needs before it's worth waking up
+other threads. Unless openmp_backend.config.min_parallel_work is 'calibrate'
+this is just the configured number, otherwise we time an empty parallel
+region against a simple arithmetic loop once per machine and keep the
+result in the cache directory.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+
+from ..c_backend import config as c_config
+from ..c_backend.compile_util import compile_module_from_source
+from ..c_backend.shell_command import CommandFailed
+from ..c_backend.system_info import get_compiler
+import config
+
+# used when calibration isn't possible
+default_min_parallel_work = 20000
+
+# how many times more work than the cost of starting a parallel region
+# we want before going parallel
+overhead_factor = 2.0
+
+module_name = "omp_calibrate"
+
+calibrate_source = """
+static PyObject* omp_calibrate(PyObject* dummy, PyObject* args) {
+  int reps, r;
+  int64_t i, n;
+  double start, regions_done, units_done;
+  volatile double sink = 0.0;
+  double x = 1.0;
+  if (!PyArg_ParseTuple(args, "i", &reps)) { return NULL; }
+  n = (int64_t) reps * 1000;
+  Py_BEGIN_ALLOW_THREADS
+  start = omp_get_wtime();
+  for (r = 0; r < reps; ++r) {
+    #pragma omp parallel
+    {
+      if (omp_get_thread_num() < 0) { sink = 1.0; }
+    }
+  }
+  regions_done = omp_get_wtime();
+  for (i = 0; i < n; ++i) { x = x * 1.0000001 + 1e-9; }
+  sink = x;
+  units_done = omp_get_wtime();
+  Py_END_ALLOW_THREADS
+  /* seconds per parallel region, seconds per operation */
+  return Py_BuildValue("dd", (regions_done - start) / reps,
+                             (units_done - regions_done) / (2.0 * n));
+}
+"""
+
+def measure(reps = 2000):
+  """
+  Returns the cost of starting a parallel region in units of simple
+  operations, or None if we can't build the timing code
+  """
+  try:
+    compiled = compile_module_from_source(calibrate_source, module_name,
+                                          extra_headers = ["omp.h"],
+                                          extra_compile_flags = ["-fopenmp"],
+                                          extra_link_flags = ["-fopenmp"])
+  except CommandFailed:
+    return None
+  # first round warms up the thread pool
+  compiled.c_fn(10)
+  region_time, unit_time = compiled.c_fn(reps)
+  return region_time / max(unit_time, 1e-12)
+
+def calibration_filename():
+  h = hashlib.sha224()
+  h.update(repr((get_compiler(), multiprocessing.cpu_count(),
+                 os.environ.get('OMP_NUM_THREADS'))))
+  return os.path.join(c_config.cache_dir, "omp_calibration_%s.json" % h.hexdigest())
+
+_calibrated = []
+def calibrated_min_parallel_work():
+  if _calibrated:
+    return _calibrated[0]
+  filename = calibration_filename() if c_config.cache_dir else None
+  result = None
+  if filename is not None and os.path.exists(filename):
+    try:
+      with open(filename) as f:
+        result = json.load(f)['min_parallel_work']
+    except (IOError, ValueError, KeyError):
+      result = None
+  if result is None:
+    overhead = measure()
+    if overhead is None:
+      result = default_min_parallel_work
+    else:
+      result = int(overhead * overhead_factor)
+      if filename is not None:
+        tmp_name = "%s.%d.tmp" % (filename, os.getpid())
+        try:
+          with open(tmp_name, 'w') as f:
+            json.dump({'min_parallel_work' : result, 'overhead' : overhead}, f)
+          os.rename(tmp_name, filename)
+        except (IOError, OSError):
+          pass
+  _calibrated.append(result)
+  return result
+
+def min_parallel_work():
+  """
+  Estimated number of operations below which parallel regions run serially,
+  None means always run them in parallel
+  """
+  setting = config.min_parallel_work
+  if setting == 'calibrate':
+    return calibrated_min_parallel_work()
+  return setting
@@ -1,2 +1,31 @@
 collapse_nested_loops = True
 schedule = 'static'
+
+# generate parallel loops with schedule(runtime) so that the schedule and
+# chunk size can be picked per call (see openmp_backend.runtime),
+# otherwise the schedule above gets compiled in
+runtime_schedule = True
+
+# parallel regions whose estimated work (roughly the number of simple 
+# operations summed over all iterations) falls below this run on one thread, 
+# None always runs them in parallel and 'calibrate' measures the cost of 
+# starting a parallel region on this machine (see openmp_backend.calibrate)
+min_parallel_work = 20000
+
+# split parallel loops over two or three dimensions whose iterations reuse
+# their inputs (like allpairs or matrix multiplication) into tiles of this 
+# many iterations per dimension, 'auto' sizes them from the element size and 
+# the cache sizes in system_info, None or False turns tiling off 
+# (also settable per call with the _tile keyword, see openmp_backend.tiling)
+tile_sizes = 'auto'
+
+# as soon as a big array gets allocated outside of any parallel loop, write to 
+# each of its pages from a parallel loop with a static schedule, so that on 
+# NUMA machines every page lands on the node whose threads will fill it in 
+# and read it back (assuming those loops also split their iterations 
+# statically), rather than on the node of whichever thread touches it first.
+# 'auto' only does this on machines with more than one NUMA node.
+first_touch = 'auto' 
+
+# arrays smaller than this many bytes are left alone
+first_touch_min_bytes = 1 << 20
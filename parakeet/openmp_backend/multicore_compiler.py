@@ -1,23 +1,35 @@
-import multiprocessing 
-
-from .. import prims 
+from .. import prims, system_info 
+from ..analysis import contains_adverbs, contains_loops
+from ..analysis.contains import contains_parfor
+from ..analysis.cost_estimate import estimate_cost
 from ..syntax import Expr, Tuple, Assign, Return, Var, PrimCall 
 from ..syntax.helpers import get_fn, return_type
 from ..ndtypes import ScalarT, TupleT, ArrayT
 from ..c_backend import PyModuleCompiler
+from ..c_backend import config as c_config 
 
+from calibrate import min_parallel_work
 import config 
+import tiling 
 
 class MulticoreCompiler(PyModuleCompiler):
   
   def __init__(self, depth = 0, *args, **kwargs):
     self.depth = depth
     self.seen_parfor = None 
+    # look the threshold up (and maybe calibrate it) once per entry point 
+    # and hand it down to nested compilers, rather than in the middle of codegen
+    if 'min_parallel_work' in kwargs:
+      self.min_parallel_work = kwargs.pop('min_parallel_work')
+    else:
+      self.min_parallel_work = min_parallel_work()
     PyModuleCompiler.__init__(self, *args, **kwargs)
   
   @property 
   def cache_key(self):
-    return self.__class__, self.depth > 0
+    return self.__class__, self.depth > 0, config.runtime_schedule, self.min_parallel_work, \
+      tiling.current_setting(), self.use_first_touch(), config.first_touch_min_bytes, \
+      self.releases_gil()
   
   _loop_var_names = ["i","j","k","l","a","b","c","ii","jj","kk","ll","aa","bb","cc"] 
   def loop_vars(self, count, init_value = "0"):
@@ -26,8 +38,11 @@ class MulticoreCompiler(PyModuleCompiler):
             for i in xrange(count)]
        
   def visit_NumCores(self, expr):
-    # by default we're running sequentially 
-    return "%d" % multiprocessing.cpu_count()
+    # ask at runtime since the number of threads can change between calls
+    self.add_compile_flag("-fopenmp")
+    self.add_link_flag("-fopenmp")
+    self.add_decl("int omp_get_max_threads(void)")
+    return "omp_get_max_threads()"
   
   def tuple_to_var_list(self, expr):
     assert isinstance(expr, Expr)
@@ -43,7 +58,8 @@ class MulticoreCompiler(PyModuleCompiler):
   
   def get_fn_name(self, fn_expr, attributes = [], inline = True):
     return PyModuleCompiler.get_fn_name(self, fn_expr, 
-                                        compiler_kwargs = {'depth':self.depth}, 
+                                        compiler_kwargs = {'depth':self.depth, 
+                                                           'min_parallel_work':self.min_parallel_work}, 
                                         attributes = attributes, 
                                         inline = inline)
   
@@ -104,19 +120,177 @@ class MulticoreCompiler(PyModuleCompiler):
   def exit_parfor(self):
     self.depth -= 1
 
-  def omp_pragma(self, n_loops, private_vars, reduce_op = None, reduce_vars = None):
+  def allow_threads(self):
+    """
+    Code to release and reacquire the GIL around a top-level parallel region, 
+    or nothing if the entry point already runs without it (since releasing 
+    the GIL twice would crash)
+    """
+    if self.releases_gil():
+      return "", ""
+    return "\nPy_BEGIN_ALLOW_THREADS\n", "\nPy_END_ALLOW_THREADS\n"
+
+  def omp_schedule(self):
+    # with a runtime schedule the kind of schedule and chunk size come from 
+    # openmp_backend.runtime (or OMP_SCHEDULE) rather than being baked in
+    return "runtime" if config.runtime_schedule else config.schedule 
+  
+  def parallel_if(self, bounds, fn_exprs):
+    """
+    OpenMP if clause which keeps regions with too little work to pay for 
+    starting up threads on the calling thread. The work is the trip count 
+    times the estimated cost of each iteration, so we compare the trip count 
+    against a constant. 
+    """
+    threshold = self.min_parallel_work
+    if not threshold:
+      return ""
+    cost_per_iter = sum(estimate_cost(get_fn(fn_expr)) for fn_expr in fn_exprs)
+    min_iters = (threshold + cost_per_iter - 1) // cost_per_iter
+    if min_iters <= 1:
+      return ""
+    trip_count = " * ".join("((int64_t) (%s))" % bound for bound in bounds)
+    return " if(%s >= %dLL)" % (trip_count, min_iters)
+  
+  def simd_loops(self, fn_exprs):
+    """
+    Can the innermost loop calling these functions run its iterations in 
+    SIMD lanes? Only if it's the innermost loop once they get inlined, 
+    since the C compiler won't vectorize the outer loop of a nest. 
+    """
+    if not c_config.simd:
+      return False 
+    for fn_expr in fn_exprs:
+      fn = get_fn(fn_expr)
+      if contains_adverbs(fn) or contains_parfor(fn) or contains_loops(fn):
+        return False 
+    return True 
+  
+  def omp_pragma(self, n_loops, private_vars, reduce_op = None, reduce_vars = None, 
+                 parallel_if = "", simd = False):
+    # each thread's share of the iterations can also be split between SIMD lanes
+    loop_kind = "for simd" if simd else "for" 
     if config.collapse_nested_loops:
-      omp = "#pragma omp parallel for private(%s) schedule(%s)" % \
-        (", ".join(private_vars), config.schedule)
+      omp = "#pragma omp parallel %s private(%s) schedule(%s)" % \
+        (loop_kind, ", ".join(private_vars), self.omp_schedule())
       if n_loops > 1:
         omp += " collapse(%d)" % n_loops
     else:
-      omp = "#pragma omp parallel for private(%s) schedule(%s)" % \
-          (private_vars[0], config.schedule)
+      # the inner loops (and tiles) run sequentially within each thread 
+      # so their variables need to be private as well 
+      assert not simd or n_loops == 1, "Can't vectorize the outer loop of a nest"
+      omp = "#pragma omp parallel %s private(%s) schedule(%s)" % \
+          (loop_kind, ", ".join(private_vars), self.omp_schedule())
     
     if reduce_op:
       omp += " reduction (%s:%s)" % (reduce_op, ", ".join(reduce_vars))
-    return omp 
+    return omp + parallel_if
+  
+  def loop_tile_sizes(self, fn_expr, n_loops):
+    """
+    C expressions for the tile size of each loop, or None if the loops 
+    shouldn't be tiled. Only loops whose body does enough work per 
+    iteration to be reading whole rows of its inputs get tiled, a body 
+    which just touches one element of each array has nothing to reuse. 
+    """
+    fn = get_fn(fn_expr)
+    if not (contains_adverbs(fn) or contains_loops(fn)):
+      return None
+    sizes = tiling.tile_sizes(n_loops)
+    if sizes is None:
+      return None
+    elif sizes == 'auto':
+      return [self.auto_tile_size(fn_expr, n_loops)] * n_loops
+    else:
+      return ["%dLL" % size for size in sizes]
+  
+  def auto_tile_size(self, fn_expr, n_loops):
+    """
+    Pick square tiles when the loops run: each iteration is assumed to touch 
+    a row from the multidimensional arrays it gets passed, so a tile with 
+    sides of length n touches about n_loops * n of the longest rows, 
+    which should fit in half of the L2 cache.
+    """
+    fn = get_fn(fn_expr)
+    closure_args = self.get_closure_args(fn_expr)
+    row_bytes = self.fresh_var("int64_t", "row_bytes", "64")
+    for arg, t in zip(closure_args, fn.input_types):
+      if isinstance(t, ArrayT) and t.rank > 1:
+        self.append("""
+          if (%(arg)s.shape[0] > 0 && %(arg)s.size / %(arg)s.shape[0] * %(nbytes)d > %(row_bytes)s) { 
+            %(row_bytes)s = %(arg)s.size / %(arg)s.shape[0] * %(nbytes)d;
+          }""" % dict(arg = arg, nbytes = t.elt_type.nbytes, row_bytes = row_bytes))
+    tile_size = self.fresh_var("int64_t", "tile_size", 
+                               "%dLL / (%d * %s)" % (system_info.l2_cache_bytes, 
+                                                     2 * n_loops, row_bytes))
+    self.append("if (%s < %d) { %s = %d; }" % (tile_size, tiling.min_tile_size, 
+                                               tile_size, tiling.min_tile_size))
+    return tile_size 
+  
+  def build_tiled_loops(self, loop_vars, bounds, body, tile_sizes):
+    """
+    Loops over tiles of the index space (which is what gets split between 
+    threads) around loops over the iterations of each tile, returns 
+    the C source and the tile loop variables  
+    """
+    tile_vars = [self.fresh_var("int64_t", "tile_%s" % loop_var) for loop_var in loop_vars]
+    stops = [self.fresh_name("%s_stop" % loop_var) for loop_var in loop_vars]
+    inner = body 
+    for var, bound, tile_var, stop, size in \
+        reversed(zip(loop_vars, bounds, tile_vars, stops, tile_sizes)):
+      inner = """
+      {
+        int64_t %(stop)s = (%(tile_var)s + 1) * %(size)s;
+        if (%(stop)s > %(bound)s) { %(stop)s = %(bound)s; }
+        for (%(var)s = %(tile_var)s * %(size)s; %(var)s < %(stop)s; ++%(var)s) {
+          %(inner)s
+        }
+      }""" % locals()
+    for tile_var, bound, size in reversed(zip(tile_vars, bounds, tile_sizes)):
+      inner = """
+      for (%(tile_var)s = 0; %(tile_var)s < ((%(bound)s) + %(size)s - 1) / %(size)s; ++%(tile_var)s) {
+        %(inner)s
+      }""" % locals()
+    return inner, tile_vars
+  
+  def alloc_array(self, array_t, shape_expr):
+    result = PyModuleCompiler.alloc_array(self, array_t, shape_expr)
+    # arrays allocated inside a parallel loop belong to the thread running it  
+    if self.depth == 0 and self.use_first_touch():
+      self.first_touch(result, array_t)
+    return result 
+  
+  def use_first_touch(self):
+    if config.first_touch == 'auto':
+      return system_info.numa_nodes > 1
+    return bool(config.first_touch)
+  
+  def first_touch(self, array, array_t):
+    """
+    Spread the pages of a freshly allocated array between threads the same 
+    way a statically scheduled loop over it would, by writing to one byte of 
+    each page. The array is still uninitialized so this doesn't change its 
+    contents, it just makes the OS place every page near the thread touching 
+    it first. 
+    """
+    self.add_compile_flag("-fopenmp")
+    self.add_link_flag("-fopenmp")
+    n_bytes = self.fresh_var("int64_t", "n_bytes", 
+                             "%s.size * %d" % (array, array_t.elt_type.nbytes))
+    page = self.fresh_var("int64_t", "page")
+    release_gil, acquire_gil = self.allow_threads()
+    self.append("""
+    if (%(n_bytes)s >= %(min_bytes)dLL) {
+      char* touch_ptr = (char*) %(array)s.data.raw_ptr;
+      %(release_gil)s
+      #pragma omp parallel for schedule(static)
+      for (%(page)s = 0; %(page)s < %(n_bytes)s; %(page)s += %(page_bytes)d) {
+        touch_ptr[%(page)s] = 0;
+      }
+      %(acquire_gil)s
+    }""" % dict(n_bytes = n_bytes, min_bytes = config.first_touch_min_bytes, 
+                array = array, page = page, page_bytes = system_info.page_bytes, 
+                release_gil = release_gil, acquire_gil = acquire_gil))
   
   def visit_ParFor(self, stmt):
     bounds = self.tuple_to_var_list(stmt.bounds)
@@ -125,16 +299,29 @@ class MulticoreCompiler(PyModuleCompiler):
     
     self.enter_parfor()
     body, private_vars = self.build_loop_body(stmt.fn, loop_vars)
-    loops = self.build_loops(loop_vars, bounds, body)
     self.exit_parfor()
     
+    simd = self.simd_loops([stmt.fn])
     if self.depth == 0:  
-      release_gil = "\nPy_BEGIN_ALLOW_THREADS\n"
-      acquire_gil = "\nPy_END_ALLOW_THREADS\n" 
-      omp = self.omp_pragma(len(loop_vars), private_vars)
+      tile_sizes = self.loop_tile_sizes(stmt.fn, n_vars)
+      if tile_sizes:
+        loops, tile_vars = self.build_tiled_loops(loop_vars, bounds, body, tile_sizes)
+        private_vars = tile_vars + private_vars 
+        parallel_simd = False 
+      elif simd and n_vars > 1 and not config.collapse_nested_loops:
+        loops = self.build_loops(loop_vars, bounds, body, self.simd_pragma())
+        parallel_simd = False 
+      else:
+        loops = self.build_loops(loop_vars, bounds, body)
+        parallel_simd = simd 
+      release_gil, acquire_gil = self.allow_threads()
+      omp = self.omp_pragma(len(loop_vars), private_vars, 
+                            parallel_if = self.parallel_if(bounds, [stmt.fn]), 
+                            simd = parallel_simd)
       return release_gil + omp + loops + acquire_gil    
     else:
-      return loops 
+      return self.build_loops(loop_vars, bounds, body, 
+                              self.simd_pragma() if simd else None)
      
   
   
@@ -198,19 +385,116 @@ class MulticoreCompiler(PyModuleCompiler):
        
     
       
+  def can_combine_in_parallel(self, acc_t, expr):
+    """
+    Reductions and scans with arbitrary combiners can run in parallel if each 
+    thread can start its partial result from the first element it sees and 
+    the partial results can then be merged with the same combiner 
+    """
+    if isinstance(acc_t, TupleT):
+      if not all(isinstance(t, ScalarT) for t in acc_t.elt_types):
+        return False 
+    elif not isinstance(acc_t, ScalarT):
+      return False 
+    combine_fn = get_fn(expr.combine)
+    return return_type(expr.fn) == acc_t and \
+           tuple(combine_fn.input_types[-2:]) == (acc_t, acc_t) and \
+           return_type(combine_fn) == acc_t
+  
+  def parallel_reduce(self, expr, acc, bounds):
+    """
+    Every thread reduces its own block of the index space into a private 
+    accumulator, the partial results then get merged in thread order 
+    (so the combiner only has to be associative, not commutative). 
+    If there isn't memory for the partial results the whole reduction 
+    runs on the calling thread. 
+    """
+    acc_t = self.to_ctype(expr.type)
+    loop_vars = self.loop_vars(len(bounds))
+    elt = self.fresh_var(expr.type, "elt")
+    self.add_decl("int omp_get_thread_num(void)")
+    self.add_decl("int omp_get_num_threads(void)")
+    self.add_decl("int omp_get_max_threads(void)")
+    
+    self.enter_parfor()
+    body, private_vars = self.build_loop_body(expr.fn, loop_vars, target_name = elt)
+    combine_name, combine_closure_args, _ = self.get_fn_info(expr.combine)
+    self.exit_parfor()
+    
+    local_acc = self.fresh_name("local_acc")
+    has_local = self.fresh_name("has_local")
+    combine_local = "%s(%s)" % (combine_name, ", ".join(tuple(combine_closure_args) + (local_acc, elt)))
+    body += """
+      if (%(has_local)s) { %(local_acc)s = %(combine_local)s; }
+      else { %(local_acc)s = %(elt)s; %(has_local)s = 1; }
+    """ % locals()
+    loops = self.build_loops(loop_vars, bounds, body)
+    collapse = " collapse(%d)" % len(loop_vars) \
+               if config.collapse_nested_loops and len(loop_vars) > 1 else ""
+    private = ", ".join(private_vars + [elt])
+    parallel_if = self.parallel_if(bounds, [expr.fn, expr.combine])
+    release_gil, acquire_gil = self.allow_threads()
+    
+    partials = self.fresh_name("partials")
+    has_partial = self.fresh_name("has_partial")
+    max_partials = self.fresh_name("max_partials")
+    n_partials = self.fresh_name("n_partials")
+    thread_idx = self.fresh_name("thread_idx")
+    combine_partial = "%s(%s)" % (combine_name, 
+                                  ", ".join(tuple(combine_closure_args) + 
+                                            (acc, "%s[%s]" % (partials, thread_idx))))
+    combine_sequential = "%s(%s)" % (combine_name, 
+                                     ", ".join(tuple(combine_closure_args) + (acc, local_acc)))
+    # no team is bigger than omp_get_max_threads(), so allocating that many 
+    # partial results before the region lets us check for failure up front  
+    return """
+    {
+      int %(max_partials)s = omp_get_max_threads();
+      %(acc_t)s* %(partials)s = (%(acc_t)s*) malloc(sizeof(%(acc_t)s) * %(max_partials)s);
+      char* %(has_partial)s = (char*) calloc(%(max_partials)s, 1);
+      int %(n_partials)s = 0;
+      int %(thread_idx)s;
+      if (%(partials)s && %(has_partial)s) {
+        %(release_gil)s
+        #pragma omp parallel private(%(private)s)%(parallel_if)s
+        {
+          %(acc_t)s %(local_acc)s;
+          int %(has_local)s = 0;
+          #pragma omp single
+          {
+            %(n_partials)s = omp_get_num_threads();
+          }
+          #pragma omp for schedule(static)%(collapse)s
+          %(loops)s
+          %(partials)s[omp_get_thread_num()] = %(local_acc)s;
+          %(has_partial)s[omp_get_thread_num()] = %(has_local)s;
+        }
+        %(acquire_gil)s
+        for (%(thread_idx)s = 0; %(thread_idx)s < %(n_partials)s; ++%(thread_idx)s) {
+          if (%(has_partial)s[%(thread_idx)s]) { %(acc)s = %(combine_partial)s; }
+        }
+      } else {
+        /* out of memory for the partial results, reduce on this thread */
+        %(acc_t)s %(local_acc)s;
+        int %(has_local)s = 0;
+        %(loops)s
+        if (%(has_local)s) { %(acc)s = %(combine_sequential)s; }
+      }
+      free(%(partials)s);
+      free(%(has_partial)s);
+    }
+    """ % locals()
+    
   def visit_IndexReduce(self, expr):
     """
-    For now, just use a sequential implementation for reductions
+    Use OpenMP's reduction clause for simple combiners like addition, 
+    give each thread its own accumulator for anything else 
     """
     bounds = self.tuple_to_var_list(expr.shape)
     n_vars = len(bounds)
     acc = self.fresh_var(expr.type, "acc", self.visit_expr(expr.init))
-    # try to get a simple primitive to use as the OpenMP combiner
-    # if this isn't possible then run the loops sequentially
-    #
-    # TODO: instead of falling back on sequential execution 
-    # use complex combiners by generating one 
-    # accumulator value per thread and then combining those
+    # try to get a simple primitive to use as the OpenMP combiner, 
+    # otherwise build our own reduction from per-thread accumulators 
     combine_prim = self.get_binop_prim(expr.combine)
     if combine_prim is prims.add:
       omp_reduce_op = "+"
@@ -222,7 +506,12 @@ class MulticoreCompiler(PyModuleCompiler):
       omp_reduce_op = "||"
     else:
       omp_reduce_op = None 
- 
+    
+    if omp_reduce_op is None and self.depth == 0 and \
+       self.can_combine_in_parallel(expr.type, expr):
+      self.append(self.parallel_reduce(expr, acc, bounds))
+      return acc 
+    
     loop_vars = self.loop_vars(n_vars)
     assert expr.init is not None, "Accumulator required but not given"
     elt = self.fresh_var(return_type(expr.fn), "elt")
@@ -234,39 +523,163 @@ class MulticoreCompiler(PyModuleCompiler):
       combine_name, combine_closure_args, _ = self.get_fn_info(expr.combine)
       combine_arg_str = ", ".join(tuple(combine_closure_args) + (acc, elt))
       body += "\n%s = %s(%s);\n" % (acc, combine_name, combine_arg_str)
-    loops = self.build_loops(loop_vars, bounds, body)
     if omp_reduce_op: 
       self.exit_parfor()
-
+    simd = omp_reduce_op is not None and self.simd_loops([expr.fn])
+    
     if omp_reduce_op and self.depth == 0:
-      release_gil = "\nPy_BEGIN_ALLOW_THREADS\n"
-      acquire_gil = "\nPy_END_ALLOW_THREADS\n" 
+      # only a collapsed loop nest can be split between both threads and lanes 
+      inner_simd = simd and n_vars > 1 and not config.collapse_nested_loops 
+      inner_pragma = self.simd_pragma({acc : omp_reduce_op}) if inner_simd else None
+      loops = self.build_loops(loop_vars, bounds, body, inner_pragma)
+      release_gil, acquire_gil = self.allow_threads()
       omp = self.omp_pragma(len(loop_vars), private_vars, 
                             reduce_op = omp_reduce_op, 
-                            reduce_vars = [acc])
+                            reduce_vars = [acc], 
+                            parallel_if = self.parallel_if(bounds, [expr.fn]), 
+                            simd = simd and not inner_simd)
       loops = release_gil + omp + loops + acquire_gil    
+    else:
+      inner_pragma = self.simd_pragma({acc : omp_reduce_op}) if simd else None
+      loops = self.build_loops(loop_vars, bounds, body, inner_pragma)
     self.append(loops)
     return acc 
     
+  def parallel_scan(self, expr, result, bound):
+    """
+    Blocked scan of a one-dimensional index space: 
+      1) every thread reduces its own block 
+      2) one thread turns the block totals into the accumulated values 
+         at the start of each block 
+      3) every thread rescans its block starting from that value and 
+         fills in its part of the output 
+    If there isn't memory for the block totals the whole scan runs 
+    on the calling thread. 
+    """
+    acc_t = self.to_ctype(expr.init.type)
+    init = self.fresh_var(expr.init.type, "init_acc", self.visit_expr(expr.init))
+    (i,) = self.loop_vars(1)
+    elt = self.fresh_var(expr.init.type, "elt")
+    self.add_decl("int omp_get_thread_num(void)")
+    self.add_decl("int omp_get_num_threads(void)")
+    self.add_decl("int omp_get_max_threads(void)")
+    
+    self.enter_parfor()
+    elt_body, private_vars = self.build_loop_body(expr.fn, [i], target_name = elt)
+    combine_name, combine_closure_args, _ = self.get_fn_info(expr.combine)
+    emit_name, emit_closure_args, _ = self.get_fn_info(expr.emit)
+    self.exit_parfor()
+    private = ", ".join(private_vars + [elt])
+    # every element gets visited twice 
+    parallel_if = self.parallel_if([bound], [expr.fn, expr.fn, expr.combine, 
+                                             expr.combine, expr.emit])
+    release_gil, acquire_gil = self.allow_threads()
+    
+    def combine(x, y):
+      return "%s(%s)" % (combine_name, ", ".join(tuple(combine_closure_args) + (x, y)))
+    
+    local_acc = self.fresh_name("local_acc")
+    prefixes = self.fresh_name("block_prefixes")
+    has_total = self.fresh_name("has_block_total")
+    n_blocks = self.fresh_name("n_blocks")
+    max_blocks = self.fresh_name("max_blocks")
+    block_idx = self.fresh_name("block_idx")
+    block_start = self.fresh_name("block_start")
+    block_stop = self.fresh_name("block_stop")
+    
+    reduce_block = combine(local_acc, elt)
+    merge_block = combine("%s[%s]" % (prefixes, block_idx), "%s[%s+1]" % (prefixes, block_idx))
+    scan_block = combine(local_acc, elt)
+    emit_value = "%s(%s)" % (emit_name, ", ".join(tuple(emit_closure_args) + (local_acc,)))
+    store = self.setidx(result, [i], emit_value, full_array = True, return_stmt = True)
+    # allocated for the biggest possible team before the region, 
+    # so a failed allocation can fall back on a sequential scan 
+    return """
+    {
+      int %(max_blocks)s = omp_get_max_threads();
+      %(acc_t)s* %(prefixes)s = (%(acc_t)s*) malloc(sizeof(%(acc_t)s) * (%(max_blocks)s + 1));
+      char* %(has_total)s = (char*) calloc(%(max_blocks)s, 1);
+      int %(n_blocks)s = 0;
+      if (%(prefixes)s && %(has_total)s) {
+        %(release_gil)s
+        #pragma omp parallel private(%(private)s)%(parallel_if)s
+        {
+          int %(block_idx)s = omp_get_thread_num();
+          int64_t %(block_start)s, %(block_stop)s;
+          %(acc_t)s %(local_acc)s;
+          #pragma omp single
+          {
+            %(n_blocks)s = omp_get_num_threads();
+          }
+          %(block_start)s = ((%(bound)s) * %(block_idx)s) / %(n_blocks)s;
+          %(block_stop)s = ((%(bound)s) * (%(block_idx)s + 1)) / %(n_blocks)s;
+          for (%(i)s = %(block_start)s; %(i)s < %(block_stop)s; ++%(i)s) {
+            %(elt_body)s
+            if (%(i)s == %(block_start)s) { %(local_acc)s = %(elt)s; }
+            else { %(local_acc)s = %(reduce_block)s; }
+          }
+          if (%(block_stop)s > %(block_start)s) {
+            %(prefixes)s[%(block_idx)s + 1] = %(local_acc)s;
+            %(has_total)s[%(block_idx)s] = 1;
+          }
+          #pragma omp barrier
+          #pragma omp single
+          {
+            %(prefixes)s[0] = %(init)s;
+            for (%(block_idx)s = 0; %(block_idx)s < %(n_blocks)s; ++%(block_idx)s) {
+              if (%(has_total)s[%(block_idx)s]) { 
+                %(prefixes)s[%(block_idx)s + 1] = %(merge_block)s; 
+              } else { 
+                %(prefixes)s[%(block_idx)s + 1] = %(prefixes)s[%(block_idx)s]; 
+              }
+            }
+          }
+          %(block_idx)s = omp_get_thread_num();
+          %(local_acc)s = %(prefixes)s[%(block_idx)s];
+          for (%(i)s = %(block_start)s; %(i)s < %(block_stop)s; ++%(i)s) {
+            %(elt_body)s
+            %(local_acc)s = %(scan_block)s;
+            %(store)s
+          }
+        }
+        %(acquire_gil)s
+      } else {
+        /* out of memory for the block totals, scan on this thread */
+        %(acc_t)s %(local_acc)s = %(init)s;
+        for (%(i)s = 0; %(i)s < (%(bound)s); ++%(i)s) {
+          %(elt_body)s
+          %(local_acc)s = %(scan_block)s;
+          %(store)s
+        }
+      }
+      free(%(prefixes)s);
+      free(%(has_total)s);
+    }
+    """ % locals()
+  
   def visit_IndexScan(self, expr):
     """
-    For now, just use a sequential implementation for scans
+    Scans over one dimension with a suitable combiner run in parallel, 
+    anything else uses a sequential implementation 
     """
     assert isinstance(expr.type, ArrayT), "Expected output of Scan to be an array"
     
     bounds = self.tuple_to_var_list(expr.shape)
     n_vars = len(bounds)
     
-    combine_name, combine_closure_args, _ = self.get_fn_info(expr.combine)
-    loop_vars = self.loop_vars(n_vars)
-    
-    
     result = self.alloc_array(expr.type, expr.shape)
     
     assert expr.init is not None, "Accumulator required but not given"
     
     elt_t = return_type(expr.fn) 
     assert isinstance(elt_t, ScalarT), "Scans of non-scalar values (%s) not yet implemented" % elt_t
+    
+    if n_vars == 1 and self.depth == 0 and self.can_combine_in_parallel(expr.init.type, expr):
+      self.append(self.parallel_scan(expr, result, bounds[0]))
+      return result 
+    
+    combine_name, combine_closure_args, _ = self.get_fn_info(expr.combine)
+    loop_vars = self.loop_vars(n_vars)
     elt = self.fresh_var(elt_t, "elt")
     body, _ = self.build_loop_body(expr.fn, loop_vars, target_name = elt)
     acc = self.fresh_var(expr.init.type, "acc", self.visit_expr(expr.init))
@@ -3,22 +3,57 @@ from .. import config
 from ..c_backend.prepare_args import prepare_args  
 from ..transforms.pipeline import lower_to_adverbs  
 from ..value_specialization import specialize
+from ..caches import LRUCache
 
 
 from multicore_compiler import MulticoreCompiler 
+import runtime 
+import tiling 
 
-_cache = {}
-def run(fn, args):
-  args = prepare_args(args, fn.input_types)
+_cache = LRUCache('openmp_backend')
+def lower_entry(fn, args):
   fn = lower_to_adverbs.apply(fn)
   if config.value_specialization:
     fn = specialize(fn, python_values = args)
-  key = fn.cache_key 
+  return fn 
+
+def compile_entry(fn, args):
+  """
+  Lower and compile a typed function into a multi-threaded Python extension, 
+  expects its arguments to have already gone through prepare_args 
+  and returns the CompiledPyFn whose c_fn is its entry point
+  """
+  # the calling thread needs our default schedule before its first parallel loop 
+  runtime.load()
+  runtime.sync()
+  fn = lower_entry(fn, args)
+  key = fn.cache_key, tiling.current_setting()
   if key in _cache:
-    return _cache[key](*args)
+    return _cache[key]
   else:
     compiled_fn = MulticoreCompiler().compile_entry(fn)
-    c_fn = compiled_fn.c_fn 
-    _cache[key] = c_fn 
-    return c_fn(*args)
-  
\ No newline at end of file
+    _cache[key] = compiled_fn 
+    return compiled_fn
+
+def entry_module_args(fn, args):
+  """
+  Like compile_entry but stop before building the extension module, 
+  returns the arguments for compile_module_from_source or None
+  if this entry point has already been compiled
+  """
+  fn = lower_entry(fn, args)
+  if (fn.cache_key, tiling.current_setting()) in _cache:
+    return None 
+  return MulticoreCompiler().entry_module_args(fn)
+
+def add_entry(fn, args, compiled_fn):
+  """
+  Remember an extension module built from entry_module_args(fn, args), 
+  so compile_entry returns it instead of generating the same code again 
+  """
+  _cache[lower_entry(fn, args).cache_key, tiling.current_setting()] = compiled_fn
+
+def run(fn, args):
+  args = prepare_args(args, fn.input_types)
+  return compile_entry(fn, args).c_fn(*args)
+  
@@ -0,0 +1,156 @@
+"""
+Control how many threads generated OpenMP kernels use and how they split up
+their loops without recompiling anything: parallel loops get generated with
+schedule(runtime), so both settings come from the OpenMP runtime's per-thread
+state, which we set through a tiny extension module.
+"""
+
+import threading
+
+from ..c_backend.compile_util import compile_module_from_source
+from ..c_backend.shell_command import CommandFailed
+import config
+
+schedule_kinds = {'static' : 1, 'dynamic' : 2, 'guided' : 3, 'auto' : 4}
+
+module_name = "omp_runtime_configure"
+
+runtime_source = """
+static PyObject* omp_runtime_configure(PyObject* dummy, PyObject* args) {
+  int n_threads, kind, chunk;
+  if (!PyArg_ParseTuple(args, "iii", &n_threads, &kind, &chunk)) { return NULL; }
+  if (n_threads > 0) { omp_set_num_threads(n_threads); }
+  if (kind > 0) { omp_set_schedule((omp_sched_t) kind, chunk); }
+  Py_RETURN_NONE;
+}
+
+static PyObject* omp_runtime_current(PyObject* dummy, PyObject* args) {
+  omp_sched_t kind;
+  int chunk;
+  omp_get_schedule(&kind, &chunk);
+  return Py_BuildValue("iii", omp_get_max_threads(), (int) kind, chunk);
+}
+"""
+
+_module = []
+def load():
+  """
+  Compile the runtime extension, or load it from the cache,
+  returns None if it can't be built
+  """
+  if not _module:
+    try:
+      compiled = compile_module_from_source(runtime_source, module_name,
+                                            extra_headers = ["omp.h"],
+                                            extra_compile_flags = ["-fopenmp"],
+                                            extra_link_flags = ["-fopenmp"],
+                                            entry_names = [module_name, "omp_runtime_current"])
+      _module.append(compiled.module)
+    except CommandFailed:
+      _module.append(None)
+  return _module[0]
+
+# process-wide settings, None means leave the OpenMP default alone
+_settings = {'threads' : None, 'schedule' : None, 'chunk' : None}
+
+# bumped whenever the process-wide settings change so that each thread
+# knows to apply them again before its next call, starts at 1 so every
+# thread applies them (or the default schedule) once
+generation = 1
+_applied = threading.local()
+
+def default_schedule():
+  """
+  OpenMP's default runtime schedule is usually dynamic with a chunk size 
+  of 1, which is terrible for our loops (and spreads pages differently 
+  than first touch expects), so unless set_schedule says otherwise 
+  parallel loops use the schedule we would have compiled in
+  """
+  if not config.runtime_schedule:
+    return None, None
+  parts = config.schedule.split(',')
+  chunk = int(parts[1]) if len(parts) > 1 else None
+  return parts[0].strip(), chunk
+
+def _configure(threads, schedule, chunk):
+  module = load()
+  if module is None:
+    return
+  if schedule is None:
+    kind = 0
+  else:
+    assert schedule in schedule_kinds, \
+      "Unknown schedule '%s', expected one of %s" % (schedule, sorted(schedule_kinds))
+    kind = schedule_kinds[schedule]
+  if chunk is not None and kind == 0:
+    # changing the chunk size means keeping the current kind of schedule
+    _, kind, _ = module.omp_runtime_current()
+  module.omp_runtime_configure(threads if threads else 0, kind, chunk if chunk else 0)
+
+def sync():
+  """
+  Apply the process-wide settings to the calling thread if it
+  hasn't seen the latest ones yet
+  """
+  # nothing to apply until some OpenMP code has loaded the runtime module
+  if not _module or _module[0] is None:
+    return
+  if getattr(_applied, 'generation', 0) != generation:
+    schedule, chunk = _settings['schedule'], _settings['chunk']
+    if schedule is None:
+      schedule, chunk = default_schedule()
+    _configure(_settings['threads'], schedule, chunk)
+    _applied.generation = generation
+
+def set_num_threads(n):
+  """
+  Number of threads used by parallel loops in compiled functions
+  from now on, across all Python threads
+  """
+  global generation
+  assert n is None or n > 0, "Number of threads must be positive, got %s" % n
+  _settings['threads'] = n
+  generation += 1
+  sync()
+
+def set_schedule(schedule, chunk = None):
+  """
+  How parallel loops split their iterations between threads
+  ('static', 'dynamic', 'guided' or 'auto'), along with an optional
+  chunk size
+  """
+  global generation
+  assert schedule in schedule_kinds, \
+    "Unknown schedule '%s', expected one of %s" % (schedule, sorted(schedule_kinds))
+  _settings['schedule'] = schedule
+  _settings['chunk'] = chunk
+  generation += 1
+  sync()
+
+def get_num_threads():
+  module = load()
+  if module is None:
+    return 1
+  sync()
+  return module.omp_runtime_current()[0]
+
+class overrides(object):
+  """
+  Temporarily change the settings of the calling thread,
+  used for the _threads, _schedule and _chunk keywords of jit functions
+  """
+
+  def __init__(self, threads = None, schedule = None, chunk = None):
+    self.settings = (threads, schedule, chunk)
+
+  def __enter__(self):
+    module = load()
+    sync()
+    self.old = module.omp_runtime_current() if module is not None else None
+    _configure(*self.settings)
+
+  def __exit__(self, *exc_info):
+    if self.old is not None:
+      old_threads, old_kind, old_chunk = self.old
+      load().omp_runtime_configure(old_threads, old_kind, old_chunk)
+    return False
@@ -0,0 +1,103 @@
+"""
+Cache blocking for parallel loops over two and three dimensional index
+spaces: rather than handing threads whole rows, the iterations get split into
+tiles whose inputs fit in cache together, so that data loaded for one
+iteration gets reused by its neighbours in every direction.
+"""
+
+import threading
+
+import config
+
+# smallest tile automatic sizing will pick, even for very long rows
+min_tile_size = 4
+
+# number of threads currently inside an overrides block, lets jit functions
+# skip checking for a per-call setting on their fast path
+overrides_active = 0
+_overrides_lock = threading.Lock()
+
+_override = threading.local()
+
+def normalize(setting):
+  """
+  None, False and 0 all turn tiling off, True picks tile sizes automatically
+  """
+  if setting is True:
+    return 'auto'
+  elif setting is None or setting is False or setting == 0:
+    return None
+  elif setting == 'auto':
+    return setting
+  elif isinstance(setting, (int, long)):
+    assert setting > 0, "Tile sizes must be positive, got %s" % setting
+    return int(setting)
+  else:
+    sizes = tuple(int(s) for s in setting)
+    assert all(s > 0 for s in sizes), "Tile sizes must be positive, got %s" % (sizes,)
+    return sizes
+
+def current_setting():
+  """
+  'auto', None (no tiling), a single tile size used for every dimension or a
+  tuple with one size per dimension
+  """
+  if overrides_active and hasattr(_override, 'setting'):
+    return _override.setting
+  return normalize(config.tile_sizes)
+
+def current_override():
+  """
+  Setting given to the innermost overrides block of the current thread, 
+  False if it turned tiling off and None if there isn't one
+  """
+  if not overrides_active or not hasattr(_override, 'setting'):
+    return None
+  setting = _override.setting
+  return False if setting is None else setting
+
+class overrides(object):
+  """
+  Use different tile sizes for the jit calls made by the current thread,
+  used for the _tile keyword of jit functions
+  """
+
+  def __init__(self, setting):
+    self.setting = normalize(setting)
+
+  def __enter__(self):
+    global overrides_active
+    self.had_old = hasattr(_override, 'setting')
+    self.old = getattr(_override, 'setting', None)
+    _override.setting = self.setting
+    with _overrides_lock:
+      overrides_active += 1
+
+  def __exit__(self, *exc_info):
+    global overrides_active
+    with _overrides_lock:
+      overrides_active -= 1
+    if self.had_old:
+      _override.setting = self.old
+    else:
+      del _override.setting
+    return False
+
+def tile_sizes(rank):
+  """
+  Tile sizes for a parallel loop nest of the given rank: None if the loops
+  shouldn't be tiled, 'auto' to size the tiles when the loops run (see
+  MulticoreCompiler.auto_tile_size) or a tuple with one size per dimension
+  """
+  if rank not in (2, 3):
+    return None
+  setting = current_setting()
+  if setting is None or setting == 'auto':
+    return setting
+  elif isinstance(setting, int):
+    return (setting,) * rank
+  elif len(setting) == rank:
+    return setting
+  else:
+    # sizes given for loop nests of some other rank
+    return 'auto'
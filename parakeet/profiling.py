@@ -0,0 +1,196 @@
+"""
+Structured profile of where compilation time goes: translation from Python,
+type inference, every phase and transformation (nested the same way they
+ran), C code generation and the external compiler, linker and loader.
+The hooks scattered through the compiler cost nothing but an attribute
+check unless a profile is being recorded.
+"""
+
+import time
+from collections import OrderedDict
+
+# the profile currently being recorded, None if we're not profiling
+active = None
+
+_stack = []
+
+def ir_size(fn):
+  """
+  Number of statements in a function, counting the bodies of nested
+  control flow but not those of other functions it calls
+  """
+  body = getattr(fn, 'body', None)
+  if body is None:
+    return None
+  return _block_size(body)
+
+def _block_size(stmts):
+  total = 0
+  for stmt in stmts:
+    total += 1
+    for attr in ('true', 'false', 'body'):
+      nested = getattr(stmt, attr, None)
+      if isinstance(nested, list):
+        total += _block_size(nested)
+  return total
+
+class ProfileNode(object):
+  """
+  Totals for one kind of compilation step with a given name, repeated
+  invocations under the same parent get merged
+  """
+
+  def __init__(self, kind, name):
+    self.kind = kind
+    self.name = name
+    self.time = 0.0
+    self.count = 0
+    self.ir_before = None
+    self.ir_after = None
+    self.children = OrderedDict()
+
+  def child(self, kind, name):
+    key = (kind, name)
+    node = self.children.get(key)
+    if node is None:
+      node = ProfileNode(kind, name)
+      self.children[key] = node
+    return node
+
+  def _add_size(self, attr, size):
+    if size is not None:
+      old = getattr(self, attr)
+      setattr(self, attr, size if old is None else old + size)
+
+  @property
+  def self_time(self):
+    """
+    Time not accounted for by any of this step's children
+    """
+    return self.time - sum(c.time for c in self.children.itervalues())
+
+  def to_dict(self):
+    return {
+      'kind' : self.kind,
+      'name' : self.name,
+      'time' : self.time,
+      'count' : self.count,
+      'ir_before' : self.ir_before,
+      'ir_after' : self.ir_after,
+      'children' : [c.to_dict() for c in self.children.itervalues()],
+    }
+
+  def format(self, depth = 0):
+    sizes = ""
+    if self.ir_before is not None or self.ir_after is not None:
+      sizes = "  stmts %s -> %s" % (self.ir_before, self.ir_after)
+    lines = ["%s%s %s: %0.2fms x %d%s" % ("  " * depth, self.kind, self.name,
+                                          self.time * 1000, self.count, sizes)]
+    for c in self.children.itervalues():
+      lines.append(c.format(depth + 1))
+    return "\n".join(lines)
+
+class CompileProfile(ProfileNode):
+  def __init__(self):
+    ProfileNode.__init__(self, 'profile', 'compile')
+
+  def totals(self):
+    """
+    Total time and number of invocations for each kind of step, not
+    double-counting steps of the same kind nested inside each other
+    """
+    result = {}
+    def visit(node, counted):
+      for c in node.children.itervalues():
+        time, count = result.get(c.kind, (0.0, 0))
+        if c.kind in counted:
+          result[c.kind] = (time, count + c.count)
+          visit(c, counted)
+        else:
+          result[c.kind] = (time + c.time, count + c.count)
+          visit(c, counted | set([c.kind]))
+    visit(self, frozenset())
+    return result
+
+  def __str__(self):
+    return self.format()
+
+def start(kind, name, fn = None):
+  """
+  Mark the beginning of a compilation step, returns a token for stop
+  """
+  node = (_stack[-1][0] if _stack else active).child(kind, name)
+  node.count += 1
+  if fn is not None:
+    node._add_size('ir_before', ir_size(fn))
+  _stack.append((node, time.time()))
+  return len(_stack)
+
+def stop(token, fn = None):
+  # unwind anything left open by an exception
+  while len(_stack) > token:
+    node, start_time = _stack.pop()
+    node.time += time.time() - start_time
+  if len(_stack) == token:
+    node, start_time = _stack.pop()
+    node.time += time.time() - start_time
+    if fn is not None:
+      node._add_size('ir_after', ir_size(fn))
+
+class compile_profiler(object):
+  """
+  Context manager which records a CompileProfile of all the compilation
+  work done in its body. Unless 'cold' is False, caches get cleared and
+  the persistent caches are bypassed so that everything actually runs.
+  """
+
+  def __init__(self, cold = True):
+    self.cold = cold
+    self.profile = CompileProfile()
+
+  def __enter__(self):
+    global active
+    assert active is None, "Already recording a compile profile"
+    if self.cold:
+      import config
+      from c_backend import config as c_config
+      from caches import clear_caches
+      self.old_settings = (config.persistent_specialization_cache, c_config.cache_dir)
+      config.persistent_specialization_cache = False
+      c_config.cache_dir = None
+      clear_caches()
+    del _stack[:]
+    active = self.profile
+    self.start_time = time.time()
+    return self.profile
+
+  def __exit__(self, *exc_info):
+    global active
+    self.profile.time = time.time() - self.start_time
+    self.profile.count = 1
+    active = None
+    del _stack[:]
+    if self.cold:
+      import config
+      from c_backend import config as c_config
+      config.persistent_specialization_cache, c_config.cache_dir = self.old_settings
+    return False
+
+def profile_compile(fn, *args, **kwargs):
+  """
+  Compile fn for the given arguments from a cold start (without running it),
+  returns a CompileProfile describing where the time went
+  """
+  import config
+  from frontend import jit
+  from frontend.dispatch import call_fingerprint
+  from frontend.persistent_cache import unwrap
+  backend = kwargs.pop('_backend', None)
+  if backend is None:
+    backend = config.backend
+  # a fresh wrapper so we don't just find a previously compiled version
+  wrapped = jit(unwrap(fn))
+  with compile_profiler() as profile:
+    key = call_fingerprint(backend, args, kwargs)
+    wrapped.compile_specialization(key, backend, args, kwargs)
+  return profile
@@ -87,4 +87,44 @@ def result_shape(typed_fn, input_values):
   return eval_shape(symbolic_shape, input_values)
 
       
-  
\ No newline at end of file
+  
+def bind_input_values(abstract_value, python_value, env):
+  """
+  Map the shape variables of an abstract input onto the 
+  actual dimensions or scalar value of a Python value 
+  """
+  import shape 
+  c = abstract_value.__class__
+  if c is shape.Var:
+    env[abstract_value.num] = python_value
+  elif c is shape.Shape:
+    for (dim, size) in zip(abstract_value.dims, np.shape(python_value)):
+      bind_input_values(dim, size, env)
+  elif c is shape.Tuple and isinstance(python_value, tuple):
+    for (elt, elt_value) in zip(abstract_value.elts, python_value):
+      bind_input_values(elt, elt_value, env)
+
+def concrete_result_shape(typed_fn, input_values):
+  """
+  Shape of the result typed_fn would return for the given inputs (() for 
+  scalars) without running it, or None if shape inference can't tell
+  """
+  import shape, shape_inference
+  from shape_from_type import shapes_from_types
+  try:
+    symbolic_shape = shape_inference.call_shape_expr(typed_fn)
+  except (shape_inference.ShapeInferenceFailure, RuntimeError, AssertionError):
+    return None
+  if isinstance(symbolic_shape, shape.Scalar):
+    return ()
+  if not isinstance(symbolic_shape, shape.Shape):
+    return None
+  env = {}
+  for (formal, value) in zip(shapes_from_types(typed_fn.input_types), input_values):
+    bind_input_values(formal, value, env)
+  evaluator = EvalShape([])
+  evaluator.inputs = env
+  try:
+    return tuple(evaluator.visit(symbolic_shape))
+  except (KeyError, AssertionError, TypeError):
+    return None
@@ -168,37 +168,28 @@ class ShapeInference(SyntaxVisitor):
       else:
         assert curr_idx.__class__ is Slice, "Unsupported index %s" % curr_idx
 
-        if curr_idx.start is None:
-          lower = const(0)
-        elif isinstance(curr_idx.start, Const):
-          if curr_idx.start.value is None:
-            lower = const(0)
-          elif curr_idx.start.value < 0:
-            lower = self.sub(old_dim, curr_idx.start)
-          else:
-            lower = curr_idx.start
-        else:
-          lower = any_scalar
-         
-        if curr_idx.stop is None:
-          upper = old_dim 
-        elif isinstance(curr_idx.stop, Const):
-          if curr_idx.stop.value is None:
-            upper = old_dim
-          elif curr_idx.stop.value < 0:
-            upper = self.sub(old_dim, curr_idx.stop)
-          else:
-            upper = curr_idx.stop
-        else:
-          upper = any_scalar
-
-        n = self.sub(upper, lower)
+        # bounds in the IR are absolute positions (the frontend already 
+        # turned negative indices into offsets from the end of the axis), 
+        # missing ones depend on which way the slice runs 
         step = curr_idx.step
-        if step and \
-            isinstance(step, Const) and \
-            step.value is not None and \
-            step.value != 1:
-          n = self.div(n, step)
+        if self.is_default_bound(step):
+          step = const(1)
+        if not isinstance(step, Const):
+          n = any_scalar
+        elif step.value > 0:
+          lower = const(0) if self.is_default_bound(curr_idx.start) else curr_idx.start
+          upper = old_dim if self.is_default_bound(curr_idx.stop) else curr_idx.stop
+          # round up, x[0:10:3] has 4 elements 
+          n = self.sub(upper, lower)
+          if step.value != 1:
+            n = self.div(self.add(n, const(step.value - 1)), step)
+        else:
+          lower = self.sub(old_dim, const(1)) \
+                  if self.is_default_bound(curr_idx.start) else curr_idx.start
+          upper = const(-1) if self.is_default_bound(curr_idx.stop) else curr_idx.stop
+          n = self.sub(lower, upper)
+          if step.value != -1:
+            n = self.div(self.add(n, const(-step.value - 1)), const(-step.value))
         result_dims.append(n)
     n_original = len(arr.dims)
     n_idx= len(indices)
@@ -207,6 +198,9 @@ class ShapeInference(SyntaxVisitor):
 
     return make_shape(result_dims)
   
+  def is_default_bound(self, bound):
+    return bound is None or (isinstance(bound, Const) and bound.value is None)
+
   def slice_along_axis(self, arr, axis):
     if arr.__class__ is Shape:
       dims = arr.dims[:axis] + arr.dims[(axis+1):]
@@ -263,11 +257,10 @@ class ShapeInference(SyntaxVisitor):
       step_val = step.value
       if step_val is None:
         step_val = 1
-      nelts = (stop.value - start_val) / step_val
       # TODO: 
       # Properly handle negative slicing 
-      if nelts >= 0:
-        return ConstSlice(nelts)
+      if start_val >= 0 and stop.value >= 0 and step_val != 0:
+        return ConstSlice(len(xrange(start_val, stop.value, step_val)))
     return Slice(start, stop, step)
 
   def call(self, fn, args):
@@ -369,6 +362,9 @@ class ShapeInference(SyntaxVisitor):
   def visit_Alloc(self, expr):
     return Ptr(any_scalar)
 
+  def visit_Free(self, expr):
+    return Const(None)
+
   def visit_Cast(self, expr):
     return any_scalar 
   
@@ -462,6 +458,15 @@ class ShapeInference(SyntaxVisitor):
     shape = self.visit_expr(expr.array)
     return self.ravel(shape)
   
+  def visit_Compress(self, expr):
+    self.visit_expr(expr.condition)
+    shape = self.visit_expr(expr.data)
+    # number of selected elements isn't known until the condition is evaluated 
+    if shape.__class__ is Shape:
+      return Shape((any_scalar,) + tuple(shape.dims[1:]))
+    else:
+      return any_value 
+  
   def visit_Range(self, expr):
     start = self.visit_expr(expr.start)
     stop = self.visit_expr(expr.stop)
@@ -486,7 +491,8 @@ class ShapeInference(SyntaxVisitor):
       for (other_var, offset) in offsets:
 
         if other_var == start_name:
-          nelts = (offset + step - 1) /  step
+          # rounds up (away from zero for backward slices) 
+          nelts = max(0, (offset + step - (1 if step > 0 else -1)) / step)
           # assert False, (start_name, stop_name, offsets)
           return ConstSlice(nelts)
 
@@ -251,13 +251,15 @@ class Compress(ArrayExpr):
   """
   Slice into array 'data' at positions where 'condition' is True
   """ 
-  def __init__(self, condition, data):
+  def __init__(self, condition, data, type = None, source_info = None):
     self.condition = condition 
     self.data = data 
+    self.type = type 
+    self.source_info = source_info 
   
   def __str__(self):
     return "Compress(%s, %s)" % (self.condition, self.data)
   
   def children(self):
-    yield self.data 
+    yield self.condition 
     yield self.data 
\ No newline at end of file
@@ -99,9 +99,14 @@ class ForLoop(Stmt):
   that we're playing with loop optimizations.
 
   So, here we have the stately and ancient for loop.  All hail its glory.
+  
+  Loops which come from lowering parallel constructs are flagged as 
+  'independent': their iterations only interact through the accumulators in
+  'merge'. Vectorize then sets 'simd' on the innermost of them to a dictionary 
+  from each accumulator's name to the C operator which combines its values.
   """
 
-  _members = ['var', 'start', 'stop', 'step', 'body', 'merge']
+  _members = ['var', 'start', 'stop', 'step', 'body', 'merge', 'independent', 'simd']
     
   def __str__(self):
     s = "for %s in range(%s, %s, %s):" % \
@@ -109,6 +114,8 @@ class ForLoop(Stmt):
        self.start.short_str(),
        self.stop.short_str(),
        self.step.short_str())
+    if self.simd is not None:
+      s += " (simd)"
 
     if self.merge and len(self.merge) > 0:
       s += "\n  (header)%s\n  (body)" % phi_nodes_to_str(self.merge)
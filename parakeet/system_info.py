@@ -1,3 +1,4 @@
+import mmap
 import os
 import subprocess
 import platform 
@@ -14,4 +15,58 @@ def check_openmp_available():
   code = p.returncode
   return code == 0
 
-openmp_available = check_openmp_available()
\ No newline at end of file
+openmp_available = check_openmp_available()
+
+def _read_cache_sizes():
+  """
+  Sizes in bytes of the L1 data cache and the L2 cache, 
+  falls back on typical values if we can't find out
+  """
+  l1, l2 = 32 * 1024, 256 * 1024
+  cache_dir = "/sys/devices/system/cpu/cpu0/cache"
+  if not os.path.isdir(cache_dir):
+    return l1, l2
+  for entry in os.listdir(cache_dir):
+    path = os.path.join(cache_dir, entry)
+    try:
+      with open(os.path.join(path, "level")) as f: level = int(f.read())
+      with open(os.path.join(path, "type")) as f: kind = f.read().strip()
+      with open(os.path.join(path, "size")) as f: size = f.read().strip()
+    except (IOError, ValueError):
+      continue
+    multiplier = {'K' : 1024, 'M' : 1024 * 1024}.get(size[-1:], 1)
+    size = int(size.rstrip('KM')) * multiplier
+    if level == 1 and kind in ('Data', 'Unified'):
+      l1 = size
+    elif level == 2 and kind in ('Data', 'Unified'):
+      l2 = size
+  return l1, l2
+
+l1_cache_bytes, l2_cache_bytes = _read_cache_sizes()
+
+def _read_cpu_flags():
+  """
+  Instruction set extensions the CPU advertises, empty if we can't find out 
+  """
+  try:
+    with open("/proc/cpuinfo") as f:
+      for line in f:
+        if line.startswith("flags"):
+          return set(line.split(":", 1)[1].split())
+  except IOError:
+    pass
+  return set([])
+
+cpu_flags = _read_cpu_flags()
+
+page_bytes = mmap.PAGESIZE
+
+def _count_numa_nodes():
+  node_dir = "/sys/devices/system/node"
+  if not os.path.isdir(node_dir):
+    return 1
+  nodes = [entry for entry in os.listdir(node_dir) 
+           if entry.startswith("node") and entry[4:].isdigit()]
+  return max(len(nodes), 1)
+
+numa_nodes = _count_numa_nodes()
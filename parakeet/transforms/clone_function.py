@@ -138,7 +138,9 @@ class CloneFunction(Transform):
     new_step = self.transform_expr(stmt.step)
     new_body = self.transform_block(stmt.body)
     new_merge = self.transform_merge(stmt.merge)
-    return ForLoop(new_var, new_start, new_stop, new_step, new_body, new_merge)  
+    new_simd = dict(stmt.simd) if stmt.simd is not None else None
+    return ForLoop(new_var, new_start, new_stop, new_step, new_body, new_merge, 
+                   independent = stmt.independent, simd = new_simd)  
   
   def transform_ParFor(self, stmt):
     new_bounds = self.transform_expr(stmt.bounds)
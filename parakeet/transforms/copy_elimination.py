@@ -2,7 +2,7 @@ from .. ndtypes import ScalarT, ArrayT
 
 from .. analysis.collect_vars import collect_var_names
 from .. analysis import escape_analysis
-from .. analysis.find_local_arrays import FindLocalArrays
+from .. analysis.find_local_arrays import FindLocalArrays, array_alloc_classes
 from .. analysis.usedef import UseDefAnalysis
 from .. syntax import AllocArray, ArrayView, Index, Struct, Var
 
@@ -47,6 +47,10 @@ class CopyElimination(Transform):
     # if we ever have mutable compound objects in arrays
     return len(array_aliases) <= 1
 
+  def is_fresh_array(self, name):
+    stmt = self.local_arrays.get(name)
+    return stmt is not None and stmt.rhs.__class__ in array_alloc_classes
+
   def is_array_alloc(self, expr):
     return expr.__class__ in [ArrayView, Struct, AllocArray] or isinstance(expr, Adverb)
     
@@ -65,8 +69,11 @@ class CopyElimination(Transform):
     lhs_name = stmt.lhs.value.name
 
     # why assign to an array if it never gets used?
+    # (only for arrays allocated here, anything else might be a view
+    #  or data pointer of memory which outlives this function)
     if lhs_name not in self.usedef.first_use and \
        lhs_name not in self.may_escape and \
+       self.is_fresh_array(lhs_name) and \
        self.no_array_aliases(lhs_name):
       return None
     
@@ -253,7 +253,7 @@ class BuildFlatFn(Builder):
     step = self.flatten_scalar_expr(stmt.step)
     body = self.flatten_block(stmt.body)
     merge = self.flatten_merge(stmt.merge)
-    return ForLoop(var, start, stop, step, body, merge)
+    return ForLoop(var, start, stop, step, body, merge, independent = stmt.independent)
   
   def flatten_While(self, stmt):
     self.enter_branch(stmt.merge)
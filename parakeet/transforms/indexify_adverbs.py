@@ -314,7 +314,7 @@ class IndexifyAdverbs(Transform):
     self.insert_parfor(index_fn, bounds, n_read_only = len(args), n_write_only = 1)
     return output 
   
-  def transform_OuterMap(self, expr):
+  def transform_OuterMap(self, expr, output = None):
     args = self.transform_expr_list(expr.args)
     axes = self.normalize_axes(args, expr.axis)
     
@@ -325,8 +325,8 @@ class IndexifyAdverbs(Transform):
     
     first_values = [self.slice_along_axis(arg, axis, zero) 
                     for (arg,axis) in zip(args, axes)]
-    # self.create_output_array(fn, inner_args, outer_shape, name)
-    output =  self.create_output_array(fn, first_values, outer_shape)
+    if output is None:
+      output = self.create_output_array(fn, first_values, outer_shape)
 
     loop_body = self.indexify_fn(fn, axes, args, 
                                  cartesian_product = True, 
@@ -513,6 +513,7 @@ class IndexifyAdverbs(Transform):
         return None 
       elif rhs_class is OuterMap:
         self.transform_OuterMap(stmt.rhs, output = stmt.lhs)
+        return None
     return Transform.transform_Assign(self, stmt)
 
   
@@ -0,0 +1,109 @@
+from .. analysis.collect_vars import collect_var_names, SetCollector
+from .. analysis.escape_analysis import CallAwareEscapeAnalysis
+from .. analysis.syntax_visitor import SyntaxVisitor
+from .. ndtypes import NoneType
+from .. syntax import Alloc, AllocArray, Assign, ExprStmt, Free, Return, Var
+from transform import Transform
+
+class CollectMergedNames(SyntaxVisitor):
+  """
+  Names of every variable which gets bound or read by a phi-node
+  """
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.names = set([])
+
+  def visit_merge(self, merge):
+    for (name, (left, right)) in merge.iteritems():
+      self.names.add(name)
+      self.names.update(collect_var_names(left))
+      self.names.update(collect_var_names(right))
+
+  def visit_merge_loop_start(self, merge):
+    self.visit_merge(merge)
+
+def stmt_var_names(stmt):
+  collector = SetCollector()
+  collector.visit_stmt(stmt)
+  return collector.var_names
+
+class InsertFrees(Transform):
+  """
+  Free arrays allocated by this function once nothing can use them anymore.
+  An allocation only gets freed if escape analysis shows it can't reach the
+  caller, a called function or a closure and none of its aliases flow through
+  a phi-node, so all of its uses are in the block which allocates it.
+  The free then goes after the last statement in that block touching the
+  allocation or anything aliasing it. Frees which land in the same spot
+  go in the reverse order of their allocations. Passing an array to a typed
+  function which never keeps it doesn't count as an escape.
+  """
+
+  def pre_apply(self, fn):
+    # run the analysis on the function as it is now rather than
+    # sharing the cached results for this function's cache key
+    escape_info = CallAwareEscapeAnalysis()
+    escape_info.visit_fn(fn)
+    self.may_escape = escape_info.may_escape
+    self.may_alias = escape_info.may_alias
+    merged = CollectMergedNames()
+    merged.visit_fn(fn)
+    self.merged_names = merged.names
+
+  def aliases(self, name):
+    """
+    Everything which might alias a local allocation, or None if it can't
+    be freed
+    """
+    aliases = self.may_alias.get(name, set([name]))
+    for alias in aliases:
+      if alias in self.may_escape or alias in self.merged_names:
+        return None
+    return aliases
+
+  def free(self, name):
+    return ExprStmt(Free(Var(name, type = self.type_env[name]), type = NoneType))
+
+  def transform_block(self, stmts):
+    stmts = Transform.transform_block(self, stmts)
+
+    # position of the last statement using each freeable allocation
+    last_use = {}
+    alias_sets = {}
+    alloc_position = {}
+    for (i, stmt) in enumerate(stmts):
+      if stmt.__class__ is Assign and \
+         stmt.lhs.__class__ is Var and \
+         stmt.rhs.__class__ in (AllocArray, Alloc):
+        aliases = self.aliases(stmt.lhs.name)
+        if aliases is not None:
+          alias_sets[stmt.lhs.name] = aliases
+          last_use[stmt.lhs.name] = i
+          alloc_position[stmt.lhs.name] = i
+      elif len(alias_sets) > 0:
+        used = stmt_var_names(stmt)
+        for (name, aliases) in alias_sets.iteritems():
+          if not used.isdisjoint(aliases):
+            last_use[name] = i
+    if len(last_use) == 0:
+      return stmts
+
+    frees_after = {}
+    for (name, i) in last_use.iteritems():
+      frees_after.setdefault(i, []).append(name)
+    new_block = []
+    for (i, stmt) in enumerate(stmts):
+      # most recent allocation first, so stack-like allocators
+      # (such as the C backend's scratch arena) can pop each one
+      names = sorted(frees_after.get(i, []), key = alloc_position.get, reverse = True)
+      if stmt.__class__ is Return and len(names) > 0:
+        # compute the (non-escaping) result before freeing what it reads
+        result = self.fresh_var(stmt.value.type, "result")
+        new_block.append(Assign(result, stmt.value))
+        new_block.extend(self.free(name) for name in names)
+        stmt.value = result
+        new_block.append(stmt)
+      else:
+        new_block.append(stmt)
+        new_block.extend(self.free(name) for name in names)
+    return new_block
@@ -26,7 +26,7 @@ class LowerAdverbs(Transform):
     def loop_body(idx):
       elt_result =  self.call(fn, (idx,))
       self.setidx(output, idx, elt_result)
-    self.nested_loops(dims, loop_body)    
+    self.nested_loops(dims, loop_body, independent = True)    
     return output
   
   _loop_counters = ["i", "j", "k", "l", "ii", "jj", "kk", "ll"]
@@ -36,7 +36,8 @@ class LowerAdverbs(Transform):
     return  self.fresh_var(Int64, loop_counter_name)
   
    
-  def build_nested_reduction(self, indices, starts, bounds, old_acc, body_fn):
+  def build_nested_reduction(self, indices, starts, bounds, old_acc, body_fn, 
+                             independent = False):
       if len(bounds) == 0:
         if len(indices) > 1:
           indices = self.tuple(indices)
@@ -57,7 +58,8 @@ class LowerAdverbs(Transform):
                                                 future_starts, 
                                                 future_bounds, 
                                                 acc_before, 
-                                                body_fn)
+                                                body_fn, 
+                                                independent)
         body = self.blocks.pop()
         merge = {acc_before.name : (old_acc, acc_after)}
         for_loop = ForLoop(var = loop_counter, 
@@ -65,7 +67,8 @@ class LowerAdverbs(Transform):
                            stop = bounds[0], 
                            step = self.int(1), 
                            body = body, 
-                           merge = merge)
+                           merge = merge, 
+                           independent = independent)
         self.blocks.append_to_current(for_loop)
         return acc_before # should this be acc_after?
 
@@ -96,13 +99,16 @@ class LowerAdverbs(Transform):
     def body(indices, old_acc):
       elt = self.call(fn, (indices,))
       return self.call(combine, (old_acc, elt))
-       
+    
+    # the combiner is associative so the order in which 
+    # elements get accumulated doesn't matter    
     return self.build_nested_reduction(
               indices = (), 
               starts = starts, 
               bounds = bounds, 
               old_acc = init, 
-              body_fn = body)
+              body_fn = body, 
+              independent = True)
 
 
   def transform_IndexScan(self, expr, output = None):
@@ -1,10 +1,16 @@
 from ..builder import build_fn
 from ..syntax import  Alloc,  Index, ArrayView, Const, Transpose, Ravel 
 from ..syntax.helpers import zero_i64, one_i64, const_int, const_tuple, true, false   
-from ..ndtypes import (ScalarT, PtrT, TupleT, ArrayT, ptr_type, Int64)
+from ..ndtypes import (ScalarT, PtrT, TupleT, ArrayT, ptr_type, Int64, make_array_type)
 
 from transform import Transform
 
+# number of elements of the condition handled together by Compress, each 
+# block gets counted and then copied to its output position in one go 
+compress_block_size = 4096
+
+offsets_t = make_array_type(Int64, 1)
+
 
 class LowerArrayOperators(Transform):
   """
@@ -201,6 +207,99 @@ class LowerArrayOperators(Transform):
   def transform_Where(self, expr):
     assert False, "Where not implemented"
   
+  def block_bounds(self, builder, block_idx, n):
+    start = builder.mul(block_idx, const_int(compress_block_size), "block_start")
+    stop = builder.min(builder.add(start, const_int(compress_block_size)), n, "block_stop")
+    return start, stop 
+  
+  def mk_count_fn(self, condition_t, _count_fn_cache = {}):
+    """
+    Count the true elements of one block of the condition, 
+    adding up the booleans rather than branching on them 
+    """
+    if condition_t in _count_fn_cache:
+      return _count_fn_cache[condition_t]
+    fn, builder, (condition, n, block_idx) = \
+      build_fn([condition_t, Int64, Int64], Int64, name = "compress_count", 
+               input_names = ["condition", "n", "block_idx"])
+    start, stop = self.block_bounds(builder, block_idx, n)
+    def loop_body(acc, i):
+      keep = builder.cast(builder.index(condition, i), Int64)
+      acc.update(builder.add(acc.get(), keep))
+    total = builder.accumulate_loop(start, stop, loop_body, zero_i64)
+    builder.return_(total)
+    fn.created_by = self.fn.created_by 
+    _count_fn_cache[condition_t] = fn 
+    return fn 
+  
+  def mk_scatter_fn(self, condition_t, data_t, output_t, _scatter_fn_cache = {}):
+    """
+    Copy the selected elements of one block to their place in the output, 
+    starting from the number of elements selected by all the preceding blocks  
+    """
+    key = condition_t, data_t, output_t 
+    if key in _scatter_fn_cache:
+      return _scatter_fn_cache[key]
+    fn, builder, (condition, data, offsets, output, n, block_idx) = \
+      build_fn([condition_t, data_t, offsets_t, output_t, Int64, Int64], 
+               name = "compress_scatter", 
+               input_names = ["condition", "data", "offsets", "output", "n", "block_idx"])
+    start, stop = self.block_bounds(builder, block_idx, n)
+    def loop_body(acc, i):
+      keep = builder.index(condition, i, temp = True)
+      def copy_elt():
+        dest_idx = acc.get()
+        if data_t.rank == 1:
+          builder.setidx(output, dest_idx, builder.index(data, i, temp = True))
+        else:
+          builder.array_copy(builder.index(data, i, temp = True), 
+                             builder.index(output, dest_idx, temp = True))
+      builder.if_(keep, copy_elt, lambda: None)
+      acc.update(builder.add(acc.get(), builder.cast(keep, Int64)))
+    builder.accumulate_loop(start, stop, loop_body, builder.index(offsets, block_idx, temp = True))
+    builder.return_none()
+    fn.created_by = self.fn.created_by 
+    _scatter_fn_cache[key] = fn 
+    return fn 
+  
+  def transform_Compress(self, expr):
+    """
+    Stream compaction in three passes: count the selected elements 
+    of each block in parallel, turn the counts into starting offsets 
+    with a (short) sequential scan and then have each block copy its 
+    elements into place in parallel 
+    """
+    condition = self.transform_expr(expr.condition)
+    data = self.transform_expr(expr.data)
+    assert condition.type.__class__ is ArrayT and condition.type.rank == 1, \
+      "Expected a boolean vector for Compress but got %s" % condition.type 
+    # look up the data's shape before anything else so that later uses 
+    # of the condition's length can be rewritten in terms of it 
+    data_dims = self.tuple_elts(self.shape(data))
+    n = self.shape(condition, 0)
+    n_blocks = self.div_round_up(n, const_int(compress_block_size), "n_blocks")
+    count_fn = self.mk_count_fn(condition.type)
+    counts = self.assign_name(self.imap(self.closure(count_fn, [condition, n]), n_blocks), 
+                              "block_counts")
+    
+    # replace the counts with the exclusive prefix sum of counts 
+    def scan_body(acc, block_idx):
+      count = self.index(counts, block_idx, temp = True)
+      self.setidx(counts, block_idx, acc.get())
+      acc.update(self.add(acc.get(), count))
+    total = self.accumulate_loop(zero_i64, n_blocks, scan_body, zero_i64)
+    
+    data_t = data.type
+    output = self.alloc_array(elt_t = data_t.elt_type, 
+                              dims = [total] + list(data_dims[1:]), 
+                              name = "compressed", 
+                              order = "C", 
+                              array_view = True, 
+                              explicit_struct = False)
+    scatter_fn = self.mk_scatter_fn(condition.type, data_t, output.type)
+    self.parfor(self.closure(scatter_fn, [condition, data, counts, output, n]), n_blocks)
+    return output 
+  
   
   def mk_const_fn(self, idx_type, value, _const_fn_cache = {}):
     if isinstance(idx_type, TupleT) and len(idx_type.elt_types) == 1:
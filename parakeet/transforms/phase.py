@@ -1,6 +1,8 @@
 from itertools import izip 
 
 from .. import config
+from ..caches import LRUCache
+from .. import profiling
 
 from .. syntax import TypedFn
 from clone_function import CloneFunction
@@ -55,7 +57,7 @@ class Phase(object):
                memoize = True,
                name = None, 
                recursive = True):
-    self.cache = {}
+    self.cache = LRUCache('phase') if memoize else {}
     if not isinstance(transforms, (tuple, list)):
       transforms = [transforms]
     self.transforms = transforms
@@ -149,6 +151,7 @@ class Phase(object):
       elif original_key in self.cache:
         return self.cache[original_key] 
     
+    token = profiling.start('phase', str(self), fn) if profiling.active is not None else None
     if self.depends_on and run_dependencies:
       fn = apply_transforms(fn, self.depends_on)
     
@@ -173,6 +176,7 @@ class Phase(object):
           fn = new_fn
 
     fn.transform_history.add(self)
+    if token is not None: profiling.stop(token, fn)
       
     if self.memoize:
       self.cache[original_key] = fn
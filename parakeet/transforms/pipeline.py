@@ -13,6 +13,7 @@ from index_elimination import IndexElim
 from indexify_adverbs import IndexifyAdverbs
 
 from inline import Inliner
+from insert_frees import InsertFrees
 from licm import LoopInvariantCodeMotion
 from loop_unrolling import LoopUnrolling
 from lower_adverbs import LowerAdverbs
@@ -24,6 +25,7 @@ from negative_index_elim import NegativeIndexElim
 from offset_propagation import OffsetPropagation
 from parfor_to_nested_loops import ParForToNestedLoops
 from phase import Phase
+from prealloc_arrays import PreallocArrays
 from range_propagation import RangePropagation
 from redundant_load_elim import RedundantLoadElimination
 from scalar_replacement import ScalarReplacement
@@ -31,6 +33,7 @@ from shape_elim import ShapeElimination
 from simplify import Simplify
 from simplify_array_operators import SimplifyArrayOperators
 from specialize_fn_args import SpecializeFnArgs
+from vectorize import Vectorize
 
 ####################################
 #                                  #
@@ -216,11 +219,20 @@ load_elim = Phase(RedundantLoadElimination,
 
 
 
+# runs after LICM has moved the computation of loop-invariant sizes 
+# out of loops, so the allocations using them can follow 
+prealloc = Phase(PreallocArrays, 
+                 config_param = 'opt_prealloc_arrays', 
+                 run_if = contains_loops, 
+                 memoize = False, 
+                 name = "PreallocArrays")
+
 loopify = Phase([lower_adverbs,
                  ParForToNestedLoops,
                  inline_opt,
                  LowerSlices, 
                  licm, 
+                 prealloc, 
                  shape_elim, 
                  symbolic_range_propagation,
                  load_elim,  
@@ -281,7 +293,13 @@ final_optimizations = Phase([
                            name = "FinalLoopOptimizations"
                            )
 
-lower_to_loops = Phase([loopify, lowering, final_optimizations], 
+# runs last since it only marks loops and any later 
+# transformation of them would have to keep the marks valid 
+vectorize = Phase(Vectorize, 
+                  config_param = 'opt_vectorize', 
+                  run_if = contains_loops)
+
+lower_to_loops = Phase([loopify, lowering, final_optimizations, vectorize], 
                        name = "LowerToLoops", 
                        copy = True, 
                        recursive = True, 
@@ -293,4 +311,15 @@ lower_to_adverbs = Phase([lowering, final_optimizations],
                          copy = True, 
                          recursive = True, 
                          memoize = True, 
-                         depends_on = optimize_indexified_code,)
\ No newline at end of file
+                         depends_on = optimize_indexified_code,)
+
+# Applied to functions after lower_to_loops, right before they get compiled to C.
+# Frees have to come after everything else since moving any statements could 
+# put uses of an array after its free, and lowered functions can get lowered 
+# again when they're called (or inlined) from other functions. 
+free_arrays = Phase(InsertFrees, 
+                    config_param = 'opt_free_arrays', 
+                    name = "FreeArrays", 
+                    copy = True, 
+                    recursive = True, 
+                    memoize = True)
@@ -0,0 +1,308 @@
+from .. caches import LRUCache
+from .. analysis.collect_vars import collect_binding_names, collect_var_names
+from .. analysis.escape_analysis import CallAwareEscapeAnalysis, escape_analysis
+from .. analysis.syntax_visitor import SyntaxVisitor
+from .. ndtypes import Int64
+from .. shape_inference import shape, shape_env, shapes_from_types, bind_pairs
+from .. shape_inference.shape_inference import ShapeInferenceFailure
+from .. syntax import Alloc, AllocArray, Assign, Call, Const, ExprStmt, ForLoop, TypedFn, Var
+from .. syntax.helpers import const_int
+from clone_function import CloneFunction
+from insert_frees import CollectMergedNames
+from shape_elim import ShapeElimination
+from transform import Transform
+
+class CollectLoopBindings(SyntaxVisitor):
+  """
+  Names bound anywhere in a block of statements, including phi-nodes and
+  loop variables, and whether any of them return from the function
+  """
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.names = set([])
+    self.returns = False
+
+  def visit_Assign(self, stmt):
+    self.names.update(collect_binding_names(stmt.lhs))
+
+  def visit_Return(self, stmt):
+    self.returns = True
+
+  def visit_merge(self, merge):
+    self.names.update(merge.iterkeys())
+
+  def visit_merge_loop_start(self, merge):
+    self.visit_merge(merge)
+
+  def visit_ForLoop(self, stmt):
+    self.names.add(stmt.var.name)
+    SyntaxVisitor.visit_ForLoop(self, stmt)
+
+def is_alloc(stmt):
+  return stmt.__class__ is Assign and \
+         stmt.lhs.__class__ is Var and \
+         stmt.rhs.__class__ in (Alloc, AllocArray)
+
+def size_expr(alloc):
+  if alloc.__class__ is Alloc:
+    return alloc.count
+  else:
+    return alloc.shape
+
+def symbolic_size(env, name, alloc):
+  """
+  Shape inference's value for the number of elements of an Alloc or the
+  shape of an AllocArray bound to the given name
+  """
+  if alloc.__class__ is AllocArray:
+    return env.get(name)
+  count = alloc.count
+  if count.__class__ is Var:
+    return env.get(count.name)
+  elif count.__class__ is Const:
+    return shape.Const(count.value)
+  return None
+
+_buffer_fn_cache = LRUCache('prealloc_buffer_fns')
+def with_buffer_args(fn, buffer_names):
+  """
+  Copy of a function which takes the arrays it would have allocated under
+  the given names as extra arguments instead
+  """
+  key = fn.cache_key, tuple(buffer_names)
+  if key in _buffer_fn_cache:
+    return _buffer_fn_cache[key]
+  new_fn = CloneFunction(rename = True).apply(fn)
+  buffer_set = set(buffer_names)
+  body = [stmt for stmt in new_fn.body
+          if not (is_alloc(stmt) and stmt.lhs.name in buffer_set)]
+  arg_names = list(new_fn.arg_names) + list(buffer_names)
+  input_types = tuple(new_fn.input_types) + \
+                tuple(new_fn.type_env[name] for name in buffer_names)
+  result = TypedFn(name = new_fn.name,
+                   arg_names = arg_names,
+                   body = body,
+                   input_types = input_types,
+                   return_type = new_fn.return_type,
+                   type_env = new_fn.type_env,
+                   created_by = new_fn.created_by,
+                   transform_history = new_fn.transform_history,
+                   source_info = new_fn.source_info)
+  _buffer_fn_cache[key] = result
+  return result
+
+class PreallocArrays(Transform):
+  """
+  Move allocations out of loops when every iteration allocates an array
+  of the same size and nothing from one iteration's array survives into the
+  next, so the loop reuses a single buffer. The size has to either be
+  computed outside the loop or be something shape inference can rebuild
+  from the function's inputs.
+
+  Calls from inside a loop to a function which allocates such arrays at
+  its top level (and never returns them or lets them escape) get switched
+  to a copy of the callee which takes those arrays as extra arguments, with
+  the caller allocating them before the loop instead.
+
+  Loops which end up sharing a buffer between iterations stop being 
+  marked independent. 
+  """
+
+  def pre_apply(self, fn):
+    escape_info = CallAwareEscapeAnalysis()
+    escape_info.visit_fn(fn)
+    self.may_alias = escape_info.may_alias
+    self.may_escape = escape_info.may_escape
+    # symbolic sizes of the allocations this transform has already moved
+    self.known_sizes = {}
+    try:
+      self.shape_env = shape_env(fn)
+      self.input_exprs = self.shape_var_exprs(fn)
+    except (ShapeInferenceFailure, RuntimeError):
+      self.shape_env = None
+      self.input_exprs = {}
+
+  def shape_var_exprs(self, fn):
+    # reuse the mapping shape elimination builds from the shape variables
+    # of the function's inputs to expressions which compute them
+    shape_elim = ShapeElimination()
+    shape_elim.pre_apply(fn)
+    return shape_elim.shape_vars
+
+  def stays_in_iteration(self, name, bound, merged):
+    """
+    Does nothing aliasing this array outlive the loop iteration which
+    allocates it?
+    """
+    for alias in self.may_alias.get(name, set([name])):
+      if alias not in bound or alias in merged or alias in self.may_escape:
+        return False
+    return True
+
+  def computable(self, value, env = None):
+    c = value.__class__
+    if c is shape.Var:
+      if env is not None:
+        return value in env and self.computable(env[value])
+      return value.num in self.input_exprs
+    elif c is shape.Const:
+      return isinstance(value.value, (int, long))
+    elif c in (shape.Add, shape.Sub, shape.Mult):
+      return self.computable(value.x, env) and self.computable(value.y, env)
+    elif c is shape.Shape:
+      return all(self.computable(d, env) for d in value.dims)
+    return False
+
+  def symbolic_expr(self, value, env = None):
+    """
+    Build an expression which computes a symbolic value from shape
+    inference out of the function's inputs. If given an environment, the
+    value is in terms of some callee's inputs and the environment maps them
+    to values in this function.
+    """
+    c = value.__class__
+    if c is shape.Var:
+      if env is not None:
+        return self.symbolic_expr(env[value])
+      return self.cast(self.input_exprs[value.num], Int64)
+    elif c is shape.Const:
+      return const_int(value.value)
+    elif c is shape.Add:
+      return self.add(self.symbolic_expr(value.x, env), self.symbolic_expr(value.y, env))
+    elif c is shape.Sub:
+      return self.sub(self.symbolic_expr(value.x, env), self.symbolic_expr(value.y, env))
+    elif c is shape.Mult:
+      return self.mul(self.symbolic_expr(value.x, env), self.symbolic_expr(value.y, env))
+    else:
+      assert c is shape.Shape, "Unexpected symbolic size %s" % (value,)
+      return self.tuple([self.symbolic_expr(d, env) for d in value.dims], "shape")
+
+  def alloc_like(self, alloc, size):
+    if alloc.__class__ is Alloc:
+      return Alloc(alloc.elt_type, size, type = alloc.type)
+    else:
+      return AllocArray(size, elt_type = alloc.elt_type, type = alloc.type)
+
+  def hoist_alloc(self, stmt, bound, merged):
+    """
+    Try to move an allocation out of the loop, emitting it (and anything
+    needed to compute its size) right before the loop
+    """
+    name = stmt.lhs.name
+    if not self.stays_in_iteration(name, bound, merged):
+      return False
+    if collect_var_names(size_expr(stmt.rhs)).isdisjoint(bound):
+      self.blocks.append_to_current(stmt)
+      return True
+    if name in self.known_sizes:
+      value, env = self.known_sizes[name]
+    elif self.shape_env is not None:
+      value, env = symbolic_size(self.shape_env, name, stmt.rhs), None
+    else:
+      return False
+    if value is None or not self.computable(value, env):
+      return False
+    stmt.rhs = self.alloc_like(stmt.rhs, self.symbolic_expr(value, env))
+    self.known_sizes[name] = value, env
+    self.blocks.append_to_current(stmt)
+    return True
+
+  def callee_buffers(self, fn):
+    """
+    Arrays which a function allocates at its top level but never lets
+    escape, along with their sizes in terms of its inputs
+    """
+    escape_info = escape_analysis(fn)
+    try:
+      env = shape_env(fn)
+    except (ShapeInferenceFailure, RuntimeError):
+      return []
+    buffers = []
+    for stmt in fn.body:
+      if is_alloc(stmt):
+        name = stmt.lhs.name
+        aliases = escape_info.may_alias.get(name, set([name]))
+        if aliases.isdisjoint(escape_info.may_escape):
+          value = symbolic_size(env, name, stmt.rhs)
+          if value is not None:
+            buffers.append((name, stmt.rhs, value))
+    return buffers
+
+  def prealloc_call(self, call):
+    """
+    Allocate the callee's temporaries here and pass them in, 
+    returns whether the call got switched over 
+    """
+    fn = call.fn
+    if fn.__class__ is not TypedFn or self.shape_env is None or \
+       not all(arg.__class__ in (Var, Const) for arg in call.args):
+      return False
+    buffers = self.callee_buffers(fn)
+    if len(buffers) == 0:
+      return False
+    actuals = []
+    for arg in call.args:
+      if arg.__class__ is Const:
+        actuals.append(shape.Const(arg.value))
+      elif arg.name in self.shape_env:
+        actuals.append(self.shape_env[arg.name])
+      else:
+        return False
+    env = {}
+    try:
+      bind_pairs(shapes_from_types(fn.input_types), actuals, env)
+    except (AssertionError, RuntimeError):
+      return False
+    buffers = [(name, alloc, value) for (name, alloc, value) in buffers
+               if self.computable(value, env)]
+    if len(buffers) == 0:
+      return False
+    buffer_vars = []
+    for (name, alloc, value) in buffers:
+      new_alloc = self.alloc_like(alloc, self.symbolic_expr(value, env))
+      buffer_var = self.assign_name(new_alloc, "buffer")
+      self.known_sizes[buffer_var.name] = value, env
+      buffer_vars.append(buffer_var)
+    call.fn = with_buffer_args(fn, [name for (name, _, _) in buffers])
+    call.args = list(call.args) + buffer_vars
+    return True
+
+  def prealloc_loop_body(self, stmt):
+    bindings = CollectLoopBindings()
+    bindings.visit_block(stmt.body)
+    if bindings.returns:
+      # a return would skip the frees after the loop
+      return
+    bound = bindings.names
+    merged_names = CollectMergedNames()
+    merged_names.visit_merge(stmt.merge)
+    merged = merged_names.names
+    new_body = []
+    shared = False
+    for body_stmt in stmt.body:
+      c = body_stmt.__class__
+      if is_alloc(body_stmt) and self.hoist_alloc(body_stmt, bound, merged):
+        shared = True
+        continue
+      if c is Assign and body_stmt.rhs.__class__ is Call:
+        shared = self.prealloc_call(body_stmt.rhs) or shared
+      elif c is ExprStmt and body_stmt.value.__class__ is Call:
+        shared = self.prealloc_call(body_stmt.value) or shared
+      new_body.append(body_stmt)
+    stmt.body = new_body
+    if shared and stmt.__class__ is ForLoop:
+      # every iteration now writes into the same buffers, so they can't
+      # run side by side in SIMD lanes (or on different threads) anymore
+      stmt.independent = False
+      stmt.simd = None
+
+  def transform_ForLoop(self, stmt):
+    # inner loops go first so what they hoist can keep moving outward
+    stmt = Transform.transform_ForLoop(self, stmt)
+    self.prealloc_loop_body(stmt)
+    return stmt
+
+  def transform_While(self, stmt):
+    stmt = Transform.transform_While(self, stmt)
+    self.prealloc_loop_body(stmt)
+    return stmt
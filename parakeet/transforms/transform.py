@@ -1,6 +1,6 @@
 import time
 
-from .. import config
+from .. import config, profiling
 from .. analysis import verify
 from .. builder import Builder  
 from .. syntax import (Expr, If, Assign, While, Return, ExprStmt, ForLoop, Comment, ParFor, 
@@ -114,6 +114,10 @@ class Transform(Builder):
     expr.count = self.transform_expr(expr.count)
     return expr
 
+  def transform_Free(self, expr):
+    expr.value = self.transform_expr(expr.value)
+    return expr
+
   def transform_Struct(self, expr):
     expr.args = self.transform_expr_tuple(expr.args)
     return expr
@@ -191,6 +195,11 @@ class Transform(Builder):
     expr.array = self.transform_expr(expr.array)
     return expr 
   
+  def transform_Compress(self, expr):
+    expr.condition = self.transform_expr(expr.condition)
+    expr.data = self.transform_expr(expr.data)
+    return expr 
+  
   def transform_Shape(self, expr):
     expr.array = self.transform_expr(expr.array)
     return expr 
@@ -472,7 +481,8 @@ class Transform(Builder):
       start_time = time.time()
 
     transform_name = self.__class__.__name__
-    
+    token = profiling.start('transform', transform_name, fn) \
+            if profiling.active is not None else None
       
     if config.print_functions_before_transforms == True or \
         (isinstance(config.print_functions_before_transforms, list) and
@@ -538,5 +548,6 @@ class Transform(Builder):
       total_time = transform_timings.get(c, 0)
       transform_timings[c] = total_time + (end_time - start_time)
       transform_counts[c] = transform_counts.get(c, 0) + 1
+    if token is not None: profiling.stop(token, new_fn)
     return new_fn
 
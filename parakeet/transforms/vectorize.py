@@ -1,35 +1,84 @@
+from .. import prims
+from ..analysis.use_analysis import VarUseCount
 from ..ndtypes import Int32, Int64, Float32, Float64
+from ..syntax import Assign, Const, PrimCall, Var
 
 from loop_transform import LoopTransform
 
 class Vectorize(LoopTransform):
-  
+  """
+  Mark the innermost loops which came from parallel constructs so the backend
+  can ask the C compiler to run their iterations in SIMD lanes. The only values
+  a marked loop may carry between iterations are reductions the compiler
+  knows how to split between lanes, which get recorded in the loop's
+  'simd' field.
+  """
+
   def pre_apply(self, _):
     # skip the may-alias analysis from LoopTransform
-    pass 
-  
-  vector_elt_types = (Int32, Int64, Float32, Float64) 
+    pass
+
+  vector_elt_types = (Int32, Int64, Float32, Float64)
+
+  reduction_ops = {
+    prims.add : '+',
+    prims.multiply : '*',
+    prims.minimum : 'min',
+    prims.maximum : 'max',
+  }
+
+  def find_definitions(self, stmts, defs):
+    for stmt in stmts:
+      if stmt.__class__ is Assign and stmt.lhs.__class__ is Var:
+        defs[stmt.lhs.name] = stmt.rhs
+    return defs
+
+  def reduction_op(self, name, right, defs, counts):
+    """
+    C operator for an accumulator updated as 'right = name op elt', or None
+    if the accumulator gets used in any other way
+    """
+    if right.__class__ is not Var or right.type not in self.vector_elt_types:
+      return None
+    rhs = defs.get(right.name)
+    if rhs is None or rhs.__class__ is not PrimCall or len(rhs.args) != 2:
+      return None
+    op = self.reduction_ops.get(rhs.prim)
+    if op is None:
+      return None
+    acc_args = [arg for arg in rhs.args
+                if arg.__class__ is Var and arg.name == name]
+    if len(acc_args) != 1:
+      return None
+    # neither the accumulator nor its new value can be seen by anything
+    # but the update, since each lane only holds part of the result
+    if counts.get(name, 0) != 1 or counts.get(right.name, 0) != 0:
+      return None
+    return op
+
   def vectorize_loop(self, stmt):
-     
-    candidate_names = set([])
-    before_values = {}
-    after_values = {}
-    for (k, (before, after)) in stmt.merge.iteritems():
-      t = before.type
-      if t in self.vector_elt_types:
-        candidate_names.add(k)
-        before_values[k] = before
-        after_values[k] = after
-      
-  
+    defs = self.find_definitions(stmt.body, {})
+    counter = VarUseCount()
+    counter.visit_block(stmt.body)
+    counts = counter.counts
+    reductions = {}
+    for (name, (_, right)) in stmt.merge.iteritems():
+      op = self.reduction_op(name, right, defs, counts)
+      if op is None:
+        return stmt
+      reductions[name] = op
+    stmt.simd = reductions
+    return stmt
+
   def transform_ForLoop(self, stmt):
-    # for now we only vectorize if 
-    # something is being accumulated, 
-    # otherwise you need more sophisticated
-    # cost-base heuristic to avoid lots of 
-    # redundant SIMD packing and unpacking
-    if self.is_simple_block(stmt.body) and len(stmt.merge) > 1:
+    stmt.body = self.transform_block(stmt.body)
+    stmt.simd = None
+    # only vectorize innermost unit-stride loops over independent iterations,
+    # anything else needs dependence analysis we don't have
+    # (simple blocks can't contain other loops)
+    if stmt.independent and \
+       stmt.step.__class__ is Const and stmt.step.value == 1 and \
+       self.is_simple_block(stmt.body):
       return self.vectorize_loop(stmt)
     else:
-      return stmt 
-      
\ No newline at end of file
+      return stmt
@@ -9,7 +9,7 @@ from ..ndtypes import (
 )
 
 from ..syntax import (
-  Assign, Tuple, Var, Return, Index, Map, ConstArrayLike, Const, Cast
+  Assign, Tuple, Var, Return, Index, Map, ConstArrayLike, Const, Cast, Compress
 )
 from ..syntax.helpers import get_types, zero_i64, none, const 
 from ..transforms import Transform 
@@ -212,6 +212,13 @@ class RewriteTyped(Transform):
     _index_function_cache[key] = fn 
     return fn 
     
+  def is_full_slice(self, idx):
+    t = idx.type 
+    return t.__class__ is SliceT and \
+      t.start_type.__class__ is NoneT and \
+      t.stop_type.__class__ is NoneT and \
+      t.step_type.__class__ is NoneT
+    
   def transform_Index(self, expr):
     # TODO: Make fancy indexing work 
     # with multiple indices, boolean index elements, 
@@ -226,6 +233,15 @@ class RewriteTyped(Transform):
     if all(isinstance(idx.type, (NoneT, SliceT, ScalarT)) for idx in indices):
       return expr 
     
+    first = indices[0]
+    if first.type.__class__ is ArrayT and first.type.elt_type == Bool:
+      # boolean mask along the first axis, e.g. X[mask] or X[mask, :]
+      assert first.type.rank == 1, \
+        "Don't yet support indexing by %s" % first.type 
+      assert all(self.is_full_slice(idx) for idx in indices[1:]), \
+        "Boolean masks only supported along the first axis, not %s" % (expr.index,)
+      return Compress(condition = first, data = expr.value, type = expr.value.type)
+    
     map_args = []
     index_elt_types = []
     
@@ -236,9 +252,7 @@ class RewriteTyped(Transform):
         index_elt_t = index.type.elt_type
         
         if index_elt_t == Bool:
-          assert False, "Indexing by boolean vector not yet implemented"
-          #index_array = Where(expr.index)
-          #index_elt_t = Int64
+          assert False, "Boolean masks only supported along the first axis, not %s" % (expr.index,)
         else:
           map_args.append(expr.index)
           index_elt_types.append(index_elt_t)
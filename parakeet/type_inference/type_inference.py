@@ -1,8 +1,10 @@
 from itertools import izip 
 
 from .. import config, names,  prims, syntax
+from ..caches import LRUCache
+from .. import profiling
 
-from ..builder import mk_prim_fn 
+from ..builder import build_fn, mk_prim_fn 
 from ..ndtypes import (Type, 
                        array_type, closure_type, tuple_type, type_conv, 
                        Bool, IntT, Int64,  ScalarT, ArrayT,  
@@ -33,7 +35,7 @@ class TypeInferenceError(Exception):
     self.msg = msg
     self.expr = expr 
 
-_invoke_type_cache = {}
+_invoke_type_cache = LRUCache('invoke_result_type')
 def invoke_result_type(fn, arg_types):
   if fn.__class__ is TypedFn:
     assert isinstance(arg_types, (list, tuple))
@@ -372,6 +374,120 @@ class TypeInference(LocalTypeInference):
                        type = result_type,
                        init = init)
 
+  def transform_Filter(self, expr):
+    pred = self.transform_fn(expr.fn)
+    new_args = self.transform_args(expr.args, flat = True)
+    arg_types = get_types(new_args)
+    assert all(isinstance(t, ArrayT) for t in arg_types), \
+      "Filter requires array arguments, got %s" % (arg_types,)
+    axis = self.transform_if_expr(expr.axis)
+    axes = self.normalize_axes(new_args, axis)
+    assert all(axis == 0 for axis in axes), \
+      "Filter only supported along the first axis, not %s" % (axes,)
+    mask_t, typed_pred = specialize_Map(pred.type, arg_types, axes, return_type = Bool)
+    mask = syntax.Map(fn = make_typed_closure(pred, typed_pred), 
+                      args = new_args, 
+                      axis = axis, 
+                      type = mask_t)
+    mask = self.assign_name(mask, "mask")
+    results = [syntax.Compress(condition = mask, data = arg, type = arg.type)
+               for arg in new_args]
+    if len(results) == 1:
+      return results[0]
+    else:
+      return self.tuple(results)
+  
+  def mk_tagged_map(self, pred, map_fn, elt_types, acc_t):
+    """
+    Map each element to a pair of whether it passes the predicate 
+    and the value it contributes to the reduction
+    """
+    pred_args = self.closure_elts(pred)
+    map_args = self.closure_elts(map_fn)
+    closure_args = pred_args + map_args
+    input_types = tuple(get_types(closure_args)) + tuple(elt_types)
+    fn, builder, input_vars = \
+      build_fn(input_types, make_tuple_type((Bool, acc_t)), name = "filter_tag")
+    pred_vars = input_vars[:len(pred_args)]
+    map_vars = input_vars[len(pred_args):len(closure_args)]
+    elts = input_vars[len(closure_args):]
+    keep = builder.call(self.get_fn(pred), tuple(pred_vars) + tuple(elts))
+    keep = builder.cast(keep, Bool)
+    value = builder.call(self.get_fn(map_fn), tuple(map_vars) + tuple(elts))
+    builder.return_(builder.tuple([keep, value]))
+    return self.closure(fn, closure_args)
+  
+  def mk_tagged_combine(self, combine, acc_t):
+    """
+    Combine two (passed predicate, value) pairs, ignoring values which 
+    didn't pass the predicate 
+    """
+    combine_args = self.closure_elts(combine)
+    tagged_t = make_tuple_type((Bool, acc_t))
+    input_types = tuple(get_types(combine_args)) + (tagged_t, tagged_t)
+    fn, builder, input_vars = build_fn(input_types, tagged_t, name = "filter_combine")
+    combine_vars = input_vars[:len(combine_args)]
+    x, y = input_vars[len(combine_args):]
+    x_keep = builder.tuple_proj(x, 0)
+    x_value = builder.tuple_proj(x, 1)
+    y_keep = builder.tuple_proj(y, 0)
+    y_value = builder.tuple_proj(y, 1)
+    value = builder.fresh_var(acc_t, "value")
+    # only call the combiner when both sides passed, 
+    # so it never sees a rejected value 
+    def both_kept(result):
+      combined = builder.call(self.get_fn(combine), tuple(combine_vars) + (x_value, y_value))
+      builder.assign(result, combined)
+    def only_y_kept(result):
+      builder.assign(result, y_value)
+    def y_kept(result):
+      builder.if_(x_keep, both_kept, only_y_kept, [result])
+    def only_x_kept(result):
+      builder.assign(result, x_value)
+    builder.if_(y_keep, y_kept, only_x_kept, [value])
+    builder.return_(builder.tuple([builder.or_(x_keep, y_keep), value]))
+    return self.closure(fn, combine_args)
+    
+  def transform_FilterReduce(self, expr):
+    """
+    Reduce over (passed predicate, value) pairs so the predicate gets 
+    evaluated as part of the reduction instead of first building 
+    a filtered copy of the data 
+    """
+    new_args = self.transform_args(expr.args, flat = True)
+    arg_types = get_types(new_args)
+    assert any(isinstance(t, ArrayT) for t in arg_types), \
+      "FilterReduce requires array arguments, got %s" % (arg_types,)
+    axis = self.transform_if_expr(expr.axis)
+    axes = self.normalize_axes(new_args, axis)
+    pred = self.transform_fn(expr.pred)
+    map_fn = self.transform_fn(expr.fn if expr.fn else untyped_identity_function) 
+    combine_fn = self.transform_fn(expr.combine)
+    if self.is_none(expr.init):
+      # without a starting value there'd be nothing to return 
+      # when no element passes the predicate 
+      raise TypeError("filter_reduce requires an init value")
+    init = self.transform_expr(expr.init)
+    acc_t, typed_map_fn, typed_combine_fn = \
+      specialize_Reduce(map_fn.type, combine_fn.type, arg_types, axes, init.type)
+    elt_types = peel_adverb_input_types(arg_types, axes)
+    typed_pred = specialize(pred.type, elt_types)
+    
+    tagged_map = self.mk_tagged_map(make_typed_closure(pred, typed_pred), 
+                                    make_typed_closure(map_fn, typed_map_fn), 
+                                    elt_types, 
+                                    acc_t)
+    tagged_combine = self.mk_tagged_combine(make_typed_closure(combine_fn, typed_combine_fn), acc_t)
+    init = self.tuple([true, self.cast(init, acc_t)])
+    reduced = syntax.Reduce(fn = tagged_map, 
+                            combine = tagged_combine, 
+                            args = new_args, 
+                            axis = axis, 
+                            init = init, 
+                            type = make_tuple_type((Bool, acc_t)))
+    reduced = self.assign_name(reduced, "filter_reduce")
+    return self.tuple_proj(reduced, 1)
+
   def transform_OuterMap(self, expr):
     closure = self.transform_fn(expr.fn)
     new_args = self.transform_args (expr.args, flat = True)
@@ -515,7 +631,10 @@ def specialize(fn, arg_types, return_type = None):
   
   full_arg_types = arg_types.prepend_positional(closure_t.arg_types)
   fundef = _get_fundef(closure_t.fn)
+  token = profiling.start('type_inference', fundef.name, fundef) \
+          if profiling.active is not None else None
   typed =  _specialize(fundef, full_arg_types, return_type)
+  if token is not None: profiling.stop(token, typed)
   closure_t.specializations[key] = typed
 
   if config.print_specialized_function:
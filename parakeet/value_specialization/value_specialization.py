@@ -2,6 +2,7 @@ import numpy as np
 from numpy import ndarray 
 
 from .. import syntax 
+from ..caches import LRUCache
 from .. syntax.helpers import const 
 from ..transforms  import Transform, Simplify, Phase, DCE 
 
@@ -114,7 +115,7 @@ def from_python(python_value):
 def from_python_list(python_values):
   return tuple([from_python(v) for v in python_values]) 
 
-_cache = {}
+_cache = LRUCache('value_specialization')
 def specialize_abstract_values(fn, abstract_values):
   key = (fn.cache_key, abstract_values)
   if key in _cache:
@@ -0,0 +1,57 @@
+import numpy as np
+import parakeet
+from parakeet.testing_helpers import expect, run_local_tests
+
+# long enough to be compacted in several blocks
+n = 10000
+vec = np.random.randn(n)
+mat = np.random.randn(n, 4)
+
+def positive(x):
+  return x > 0
+
+def filter_positive(x):
+  return parakeet.filter(positive, x)
+
+def test_filter():
+  expect(filter_positive, [vec], vec[vec > 0])
+
+def filter_rows(X, t):
+  return parakeet.filter(lambda row: row[0] > t, X)
+
+def test_filter_rows():
+  expect(filter_rows, [mat, 0.5], mat[mat[:, 0] > 0.5])
+
+def sum_positive(x):
+  return parakeet.filter_reduce(parakeet.add, positive, x, init = 0.0)
+
+def test_filter_reduce():
+  expect(sum_positive, [vec], np.sum(vec[vec > 0]))
+
+def sum_above(x, t):
+  return parakeet.filter_reduce(parakeet.add, lambda v: v > t, x, init = 1.0)
+
+def test_filter_reduce_init():
+  expect(sum_above, [vec, 0.5], 1.0 + np.sum(vec[vec > 0.5]))
+  expect(sum_above, [vec, 100.0], 1.0)
+
+def min_positive(x):
+  return parakeet.filter_reduce(lambda a, b: a if a < b else b, positive, x, init = np.inf)
+
+def test_filter_reduce_min():
+  expect(min_positive, [vec], np.min(vec[vec > 0]))
+  expect(min_positive, [-vec ** 2], np.inf)
+
+def sum_positive_no_init(x):
+  return parakeet.filter_reduce(parakeet.add, positive, x)
+
+def test_filter_reduce_requires_init():
+  try:
+    parakeet.jit(sum_positive_no_init)(vec)
+  except TypeError:
+    pass
+  else:
+    assert False, "Expected TypeError for filter_reduce without init"
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,31 @@
+import numpy as np
+from parakeet.testing_helpers import expect, run_local_tests
+
+# long enough to be compacted in several blocks
+n = 10000
+vec = np.random.randn(n)
+mat = np.random.randn(n, 3)
+labels = np.random.randint(0, 3, n)
+
+def masked(x, mask):
+  return x[mask]
+
+def test_1d_mask():
+  expect(masked, [vec, vec > 0.5], vec[vec > 0.5])
+  expect(masked, [vec[:10], vec[:10] > 0], vec[:10][vec[:10] > 0])
+
+def test_empty_result():
+  expect(masked, [vec, vec > 100], vec[vec > 100])
+
+def test_2d_rows():
+  expect(masked, [mat, labels == 1], mat[labels == 1])
+
+def assigned_rows(X, labels, i):
+  return X[labels == i, :]
+
+def test_2d_rows_with_slice():
+  for i in xrange(3):
+    expect(assigned_rows, [mat, labels, i], mat[labels == i, :])
+
+if __name__ == '__main__':
+  run_local_tests()
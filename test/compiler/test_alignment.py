@@ -0,0 +1,47 @@
+import numpy as np
+
+from parakeet import jit, config
+from parakeet.frontend.dispatch import value_fingerprint
+from parakeet.testing_helpers import run_local_tests, eq
+
+def aligned_and_not(n):
+  """
+  Two float64 vectors of length n, one starting on an
+  array_alignment boundary and one right after it
+  """
+  padding = config.array_alignment / 8
+  buf = np.arange(n + 2 * padding, dtype = 'float64')
+  start = (-(buf.ctypes.data % config.array_alignment) / 8) % padding
+  return buf[start:start + n], buf[start + 1:start + n + 1]
+
+def add_one(x):
+  return x + 1
+
+def total(x):
+  result = 0.0
+  for i in range(len(x)):
+    result += x[i]
+  return result
+
+def test_same_fingerprints():
+  # alignment is checked inside the compiled code, not by dispatch
+  aligned, misaligned = aligned_and_not(10)
+  assert aligned.ctypes.data % config.array_alignment == 0
+  assert value_fingerprint(aligned) == value_fingerprint(misaligned)
+
+def test_aligned_and_misaligned_inputs():
+  aligned, misaligned = aligned_and_not(37)
+  f = jit(add_one)
+  g = jit(total)
+  # alternate so each call has to take the other branch of the same code
+  for x in (aligned, misaligned, aligned, misaligned):
+    assert eq(f(x, _backend = 'c'), x + 1)
+    assert eq(g(x, _backend = 'c'), total(x))
+
+def test_outputs_aligned():
+  _, misaligned = aligned_and_not(37)
+  y = jit(add_one)(misaligned, _backend = 'c')
+  assert y.ctypes.data % config.array_alignment == 0
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,64 @@
+import imp
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from parakeet import jit, aot, Float64, Int64, make_array_type
+from parakeet.testing_helpers import run_local_tests, eq
+
+@jit
+def axpy(a, x, y):
+  return a * x + y
+
+@jit
+def total(x):
+  s = 0.0
+  for i in xrange(len(x)):
+    s = s + x[i]
+  return s
+
+vec_t = make_array_type(Float64, 1)
+
+def load(filename):
+  name = os.path.splitext(os.path.basename(filename))[0]
+  return imp.load_source(name, filename)
+
+def test_compile_module():
+  output_dir = tempfile.mkdtemp()
+  try:
+    filename = aot.compile_module({axpy : [(Float64, vec_t, vec_t), (Int64, np.arange(3), np.arange(3))],
+                                   total : [(vec_t,)]},
+                                  "aot_kernels", output_dir = output_dir, version = "1.2")
+    m = load(filename)
+    assert m.__version__ == "1.2"
+    x = np.arange(5.0)
+    y = np.ones(5)
+    assert eq(m.axpy(2.0, x, y), 2.0 * x + y)
+    # ints get passed to the Int64 version, a Python int also fits the Float64 one
+    xi = np.arange(5)
+    assert eq(m.axpy(3, xi, xi), 3 * xi + xi)
+    assert eq(m.axpy(3, x, y), 3 * x + y)
+    assert eq(m.total(x), np.sum(x))
+    try:
+      m.total(np.arange(5.0).reshape(5,1))
+    except TypeError:
+      pass
+    else:
+      assert False, "Expected TypeError for unsupported signature"
+  finally:
+    shutil.rmtree(output_dir)
+
+def test_compile_ahead():
+  output_dir = tempfile.mkdtemp()
+  try:
+    filename = total.compile_ahead([(vec_t,)], output_dir = output_dir)
+    m = load(filename)
+    x = np.arange(10.0)
+    assert eq(m.total(x), np.sum(x))
+  finally:
+    shutil.rmtree(output_dir)
+
+if __name__ == '__main__':
+  run_local_tests()
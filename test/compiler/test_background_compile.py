@@ -0,0 +1,37 @@
+import numpy as np
+
+from parakeet import jit
+from parakeet.frontend import background
+from parakeet.testing_helpers import run_local_tests, eq
+
+def add(x, y):
+  return x + y
+
+def test_background_fallback():
+  f = jit(background = True)(add)
+  x = np.arange(10.0)
+  assert eq(f(x, x), x + x)
+  background.wait()
+  assert not f.background_status, "Unexpected compilation status %s" % f.background_status
+  assert len(f._dispatch_table) == 1
+  # once compiled, calls no longer go through the Python function
+  f.f = None
+  assert eq(f(x, x), x + x)
+
+@jit(background = True)
+def rank_error(x):
+  return x[0, 0]
+
+def test_background_failure_keeps_fallback():
+  x = np.arange(10.0)
+  try:
+    rank_error(x)
+  except IndexError:
+    pass
+  background.wait()
+  status = rank_error.background_status.values()
+  assert len(status) == 1 and isinstance(status[0], Exception), \
+    "Expected compilation failure to be recorded, got %s" % status
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,80 @@
+import numpy as np
+
+import parakeet
+from parakeet import jit, config, cache_stats, clear_caches
+from parakeet.caches import LRUCache
+from parakeet.testing_helpers import run_local_tests, eq
+
+def test_lru_eviction():
+  old_limits = config.cache_limits
+  config.cache_limits = {'test_lru' : 2}
+  try:
+    cache = LRUCache('test_lru')
+    cache[1] = 'a'
+    cache[2] = 'b'
+    assert cache[1] == 'a'
+    cache[3] = 'c'
+    # 2 was the least recently used
+    assert 2 not in cache
+    assert 1 in cache and 3 in cache
+    stats = cache_stats()['test_lru']
+    assert stats['entries'] == 2, stats
+    assert stats['evictions'] == 1, stats
+    assert stats['hits'] == 1, stats
+    assert stats['limit'] == 2, stats
+  finally:
+    config.cache_limits = old_limits
+
+def test_unevictable():
+  old_limit = config.default_cache_limit
+  config.default_cache_limit = 1
+  try:
+    cache = LRUCache('test_unevictable', evictable = False)
+    cache[1] = 'a'
+    cache[2] = 'b'
+    assert len(cache) == 2
+  finally:
+    config.default_cache_limit = old_limit
+
+def add_one(x):
+  return x + 1
+
+def test_compile_with_tiny_caches():
+  old_limit = config.default_cache_limit
+  old_persistent = config.persistent_specialization_cache
+  config.default_cache_limit = 1
+  # make sure the whole pipeline runs
+  config.persistent_specialization_cache = False
+  clear_caches()
+  try:
+    x = np.arange(10.0)
+    for _ in xrange(2):
+      assert eq(jit(add_one)(x), x + 1)
+      assert eq(jit(add_one)(x.reshape(2, 5)), x.reshape(2, 5) + 1)
+    stats = cache_stats()
+    assert stats['phase']['evictions'] > 0, stats['phase']
+    assert stats['known_python_functions']['entries'] <= 1
+  finally:
+    config.default_cache_limit = old_limit
+    config.persistent_specialization_cache = old_persistent
+
+def test_clear_caches():
+  x = np.arange(10)
+  assert eq(jit(add_one)(x), x + 1)
+  clear_caches()
+  stats = cache_stats()
+  assert all(s['entries'] == 0 for s in stats.itervalues()), stats
+  assert eq(jit(add_one)(x), x + 1)
+
+def test_clear_caches_resets_dispatch():
+  f = jit(add_one)
+  x = np.arange(10.0)
+  assert eq(f(x), x + 1)
+  assert len(f._dispatch_table) > 0
+  clear_caches()
+  assert len(f._dispatch_table) == 0
+  assert len(f._native_tables) == 0 and len(f._native_keys) == 0
+  assert eq(f(x), x + 1)
+
+if __name__ == '__main__':
+  run_local_tests()
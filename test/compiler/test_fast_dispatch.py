@@ -0,0 +1,41 @@
+import numpy as np 
+
+from parakeet import jit 
+from parakeet.testing_helpers import run_local_tests, eq
+
+def add_scaled(x, y, alpha = 2):
+  return x + alpha * y 
+
+def test_warm_calls_use_dispatch_table():
+  f = jit(add_scaled)
+  x = np.arange(10, dtype='float64')
+  y = np.ones(10, dtype='float64')
+  assert eq(f(x, y), add_scaled(x, y))
+  assert len(f._dispatch_table) == 1
+  assert eq(f(x, y), add_scaled(x, y))
+  assert len(f._dispatch_table) == 1, \
+    "Expected warm call to reuse existing entry, got %s" % f._dispatch_table.keys()
+  
+def test_value_specialization_variants():
+  f = jit(add_scaled)
+  x = np.arange(20, dtype='float64')
+  for alpha in (0, 1, 3):
+    for y in (x, x[::2][:10], x[:10], np.zeros(1)):
+      xs = x[:len(y)]
+      expected = add_scaled(xs, y, alpha)
+      assert eq(f(xs, y, alpha), expected), \
+        "Expected %s but got %s (alpha = %s)" % (expected, f(xs, y, alpha), alpha)
+      assert eq(f(xs, y, alpha = alpha), expected)
+  
+def test_type_changes_dispatch():
+  f = jit(add_scaled)
+  x = np.arange(6)
+  assert eq(f(x, x), add_scaled(x, x))
+  xf = x.astype('float64')
+  assert eq(f(xf, xf), add_scaled(xf, xf))
+  x2 = x.reshape((2,3))
+  assert eq(f(x2, x2), add_scaled(x2, x2))
+  assert len(f._dispatch_table) == 3, "Expected 3 entries, got %s" % f._dispatch_table.keys()
+  
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,59 @@
+import numpy as np
+
+from parakeet import jit, specialize
+from parakeet.analysis import SyntaxVisitor
+from parakeet.transforms.pipeline import free_arrays, lower_to_loops
+from parakeet.testing_helpers import run_local_tests, eq
+
+class FindFrees(SyntaxVisitor):
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.freed = []
+
+  def visit_Free(self, expr):
+    self.freed.append(expr.value.name)
+
+def freed_names(fn, args):
+  typed, _ = specialize(fn, args)
+  finder = FindFrees()
+  finder.visit_fn(free_arrays(lower_to_loops(typed)))
+  return finder.freed
+
+def temp_sum(x):
+  y = x * 2
+  return sum(y) + y[0]
+
+def temp_in_loop(x, n):
+  total = 0.0
+  for i in range(n):
+    y = x + i
+    total += sum(y) * y[1]
+  return total
+
+def return_view(x):
+  y = x + 1
+  return y[1:]
+
+def return_in_tuple(x):
+  y = x + 1
+  return (y, sum(y))
+
+x = np.arange(10.0)
+
+def test_temporaries_freed():
+  assert len(freed_names(temp_sum, [x])) == 1
+  assert len(freed_names(temp_in_loop, [x, 3])) == 1
+
+def test_escaping_arrays_kept():
+  assert freed_names(return_view, [x]) == []
+  assert freed_names(return_in_tuple, [x]) == []
+
+def test_results():
+  assert eq(jit(temp_sum)(x, _backend = 'c'), temp_sum(x))
+  assert eq(jit(temp_in_loop)(x, 3, _backend = 'c'), temp_in_loop(x, 3))
+  assert eq(jit(return_view)(x, _backend = 'c'), return_view(x))
+  y, total = jit(return_in_tuple)(x, _backend = 'c')
+  assert eq(y, x + 1) and eq(total, sum(x + 1))
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,62 @@
+import glob
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import parakeet
+from parakeet import jit, config, clear_caches
+from parakeet.c_backend import config as c_config
+from parakeet.c_backend.compile_util import compiler_is_gnu
+from parakeet.c_backend.system_info import get_compiler
+from parakeet.testing_helpers import run_local_tests, eq
+
+# the OpenMP backend calls the bodies of parallel loops as separate functions
+if parakeet.system_info.openmp_available or compiler_is_gnu(get_compiler()):
+  backend = 'openmp'
+else:
+  backend = config.backend
+
+def add_one(x):
+  return parakeet.map(lambda xi: xi + 1, x)
+
+def dot_plus_sum(x, y):
+  return np.dot(x, y) + parakeet.reduce(lambda a, b: a + b, x)
+
+def compile_with_helpers(mode):
+  old_settings = (c_config.helper_objects, c_config.cache_dir, 
+                  config.persistent_specialization_cache)
+  cache_dir = tempfile.mkdtemp(prefix = "parakeet_helpers_")
+  c_config.helper_objects = mode
+  c_config.cache_dir = cache_dir
+  config.persistent_specialization_cache = False
+  clear_caches()
+  try:
+    x = np.arange(10.0)
+    assert eq(jit(add_one)(x, _backend = backend), x + 1)
+    assert eq(jit(dot_plus_sum)(x, x, _backend = backend), np.dot(x, x) + x.sum())
+    return glob.glob(os.path.join(cache_dir, "helper_*"))
+  finally:
+    c_config.helper_objects, c_config.cache_dir, \
+      config.persistent_specialization_cache = old_settings
+    clear_caches()
+    shutil.rmtree(cache_dir)
+
+def test_object_helpers():
+  helpers = compile_with_helpers('object')
+  if backend == 'openmp':
+    assert len(helpers) > 0
+    assert all(h.endswith(".o") for h in helpers), helpers
+
+def test_shared_helpers():
+  helpers = compile_with_helpers('shared')
+  if backend == 'openmp':
+    assert len(helpers) > 0
+    assert not any(h.endswith(".o") for h in helpers), helpers
+
+def test_inline_helpers():
+  assert compile_with_helpers(None) == []
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,58 @@
+import numpy as np
+
+from parakeet import jit, config
+from parakeet.testing_helpers import run_local_tests, eq
+
+def scale(x, alpha):
+  return x * alpha
+
+def test_arrays_and_scalars():
+  f = jit(scale)
+  x = np.arange(10.0)
+  for alpha in (2.0, 3, 0, 1.0):
+    assert eq(f(x, alpha), x * alpha)
+  x2 = np.arange(12.0).reshape(3, 4)[:, ::2]
+  assert eq(f(x2, 2.0), x2 * 2.0)
+  assert f._native_tables
+  # once every signature is compiled the Python function isn't needed
+  f.f = None
+  f.untyped = None
+  f.fn = None
+  for alpha in (2.5, 4, 0, 1.0):
+    assert eq(f(x, alpha), x * alpha)
+  assert eq(f(x2, 0.5), x2 * 0.5)
+
+def choose(b, x, y):
+  if b:
+    return x
+  else:
+    return y
+
+def test_bool_args():
+  f = jit(choose)
+  assert f(True, 1.0, 2.0) == 1.0
+  assert f(False, 1.0, 2.0) == 2.0
+  assert f(True, 3.0, 2.0) == 3.0
+
+def test_keywords_fall_back():
+  f = jit(scale)
+  x = np.arange(5)
+  assert eq(f(x, 2), x * 2)
+  assert eq(f(x, alpha = 2), x * 2)
+  assert eq(f(x = x, alpha = 3), x * 3)
+  # a type we haven't seen yet gets compiled
+  assert eq(f(x.astype('float32'), 3), x.astype('float32') * 3)
+
+def test_disabled():
+  old = config.native_dispatch
+  config.native_dispatch = False
+  try:
+    f = jit(scale)
+    x = np.arange(5)
+    assert eq(f(x, 2), x * 2)
+    assert not f._native_tables
+  finally:
+    config.native_dispatch = old
+
+if __name__ == '__main__':
+  run_local_tests()
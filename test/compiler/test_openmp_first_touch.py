@@ -0,0 +1,57 @@
+import numpy as np
+
+import parakeet
+from parakeet import jit, config, specialize
+from parakeet.c_backend.compile_util import compiler_is_gnu
+from parakeet.c_backend.system_info import get_compiler
+from parakeet.openmp_backend import MulticoreCompiler
+from parakeet.openmp_backend import config as openmp_config
+from parakeet.transforms.pipeline import lower_to_adverbs
+from parakeet.testing_helpers import run_local_tests, eq
+
+if parakeet.system_info.openmp_available or compiler_is_gnu(get_compiler()):
+  backend = 'openmp'
+else:
+  backend = config.backend
+
+def add(x, y):
+  return x + y
+
+def zeros(n):
+  return np.zeros(n)
+
+def ones_2d(n, m):
+  return np.ones((n, m))
+
+def generated_source(fn, args):
+  typed, _ = specialize(fn, args)
+  _, _, src = MulticoreCompiler().visit_fn(lower_to_adverbs.apply(typed))
+  return src
+
+def test_touch_loop_in_source():
+  x = np.arange(10.0)
+  old = openmp_config.first_touch
+  try:
+    openmp_config.first_touch = True
+    assert "touch_ptr" in generated_source(add, [x, x])
+    openmp_config.first_touch = False
+    assert "touch_ptr" not in generated_source(add, [x, x])
+  finally:
+    openmp_config.first_touch = old
+
+def test_large_outputs():
+  # big enough to be touched page by page
+  n = 300000
+  x = np.random.randn(n)
+  old = openmp_config.first_touch
+  try:
+    for setting in (True, False):
+      openmp_config.first_touch = setting
+      assert eq(jit(add)(x, x, _backend = backend), x + x)
+      assert eq(jit(zeros)(n, _backend = backend), np.zeros(n))
+      assert eq(jit(ones_2d)(600, 500, _backend = backend), np.ones((600, 500)))
+  finally:
+    openmp_config.first_touch = old
+
+if __name__ == '__main__':
+  run_local_tests()
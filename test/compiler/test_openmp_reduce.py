@@ -0,0 +1,60 @@
+import numpy as np
+
+import parakeet
+from parakeet import jit, config, specialize
+from parakeet.c_backend.compile_util import compiler_is_gnu
+from parakeet.c_backend.system_info import get_compiler
+from parakeet.openmp_backend import MulticoreCompiler
+from parakeet.transforms.pipeline import lower_to_adverbs
+from parakeet.testing_helpers import run_local_tests, eq
+
+if parakeet.system_info.openmp_available or compiler_is_gnu(get_compiler()):
+  backend = 'openmp'
+else:
+  backend = config.backend
+
+def min_reduce(x):
+  return parakeet.reduce(lambda a, b: a if a < b else b, x)
+
+def max_reduce(x):
+  return parakeet.reduce(lambda a, b: a if a > b else b, x)
+
+def argmin_reduce(x):
+  def combine((i1, v1), (i2, v2)):
+    if v1 <= v2:
+      return (i1, v1)
+    else:
+      return (i2, v2)
+  return parakeet.ireduce(lambda i: (i, x[i]), combine, x.shape, (0, x[0]))
+
+x = np.random.randn(1000)
+m = np.random.randn(30, 40)
+
+def test_min():
+  assert eq(jit(min_reduce)(x, _backend = backend), x.min())
+
+def test_max_2d():
+  assert eq(jit(max_reduce)(m, _backend = backend), m.max())
+
+def test_argmin_tuple():
+  i, v = jit(argmin_reduce)(x, _backend = backend)
+  assert i == np.argmin(x), (i, np.argmin(x))
+  assert v == x.min()
+
+def min_of_few(x):
+  return parakeet.reduce(lambda a, b: a if a < b else b, x)
+
+def test_fewer_elements_than_threads():
+  y = np.array([3.0, 2.0])
+  assert eq(jit(min_of_few)(y, _backend = backend), 2.0)
+
+def test_partials_checked():
+  # the per-thread results get allocated (and checked) before the parallel 
+  # region, with a sequential reduction if that allocation fails 
+  typed, _ = specialize(min_reduce, [x])
+  _, _, src = MulticoreCompiler().visit_fn(lower_to_adverbs.apply(typed))
+  assert "omp_get_max_threads()" in src, src
+  assert "reduce on this thread" in src, src
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,33 @@
+import numpy as np
+
+import parakeet
+from parakeet import jit, config
+from parakeet.c_backend.compile_util import compiler_is_gnu
+from parakeet.c_backend.system_info import get_compiler
+from parakeet.testing_helpers import run_local_tests, eq
+
+if parakeet.system_info.openmp_available or compiler_is_gnu(get_compiler()):
+  backend = 'openmp'
+else:
+  backend = config.backend
+
+def running_sum(x):
+  return parakeet.cumsum(x)
+
+def running_max(x):
+  return parakeet.scan(lambda a, b: a if a > b else b, x, init = x[0])
+
+x = np.random.randn(1001)
+
+def test_cumsum():
+  assert np.allclose(jit(running_sum)(x, _backend = backend), np.cumsum(x))
+
+def test_running_max():
+  assert eq(jit(running_max)(x, _backend = backend), np.maximum.accumulate(x))
+
+def test_fewer_elements_than_threads():
+  y = np.array([2, 1])
+  assert eq(jit(running_sum)(y, _backend = backend), np.cumsum(y))
+
+if __name__ == '__main__':
+  run_local_tests()
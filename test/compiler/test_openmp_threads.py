@@ -0,0 +1,84 @@
+import threading
+import numpy as np
+
+import parakeet
+from parakeet import jit, config
+from parakeet.c_backend.compile_util import compiler_is_gnu
+from parakeet.c_backend.system_info import get_compiler
+from parakeet.openmp_backend import runtime
+from parakeet.testing_helpers import run_local_tests, eq
+
+if parakeet.system_info.openmp_available or compiler_is_gnu(get_compiler()):
+  backend = 'openmp'
+else:
+  backend = config.backend
+
+def add_one(x):
+  return parakeet.each(lambda v: v + 1, x)
+
+x = np.arange(100.0)
+
+def test_set_num_threads():
+  old = parakeet.get_num_threads()
+  try:
+    parakeet.set_num_threads(3)
+    if runtime.load() is not None:
+      assert parakeet.get_num_threads() == 3
+    assert eq(jit(add_one)(x, _backend = backend), x + 1)
+  finally:
+    parakeet.set_num_threads(old)
+
+def test_other_python_threads():
+  old = parakeet.get_num_threads()
+  seen = []
+  try:
+    parakeet.set_num_threads(2)
+    t = threading.Thread(target = lambda: seen.append(parakeet.get_num_threads()))
+    t.start()
+    t.join()
+    if runtime.load() is not None:
+      assert seen == [2], seen
+  finally:
+    parakeet.set_num_threads(old)
+
+def test_default_schedule():
+  # every thread starts from our schedule instead of OpenMP's dynamic,1
+  kinds = []
+  def call():
+    jit(add_one)(x, _backend = backend)
+    module = runtime.load()
+    if module is not None:
+      kinds.append(module.omp_runtime_current()[1])
+  call()
+  t = threading.Thread(target = call)
+  t.start()
+  t.join()
+  if backend == 'openmp' and runtime.load() is not None and runtime.config.runtime_schedule:
+    expected = runtime.schedule_kinds[runtime.default_schedule()[0]]
+    assert kinds == [expected, expected], kinds
+
+def test_call_overrides():
+  f = jit(add_one)
+  before = parakeet.get_num_threads()
+  for schedule in ('static', 'dynamic', 'guided'):
+    assert eq(f(x, _backend = backend, _threads = 2, _schedule = schedule, _chunk = 7), x + 1)
+  assert eq(f(x, _threads = 4), x + 1)
+  # the overrides only last for the call
+  assert parakeet.get_num_threads() == before
+  # and don't get in the way of the fast path afterward
+  assert eq(f(x, _backend = backend), x + 1)
+
+def test_runtime_schedule_in_source():
+  from parakeet.openmp_backend import MulticoreCompiler
+  omp = MulticoreCompiler().omp_pragma(1, ["i"])
+  assert "schedule(runtime)" in omp, omp
+  old = runtime.config.runtime_schedule
+  runtime.config.runtime_schedule = False
+  try:
+    omp = MulticoreCompiler().omp_pragma(1, ["i"])
+    assert "schedule(%s)" % runtime.config.schedule in omp, omp
+  finally:
+    runtime.config.runtime_schedule = old
+
+if __name__ == '__main__':
+  run_local_tests()
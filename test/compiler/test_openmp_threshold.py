@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+
+import parakeet
+from parakeet import jit, config, specialize
+from parakeet.analysis.cost_estimate import estimate_cost
+from parakeet.c_backend import config as c_config
+from parakeet.c_backend.compile_util import compiler_is_gnu
+from parakeet.c_backend.system_info import get_compiler
+from parakeet.openmp_backend import MulticoreCompiler, calibrate
+from parakeet.openmp_backend import config as openmp_config
+from parakeet.testing_helpers import run_local_tests, eq
+
+if parakeet.system_info.openmp_available or compiler_is_gnu(get_compiler()):
+  backend = 'openmp'
+else:
+  backend = config.backend
+
+def add_one(x):
+  return x + 1
+
+def sum_to_100(x):
+  total = x
+  for i in range(100):
+    total = total + i
+  return total
+
+def test_cost_estimate():
+  cheap, _ = specialize(add_one, [1.0])
+  expensive, _ = specialize(sum_to_100, [1.0])
+  assert estimate_cost(cheap) < 10, estimate_cost(cheap)
+  assert estimate_cost(expensive) >= 100 * estimate_cost(cheap)
+
+def test_parallel_if():
+  typed, _ = specialize(add_one, [1.0])
+  clause = MulticoreCompiler().parallel_if(["n"], [typed])
+  assert clause.startswith(" if("), clause
+  old = openmp_config.min_parallel_work
+  openmp_config.min_parallel_work = None
+  try:
+    assert MulticoreCompiler().parallel_if(["n"], [typed]) == ""
+  finally:
+    openmp_config.min_parallel_work = old
+
+def map_add_one(x):
+  return parakeet.each(add_one, x)
+
+def min_reduce(x):
+  return parakeet.reduce(lambda a, b: a if a < b else b, x)
+
+def test_small_and_large_inputs():
+  f = jit(map_add_one)
+  g = jit(min_reduce)
+  h = jit(parakeet.cumsum)
+  for n in (10, 100000, 7):
+    x = np.random.randn(n)
+    assert eq(f(x, _backend = backend), x + 1)
+    assert eq(g(x, _backend = backend), x.min())
+    assert np.allclose(h(x, _backend = backend), np.cumsum(x))
+
+def test_calibrate():
+  old_setting = openmp_config.min_parallel_work
+  old_cache_dir = c_config.cache_dir
+  cache_dir = tempfile.mkdtemp()
+  openmp_config.min_parallel_work = 'calibrate'
+  c_config.cache_dir = cache_dir
+  del calibrate._calibrated[:]
+  try:
+    work = calibrate.min_parallel_work()
+    assert work > 0, work
+    if calibrate.measure(10) is not None:
+      assert os.path.exists(calibrate.calibration_filename())
+    # later lookups reuse the measurement
+    del calibrate._calibrated[:]
+    assert calibrate.min_parallel_work() == work
+  finally:
+    openmp_config.min_parallel_work = old_setting
+    c_config.cache_dir = old_cache_dir
+    del calibrate._calibrated[:]
+    shutil.rmtree(cache_dir)
+
+def test_threshold_resolved_once():
+  old_setting = openmp_config.min_parallel_work
+  openmp_config.min_parallel_work = 'calibrate'
+  del calibrate._calibrated[:]
+  try:
+    # nested compilers get the threshold from their parent, 
+    # so looking up their cache keys never starts a calibration 
+    compiler = MulticoreCompiler(min_parallel_work = 1234)
+    assert compiler.cache_key[3] == 1234
+    assert calibrate._calibrated == []
+  finally:
+    openmp_config.min_parallel_work = old_setting
+    del calibrate._calibrated[:]
+
+if __name__ == '__main__':
+  run_local_tests()
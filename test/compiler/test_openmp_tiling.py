@@ -0,0 +1,81 @@
+import numpy as np
+import threading
+
+import parakeet
+from parakeet import jit, config
+from parakeet.c_backend.compile_util import compiler_is_gnu
+from parakeet.c_backend.system_info import get_compiler
+from parakeet.openmp_backend import tiling
+from parakeet.testing_helpers import run_local_tests, eq
+
+if parakeet.system_info.openmp_available or compiler_is_gnu(get_compiler()):
+  backend = 'openmp'
+else:
+  backend = config.backend
+
+def sqr_dist(x, y):
+  return sum((x - y) ** 2)
+
+def allpairs_dist(X, Y):
+  return parakeet.allpairs(sqr_dist, X, Y)
+
+def triple_dots(X, Y, Z):
+  return parakeet.imap(lambda (i, j, k): sum(X[i] * Y[j] * Z[k]),
+                       (X.shape[0], Y.shape[0], Z.shape[0]))
+
+X = np.random.randn(37, 5)
+Y = np.random.randn(23, 5)
+Z = np.random.randn(11, 5)
+expected_dists = ((X[:, None, :] - Y[None, :, :]) ** 2).sum(axis = 2)
+expected_dots = np.einsum('id,jd,kd->ijk', X, Y, Z)
+
+def test_tile_settings():
+  assert tiling.tile_sizes(1) is None
+  with tiling.overrides(8):
+    assert tiling.tile_sizes(2) == (8, 8)
+    assert tiling.tile_sizes(3) == (8, 8, 8)
+  with tiling.overrides((4, 16)):
+    assert tiling.tile_sizes(2) == (4, 16)
+    # sizes for some other rank fall back on choosing them automatically
+    assert tiling.tile_sizes(3) == 'auto'
+  with tiling.overrides(False):
+    assert tiling.tile_sizes(2) is None
+    assert tiling.current_override() is False
+  with tiling.overrides(None):
+    assert tiling.tile_sizes(2) is None
+    assert tiling.current_override() is False
+  with tiling.overrides(True):
+    assert tiling.tile_sizes(2) == 'auto'
+  assert tiling.current_override() is None
+  assert tiling.overrides_active == 0
+
+def test_overrides_from_threads():
+  def run():
+    for _ in xrange(1000):
+      with tiling.overrides(4):
+        assert tiling.tile_sizes(2) == (4, 4)
+  threads = [threading.Thread(target = run) for _ in xrange(8)]
+  for t in threads: t.start()
+  for t in threads: t.join()
+  assert tiling.overrides_active == 0
+
+def test_allpairs_tiles():
+  f = jit(allpairs_dist)
+  for tile in (None, 4, (5, 3), 1000, False):
+    kwargs = {'_backend' : backend}
+    if tile is not None:
+      kwargs['_tile'] = tile
+    assert np.allclose(f(X, Y, **kwargs), expected_dists), "Wrong result with tiles %s" % (tile,)
+  # the default tiling still gets used afterward
+  assert np.allclose(f(X, Y, _backend = backend), expected_dists)
+
+def test_3d_tiles():
+  f = jit(triple_dots)
+  for tile in (None, 2, (3, 4, 5)):
+    kwargs = {'_backend' : backend}
+    if tile is not None:
+      kwargs['_tile'] = tile
+    assert np.allclose(f(X, Y, Z, **kwargs), expected_dots), "Wrong result with tiles %s" % (tile,)
+
+if __name__ == '__main__':
+  run_local_tests()
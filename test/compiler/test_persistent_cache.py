@@ -0,0 +1,53 @@
+import numpy as np 
+
+from parakeet import jit, config 
+from parakeet.c_backend import config as c_config 
+from parakeet.frontend import persistent_cache 
+from parakeet.testing_helpers import run_local_tests, eq
+
+global_offsets = np.arange(8.0)
+
+def scale(x):
+  return x * 3
+
+def shifted(x, shift = 1):
+  return scale(x) + global_offsets + shift 
+
+def test_fresh_jit_skips_translation():
+  if not persistent_cache.enabled():
+    return 
+  x = np.ones(8)
+  assert eq(jit(shifted)(x), shifted(x))
+  # a new wrapper has an empty dispatch table so it has to go to disk  
+  f = jit(shifted)
+  assert eq(f(x), shifted(x))
+  assert f.untyped is None, "Expected persistent cache hit to skip translation"
+  assert eq(f(x, shift = 2), shifted(x, shift = 2))
+
+def test_digest_depends_on_helpers():
+  d1 = persistent_cache.function_digest(shifted)
+  assert d1 is not None 
+  assert d1 == persistent_cache.function_digest(shifted)
+  old_scale = globals()['scale']
+  def other_scale(x):
+    return x * 4
+  globals()['scale'] = other_scale 
+  try:
+    d2 = persistent_cache.function_digest(shifted)
+  finally:
+    globals()['scale'] = old_scale 
+  assert d1 != d2, "Expected digest to change when a called function changes"
+
+def test_disabled_cache():
+  old_value = config.persistent_specialization_cache
+  config.persistent_specialization_cache = False 
+  try:
+    x = np.ones(8)
+    f = jit(shifted)
+    assert eq(f(x), shifted(x))
+    assert f.untyped is not None 
+  finally:
+    config.persistent_specialization_cache = old_value
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,97 @@
+import numpy as np
+
+import parakeet
+from parakeet import jit, specialize
+from parakeet.analysis import SyntaxVisitor
+from parakeet.transforms.pipeline import lower_to_loops
+from parakeet.testing_helpers import run_local_tests, eq
+
+class CountLoopAllocs(SyntaxVisitor):
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.depth = 0
+    self.in_loops = 0
+
+  def visit_Alloc(self, expr):
+    if self.depth > 0:
+      self.in_loops += 1
+
+  def visit_AllocArray(self, expr):
+    self.visit_Alloc(expr)
+
+  def visit_ForLoop(self, stmt):
+    self.depth += 1
+    SyntaxVisitor.visit_ForLoop(self, stmt)
+    self.depth -= 1
+
+  def visit_While(self, stmt):
+    self.depth += 1
+    SyntaxVisitor.visit_While(self, stmt)
+    self.depth -= 1
+
+def allocs_in_loops(fn, args):
+  typed, _ = specialize(fn, args)
+  counter = CountLoopAllocs()
+  counter.visit_fn(lower_to_loops(typed))
+  return counter.in_loops
+
+def independent_outer_loops(fn, args):
+  typed, _ = specialize(fn, args)
+  return [stmt for stmt in lower_to_loops(typed).body 
+          if stmt.__class__.__name__ == 'ForLoop' and stmt.independent]
+
+def temp_per_row(x):
+  total = 0.0
+  for i in range(x.shape[0]):
+    y = x[i] * 2
+    total += sum(y) * y[0]
+  return total
+
+def scaled_row_sum(row, k):
+  tmp = np.zeros(row.shape[0])
+  for j in range(row.shape[0]):
+    tmp[j] = row[j] * k
+  total = 0.0
+  for j in range(row.shape[0]):
+    total += tmp[j] * tmp[row.shape[0] - j - 1]
+  return total
+
+def helper_per_row(x):
+  total = 0.0
+  for i in range(x.shape[0]):
+    total += scaled_row_sum(x[i], i)
+  return total
+
+def keep_last_row(x):
+  last = x[0] * 1
+  for i in range(x.shape[0]):
+    last = x[i] * 2
+  return last
+
+def row_stat(row):
+  y = row * 2
+  return sum(y) * y[0]
+
+def map_rows(x):
+  return parakeet.map(row_stat, x)
+
+x = np.arange(12.0).reshape(3, 4)
+
+def test_loop_temporaries_hoisted():
+  assert allocs_in_loops(temp_per_row, [x]) == 0
+  assert allocs_in_loops(helper_per_row, [x]) == 0
+
+def test_shared_buffer_not_independent():
+  # the rows of the map all write into the same hoisted temporary, 
+  # so its loop can't be run in SIMD lanes anymore  
+  assert allocs_in_loops(map_rows, [x]) == 0
+  assert independent_outer_loops(map_rows, [x]) == []
+
+def test_results():
+  assert eq(jit(temp_per_row)(x, _backend = 'c'), temp_per_row(x))
+  assert eq(jit(helper_per_row)(x, _backend = 'c'), helper_per_row(x))
+  assert eq(jit(keep_last_row)(x, _backend = 'c'), keep_last_row(x))
+  assert eq(jit(map_rows)(x, _backend = 'c'), np.array([row_stat(row) for row in x]))
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+
+import numpy as np
+
+from parakeet import jit, precompile, clear_caches, Float64, Int64, make_array_type
+from parakeet.c_backend import PyModuleCompiler
+from parakeet.c_backend import config as c_config
+from parakeet.testing_helpers import run_local_tests, eq
+
+@jit
+def scaled_sum(x, y, alpha):
+  return x + alpha * y
+
+def test_precompile():
+  sigs = [(make_array_type(t, 1), make_array_type(t, 1), t) for t in (Float64, Int64)]
+  timings = precompile([(scaled_sum, sigs)], jobs = 2)
+  assert len(timings) == 2
+  for t in timings:
+    assert t.fn_name == 'scaled_sum'
+    assert t.lower >= 0 and t.build >= 0 and t.load >= 0
+  assert len(scaled_sum._dispatch_table) == 2, \
+    "Expected precompiled entries in dispatch table, got %s" % scaled_sum._dispatch_table.keys()
+  x = np.arange(10.0)
+  assert eq(scaled_sum(x, x, 3.0), x + 3.0 * x)
+  xi = np.arange(10)
+  assert eq(scaled_sum(xi, xi, 3), xi + 3 * xi)
+  # no new specializations needed for either call
+  assert len(scaled_sum._dispatch_table) == 2
+
+def test_precompile_example_values():
+  def double(x):
+    return 2 * x
+  x = np.arange(6.0).reshape(2, 3)
+  timings = precompile({double : [(x,)]})
+  assert len(timings) == 1
+  assert timings[0].input_types == (make_array_type(Float64, 2),)
+
+def test_codegen_runs_once():
+  def shifted(x, k):
+    return x + k
+  old_cache_dir = c_config.cache_dir
+  old_codegen = PyModuleCompiler.entry_module_args
+  c_config.cache_dir = tempfile.mkdtemp(prefix = "parakeet_precompile_")
+  clear_caches()
+  calls = []
+  def counting_codegen(self, fn):
+    calls.append(fn.name)
+    return old_codegen(self, fn)
+  PyModuleCompiler.entry_module_args = counting_codegen
+  try:
+    sigs = [(make_array_type(t, 1), t) for t in (Float64, Int64)]
+    timings = precompile({shifted : sigs}, backend = 'c')
+    assert len(timings) == 2
+    # the modules built ahead of time get registered as they are 
+    assert len(calls) == 2, calls
+  finally:
+    PyModuleCompiler.entry_module_args = old_codegen
+    shutil.rmtree(c_config.cache_dir)
+    c_config.cache_dir = old_cache_dir
+    clear_caches()
+
+if __name__ == '__main__':
+  run_local_tests()
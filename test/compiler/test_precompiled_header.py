@@ -0,0 +1,50 @@
+import glob
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from parakeet import jit, config, clear_caches
+from parakeet.c_backend import config as c_config
+from parakeet.c_backend.compile_util import compiler_is_gnu
+from parakeet.c_backend.system_info import get_compiler
+from parakeet.testing_helpers import run_local_tests, eq
+
+def add_one(x):
+  return x + 1
+
+def compile_in_fresh_cache(use_pch):
+  old_settings = (c_config.precompiled_headers, c_config.cache_dir, 
+                  config.persistent_specialization_cache)
+  cache_dir = tempfile.mkdtemp(prefix = "parakeet_pch_")
+  c_config.precompiled_headers = use_pch
+  c_config.cache_dir = cache_dir
+  config.persistent_specialization_cache = False
+  clear_caches()
+  try:
+    x = np.arange(10.0)
+    f = jit(add_one)
+    assert eq(f(x), x + 1)
+    assert eq(f(x.astype('int32')), x.astype('int32') + 1)
+    return [os.path.basename(name) 
+            for name in glob.glob(os.path.join(cache_dir, "parakeet_prelude_*"))]
+  finally:
+    c_config.precompiled_headers, c_config.cache_dir, \
+      config.persistent_specialization_cache = old_settings
+    clear_caches()
+    shutil.rmtree(cache_dir)
+
+def test_precompiled_header():
+  if config.backend not in ('c', 'openmp') or not compiler_is_gnu(get_compiler()):
+    return 
+  files = compile_in_fresh_cache(True)
+  # both specializations share one precompiled header
+  assert len(files) == 2, files
+  assert any(name.endswith(".h.gch") for name in files), files
+
+def test_without_precompiled_header():
+  assert compile_in_fresh_cache(False) == []
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,40 @@
+import numpy as np
+
+import parakeet
+from parakeet import profile_compile, compile_profiler, jit, config
+from parakeet.testing_helpers import run_local_tests, eq
+
+def dot_plus_one(x, y):
+  return np.dot(x, y) + 1
+
+def find_kinds(node, kinds):
+  kinds.add(node.kind)
+  for child in node.children.itervalues():
+    find_kinds(child, kinds)
+  return kinds
+
+def test_profile_compile():
+  x = np.arange(10.0)
+  profile = profile_compile(dot_plus_one, x, x)
+  kinds = find_kinds(profile, set())
+  for expected in ('translate', 'type_inference', 'phase', 'transform', 'codegen'):
+    assert expected in kinds, "Missing %s in profile:\n%s" % (expected, profile)
+  if config.backend in ('c', 'openmp'):
+    for expected in ('compile', 'link', 'load'):
+      assert expected in kinds, "Missing %s in profile:\n%s" % (expected, profile)
+  totals = profile.totals()
+  assert totals['phase'][0] <= profile.time
+  d = profile.to_dict()
+  assert d['children'], d
+  # the settings bypassed for a cold start come back afterward
+  assert config.persistent_specialization_cache
+
+def test_profiler_context():
+  x = np.arange(10)
+  with compile_profiler(cold = False) as profile:
+    assert eq(jit(dot_plus_one)(x, x), np.dot(x, x) + 1)
+  assert profile.count == 1
+  assert parakeet.profiling.active is None
+
+if __name__ == '__main__':
+  run_local_tests()
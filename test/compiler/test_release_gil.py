@@ -0,0 +1,61 @@
+import threading
+
+import numpy as np
+
+import parakeet
+from parakeet import jit, specialize
+from parakeet.c_backend import PyModuleCompiler
+from parakeet.c_backend import config as c_config
+from parakeet.c_backend.compile_util import compiler_is_gnu
+from parakeet.c_backend.system_info import get_compiler
+from parakeet.openmp_backend import MulticoreCompiler
+from parakeet.transforms.pipeline import lower_to_adverbs, lower_to_loops
+from parakeet.testing_helpers import run_local_tests, eq
+
+def dot(x, y):
+  return sum(x * y)
+
+def add_and_shape(x):
+  return (x + 1, x.shape)
+
+x = np.random.randn(10000)
+
+def test_entry_source():
+  typed, _ = specialize(dot, [x, x])
+  _, _, src = PyModuleCompiler().visit_fn(lower_to_loops(typed))
+  assert "PyEval_SaveThread" in src and "PyEval_RestoreThread" in src, src
+  # the result only gets boxed after taking back the GIL
+  assert src.index("PyEval_RestoreThread") < src.index("PyArray_Scalar"), src
+  old = c_config.release_gil
+  try:
+    c_config.release_gil = False
+    _, _, src = PyModuleCompiler().visit_fn(lower_to_loops(typed))
+    assert "PyEval_SaveThread" not in src, src
+  finally:
+    c_config.release_gil = old
+
+def test_no_nested_release():
+  typed, _ = specialize(add_and_shape, [x])
+  _, _, src = MulticoreCompiler().visit_fn(lower_to_adverbs.apply(typed))
+  assert "PyEval_SaveThread" in src, src
+  assert "Py_BEGIN_ALLOW_THREADS" not in src, src
+
+def test_threads():
+  if parakeet.system_info.openmp_available or compiler_is_gnu(get_compiler()):
+    backends = ['c', 'openmp']
+  else:
+    backends = ['c']
+  for backend in backends:
+    expected = np.dot(x, x)
+    results = [None] * 4
+    def run(i):
+      results[i] = jit(dot)(x, x, _backend = backend)
+    threads = [threading.Thread(target = run, args = (i,)) for i in xrange(4)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert all(np.allclose(result, expected) for result in results), results
+    y, shape = jit(add_and_shape)(x, _backend = backend)
+    assert eq(y, x + 1) and shape == x.shape
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,151 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+import parakeet
+from parakeet import jit, specialize, config
+from parakeet.c_backend import PyModuleCompiler, scratch
+from parakeet.c_backend import config as c_config
+from parakeet.transforms.pipeline import free_arrays, lower_to_loops
+from parakeet.testing_helpers import run_local_tests, eq
+
+def temp_sum(x):
+  y = x * 2
+  return sum(y) + y[0]
+
+def temp_in_loop(x, n):
+  total = 0.0
+  for i in range(n):
+    y = x + i
+    total += sum(y) * y[1]
+  return total
+
+def chained_in_loop(x, n):
+  total = 0.0
+  for i in range(n):
+    y = x * 2
+    z = y + 1
+    total += sum(z)
+  return total
+
+def return_in_tuple(x):
+  y = x + 1
+  return (y, sum(y))
+
+def generated_source(fn, args):
+  typed, _ = specialize(fn, args)
+  _, _, src = PyModuleCompiler().visit_fn(free_arrays(lower_to_loops(typed)))
+  return src
+
+x = np.arange(10.0)
+
+def test_arena_in_source():
+  if scratch.load() is None:
+    return
+  src = generated_source(temp_in_loop, [x, 3])
+  assert "scratch_api->alloc" in src, src
+  # the temporary's size only depends on the argument's shape
+  assert "scratch_api->reserve" in src, src
+  assert "scratch_api->reset" in src, src
+  assert "scratch_api" not in generated_source(return_in_tuple, [x])
+  old = c_config.scratch_arena
+  try:
+    c_config.scratch_arena = False
+    assert "scratch_api" not in generated_source(temp_in_loop, [x, 3])
+  finally:
+    c_config.scratch_arena = old
+
+def test_results():
+  assert eq(jit(temp_sum)(x, _backend = 'c'), temp_sum(x))
+  assert eq(jit(temp_in_loop)(x, 3, _backend = 'c'), temp_in_loop(x, 3))
+  y, total = jit(return_in_tuple)(x, _backend = 'c')
+  assert eq(y, x + 1) and eq(total, sum(x + 1))
+
+def test_arena_reused():
+  if scratch.load() is None:
+    return
+  big = np.random.randn(100000)
+  jit(temp_in_loop)(big, 2, _backend = 'c')
+  before = scratch.stats()
+  for _ in xrange(5):
+    assert np.allclose(jit(temp_in_loop)(big, 2, _backend = 'c'), temp_in_loop(big, 2))
+  after = scratch.stats()
+  # with PreallocArrays y gets allocated once per call, before the loop 
+  per_call = 1 if config.opt_prealloc_arrays else 2
+  assert after['arena_allocs'] == before['arena_allocs'] + 5 * per_call, (before, after)
+  assert after['fallback_allocs'] == before['fallback_allocs'], (before, after)
+  assert after['reserved_bytes'] == before['reserved_bytes'], (before, after)
+
+def test_chained_temps_reclaimed():
+  # y is freed before z, both have to be reclaimed every iteration 
+  if scratch.load() is None:
+    return
+  big = np.random.randn(100000)
+  f = jit(chained_in_loop)
+  f(big, 2, _backend = 'c')
+  before = scratch.stats()
+  assert np.allclose(f(big, 20, _backend = 'c'), chained_in_loop(big, 20))
+  after = scratch.stats()
+  assert after['fallback_allocs'] == before['fallback_allocs'], (before, after)
+  assert after['reserved_bytes'] == before['reserved_bytes'], (before, after)
+
+def test_limit():
+  if scratch.load() is None:
+    return
+  old = scratch.stats()['limit']
+  try:
+    scratch.release()
+    scratch.set_limit(1024)
+    big = np.random.randn(100000)
+    before = scratch.stats()
+    assert eq(jit(temp_sum)(big, _backend = 'c'), temp_sum(big))
+    after = scratch.stats()
+    assert after['fallback_allocs'] == before['fallback_allocs'] + 1, (before, after)
+  finally:
+    scratch.set_limit(old)
+
+# run in a fresh process, which finds the compiled kernel in the cache 
+# directory the second time without building anything itself 
+cached_kernel_script = """
+import sys
+import numpy as np
+from parakeet import jit, config
+from parakeet.c_backend import config as c_config
+c_config.cache_dir = sys.argv[1]
+config.persistent_specialization_cache = True
+
+def keep_temp(x):
+  y = x * 2
+  z = y + 1
+  return (y, z[0])
+
+x = np.arange(10.0)
+y, z0 = jit(keep_temp)(x, _backend = 'c')
+assert (y == x * 2).all() and z0 == 1.0, (y, z0)
+print "ok"
+"""
+
+def test_cached_module_in_fresh_process():
+  if scratch.load() is None:
+    return
+  cache_dir = tempfile.mkdtemp(prefix = "parakeet_scratch_")
+  try:
+    script = os.path.join(cache_dir, "cached_kernel.py")
+    with open(script, 'w') as f:
+      f.write(cached_kernel_script)
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(parakeet.__file__)))
+    env['PYTHONPATH'] = os.pathsep.join([package_root, env.get('PYTHONPATH', '')])
+    for _ in xrange(2):
+      output = subprocess.check_output([sys.executable, script, cache_dir], 
+                                       env = env, stderr = subprocess.STDOUT)
+      assert output.strip().endswith("ok"), output
+  finally:
+    shutil.rmtree(cache_dir)
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -82,5 +82,30 @@ def test_map_increase_rank_1d():
 def test_map_increase_rank_2d():
   expect_shape(simple_map, [mat], Shape([Var(0), Var(1)]))
 
+def reversed_slice(x):
+  return x[::-1]
+
+def every_other_backward(x):
+  return x[::-2]
+
+def every_third(x):
+  return x[::3]
+
+def const_strided_slice(x):
+  return x[1:10:3]
+
+def last_three(x):
+  return x[-3:]
+
+def test_slice_lengths():
+  from parakeet.shape_inference.shape_eval import concrete_result_shape
+  x = np.arange(10)
+  for fn in (reversed_slice, every_other_backward, every_third, 
+             const_strided_slice, last_three):
+    typed_fn = parakeet.typed_repr(fn, [x])
+    result = concrete_result_shape(typed_fn, [x])
+    assert result == fn(x).shape, \
+      "Expected shape %s for %s, got %s" % (fn(x).shape, fn.__name__, result)
+
 if __name__ == '__main__':
   testing_helpers.run_local_tests()
@@ -0,0 +1,82 @@
+import numpy as np
+
+import parakeet
+from parakeet import jit, specialize
+from parakeet.analysis import SyntaxVisitor
+from parakeet.c_backend import PyModuleCompiler, flags
+from parakeet.c_backend import config as c_config
+from parakeet.transforms.pipeline import lower_to_loops
+from parakeet.testing_helpers import run_local_tests, eq
+
+class FindLoops(SyntaxVisitor):
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.loops = []
+
+  def visit_ForLoop(self, stmt):
+    self.loops.append(stmt)
+    SyntaxVisitor.visit_ForLoop(self, stmt)
+
+def lowered_loops(fn, args):
+  typed, _ = specialize(fn, args)
+  lowered = lower_to_loops(typed)
+  finder = FindLoops()
+  finder.visit_fn(lowered)
+  return lowered, finder.loops
+
+def dot(x, y):
+  return sum(x * y)
+
+def add(x, y):
+  return x + y
+
+def smallest(x):
+  return parakeet.reduce(parakeet.minimum, x)
+
+def shift(x):
+  for i in xrange(1, len(x)):
+    x[i] = x[i-1] + 1
+  return x
+
+x = np.random.randn(1003)
+y = np.random.randn(1003)
+ints = np.arange(1003)
+
+def test_marked_loops():
+  _, loops = lowered_loops(dot, [x, y])
+  assert [loop.simd.values() for loop in loops] == [['+']], loops
+  _, loops = lowered_loops(add, [x, y])
+  assert [loop.simd for loop in loops] == [{}], loops
+  _, loops = lowered_loops(smallest, [x])
+  assert [loop.simd.values() for loop in loops] == [['min']], loops
+
+def test_dependent_loop_not_marked():
+  _, loops = lowered_loops(shift, [x.copy()])
+  assert all(loop.simd is None for loop in loops), loops
+
+def test_pragma_in_source():
+  lowered, _ = lowered_loops(dot, [x, y])
+  _, _, src = PyModuleCompiler().visit_fn(lowered)
+  assert "#pragma omp simd reduction(+:" in src, src
+
+def test_simd_results():
+  assert np.allclose(jit(dot)(x, y, _backend = 'c'), np.dot(x, y))
+  assert eq(jit(dot)(ints, ints, _backend = 'c'), np.dot(ints, ints))
+  assert eq(jit(add)(x, y, _backend = 'c'), x + y)
+  assert eq(jit(smallest)(x, _backend = 'c'), x.min())
+  assert eq(jit(shift)(np.zeros(10), _backend = 'c'), np.arange(10.0))
+
+def test_isa_flags():
+  old = c_config.simd_isa
+  try:
+    c_config.simd_isa = 'avx2'
+    assert '-mavx2' in flags.get_opt_flags()
+    c_config.simd_isa = None
+    assert flags.simd_isa() is None
+    c_config.simd_isa = 'auto'
+    assert flags.simd_isa() in flags.auto_isas + [None]
+  finally:
+    c_config.simd_isa = old
+
+if __name__ == '__main__':
+  run_local_tests()
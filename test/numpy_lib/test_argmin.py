@@ -0,0 +1,63 @@
+import numpy as np
+import parakeet
+from parakeet.testing_helpers import expect, run_local_tests, expect_each
+
+# lots of repeated values so the lowest index has to win every tie
+int_vec = np.random.randint(0, 10, 10000)
+float_vec = int_vec.astype('float64')
+float_mat = np.random.randint(0, 4, (300, 20)).astype('float64')
+int_mat = float_mat.astype('int32')
+matrices = [float_mat, int_mat]
+
+def argmin(x):
+  return np.argmin(x)
+
+def argmax(x):
+  return np.argmax(x)
+
+def test_argmin_vec():
+  expect(argmin, [int_vec], np.argmin(int_vec))
+  expect(argmin, [float_vec], np.argmin(float_vec))
+
+def test_argmax_vec():
+  expect(argmax, [int_vec], np.argmax(int_vec))
+  expect(argmax, [float_vec], np.argmax(float_vec))
+
+def test_argmin_flattened():
+  expect_each(argmin, np.argmin, matrices)
+
+def argmin_rows(X):
+  return np.argmin(X, 1)
+
+def test_argmin_rows():
+  expect_each(argmin_rows, lambda X: np.argmin(X, 1), matrices)
+
+def argmax_cols(X):
+  return np.argmax(X, axis = 0)
+
+def test_argmax_cols():
+  expect_each(argmax_cols, lambda X: np.argmax(X, axis = 0), matrices)
+
+def argmax_method(x):
+  return x.argmax()
+
+def test_argmax_method():
+  expect(argmax_method, [float_vec], float_vec.argmax())
+
+def test_axis_from_python():
+  for X in matrices:
+    assert np.all(parakeet.argmin(X, axis = 0) == np.argmin(X, axis = 0))
+    assert np.all(parakeet.argmax(X, axis = 1) == np.argmax(X, axis = 1))
+    assert np.all(parakeet.argmax(X, axis = -1) == np.argmax(X, axis = -1))
+    assert parakeet.argmin(X) == np.argmin(X)
+
+def test_bad_axis():
+  try:
+    parakeet.argmax(float_mat, axis = 2)
+  except ValueError:
+    pass
+  else:
+    assert False, "Expected ValueError for out of bounds axis"
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,22 @@
+import numpy as np
+from parakeet.testing_helpers import expect_each, run_local_tests
+
+int_vec = np.arange(1, 10)
+float_vec = np.random.randn(50)
+bool_vec = float_vec > 0
+vectors = [int_vec, float_vec, bool_vec]
+
+def cumsum(x):
+  return x.cumsum()
+
+def test_cumsum():
+  expect_each(cumsum, np.cumsum, vectors)
+
+def cumprod(x):
+  return x.cumprod()
+
+def test_cumprod():
+  expect_each(cumprod, np.cumprod, [int_vec, float_vec[:10]])
+
+if __name__ == "__main__":
+  run_local_tests()
@@ -0,0 +1,154 @@
+import numpy as np
+
+import parakeet
+from parakeet import jit, specialize
+from parakeet.analysis import SyntaxVisitor
+from parakeet.transforms.pipeline import lower_to_loops
+from parakeet.testing_helpers import expect, run_local_tests, eq
+
+class FindAllocs(SyntaxVisitor):
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.allocs = []
+
+  def visit_Alloc(self, expr):
+    self.allocs.append(expr)
+
+def n_allocs(fn, args, kwargs = {}):
+  typed, _ = specialize(fn, args, kwargs)
+  finder = FindAllocs()
+  finder.visit_fn(lower_to_loops(typed))
+  return len(finder.allocs)
+
+vec = np.arange(10.0)
+mat = np.arange(12.0).reshape(3, 4)
+
+def sqrt_into(x, out):
+  np.sqrt(x * x, out = out)
+  return out
+
+def add_into(x, y, out):
+  return np.add(x, y, out = out)
+
+def sum_cols_into(x, out):
+  np.sum(x, axis = 0, out = out)
+  return out
+
+def dot_into(x, y, out):
+  np.dot(x, y, out = out)
+  return out
+
+def test_ufunc_out():
+  expect(sqrt_into, [vec, np.zeros(10)], np.sqrt(vec * vec))
+  expect(add_into, [mat, mat, np.zeros((3, 4))], mat + mat)
+  # results get converted to the type of the destination
+  expect(add_into, [np.arange(10), np.arange(10), np.zeros(10)], 2.0 * np.arange(10))
+
+def test_reduction_out():
+  expect(sum_cols_into, [mat, np.zeros(4)], mat.sum(axis = 0))
+
+def test_dot_out():
+  expect(dot_into, [mat, mat.T, np.zeros((3, 3))], np.dot(mat, mat.T))
+
+def test_no_temporary():
+  assert n_allocs(sqrt_into, [vec, np.zeros(10)]) == 0
+
+def scaled_sqrt(x, scale = 2.0):
+  return np.sqrt(x) * scale
+
+def test_jit_out():
+  f = jit(scaled_sqrt)
+  out = np.zeros(10)
+  for _ in xrange(3):
+    result = f(vec, out = out, _backend = 'c')
+    assert eq(out, scaled_sqrt(vec))
+    assert np.may_share_memory(result, out)
+  result = f(vec, scale = 3.0, out = out, _backend = 'c')
+  assert eq(out, scaled_sqrt(vec, 3.0))
+  out2 = np.zeros((3, 4))
+  f(mat, out = out2, _backend = 'c')
+  assert eq(out2, scaled_sqrt(mat))
+  assert n_allocs(scaled_sqrt, [vec], {'out' : out}) == 0
+
+def test_lib_out():
+  out = np.zeros(4)
+  parakeet.reduce_sum(mat, axis = 0, out = out)
+  assert eq(out, mat.sum(axis = 0))
+  out = np.zeros((3, 3))
+  parakeet.dot(mat, mat.T, out = out)
+  assert eq(out, np.dot(mat, mat.T))
+
+def expect_value_error(f, *args, **kwargs):
+  try:
+    f(*args, **kwargs)
+  except ValueError:
+    pass
+  else:
+    assert False, "Expected ValueError from %s" % f
+
+def test_out_wrong_shape():
+  f = jit(scaled_sqrt)
+  out = np.zeros(10)
+  too_small = np.zeros(5)
+  # twice, so the second call goes through the dispatch table 
+  for _ in xrange(2):
+    expect_value_error(f, vec, out = too_small, _backend = 'c')
+    assert (too_small == 0).all()
+    expect_value_error(f, vec, out = np.zeros((10, 1)), _backend = 'c')
+    f(vec, out = out, _backend = 'c')
+    assert eq(out, scaled_sqrt(vec))
+  expect_value_error(parakeet.reduce_sum, mat, axis = 0, out = np.zeros(3))
+
+def every_other_backward(x):
+  return x[::-2] * 1
+
+def test_out_strided_result():
+  f = jit(every_other_backward)
+  out = np.zeros(5)
+  f(vec, out = out, _backend = 'c')
+  assert eq(out, vec[::-2])
+  expect_value_error(f, vec, out = np.zeros(10), _backend = 'c')
+
+def times_two(x):
+  return x * 2
+
+def reverse(x):
+  return x[::-1] + 0
+
+def shift_sum(x, y):
+  return x + y[::-1]
+
+def matmul(x, y):
+  return np.dot(x, y)
+
+def test_out_aliases_input():
+  # elementwise
+  x = np.arange(10.0)
+  jit(times_two)(x, out = x, _backend = 'c')
+  assert eq(x, np.arange(10.0) * 2)
+  # reversed reads
+  for _ in xrange(2):
+    x = np.arange(10.0)
+    jit(reverse)(x, out = x, _backend = 'c')
+    assert eq(x, np.arange(10.0)[::-1])
+  # out is a view of one of the inputs
+  x = np.arange(12.0)
+  expected = x[2:] + x[:-2][::-1]
+  jit(shift_sum)(x[2:], x[:-2], out = x[:-2], _backend = 'c')
+  assert eq(x[:-2], expected)
+  # every output element reads a whole row and column
+  m = np.arange(9.0).reshape(3, 3)
+  expected = np.dot(m, m)
+  jit(matmul)(m, m, out = m, _backend = 'c')
+  assert eq(m, expected)
+
+def test_no_truncation():
+  try:
+    jit(scaled_sqrt)(vec, out = np.zeros(10, dtype = 'int64'))
+  except TypeError:
+    pass
+  else:
+    assert False, "Expected float results to be refused by an int out= array"
+
+if __name__ == '__main__':
+  run_local_tests()